@@ -0,0 +1,107 @@
+# compressor/batch_manifest.py
+
+"""
+增量批处理清单
+
+在输出目录中记录每个已处理源文件的大小、修改时间与 SHA-256、处理时的目标设置，
+以及处理结果（方案与输出文件）。--incremental 运行时，源文件未变化、设置相同、
+上次处理成功且输出文件仍然存在的条目直接跳过，只处理新增或变化的 PDF。
+未变化的判断只需一次 stat 与一次字典查找；仅当修改时间变化而大小不变时才重新计算哈希。
+"""
+
+import json
+import logging
+import threading
+from pathlib import Path
+from . import utils, workspace
+
+MANIFEST_NAME = ".pdf_compressor_manifest.json"
+MANIFEST_VERSION = 1
+
+# 影响输出结果的设置；任一项变化时重新处理。
+# --early-abort 与 --share-mrc-layers 改变重建路径（分片重建后合并、共享分层的编码路径），也视为影响输出。
+# 只影响速度、不改变输出的选项（--jobs、--page-workers、--pipeline-mode、--scheme-concurrency、
+# 缓存与工作区选项等）不在其中。
+_SETTING_KEYS = (
+    'target_size', 'allow_splitting', 'max_splits', 'copy_small_files',
+    'search_mode', 'search_budget', 'per_page_schemes', 'size_prediction', 'prediction_samples',
+    'size_model', 'dpi_pyramid', 'reconstruct_shards', 'ocr_backend', 'time_budget',
+    'early_abort', 'share_mrc_layers',
+)
+
+
+def _settings(args):
+    return {key: getattr(args, key, None) for key in _SETTING_KEYS}
+
+
+class BatchManifest:
+    """输出目录中的增量处理清单。读写是线程安全的。"""
+
+    def __init__(self, output_dir, entries):
+        self.path = Path(output_dir) / MANIFEST_NAME
+        self.entries = entries
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, output_dir):
+        """读取输出目录中的清单；不存在、无法解析或版本不符时返回空清单。"""
+        path = Path(output_dir) / MANIFEST_NAME
+        entries = {}
+        if path.is_file():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == MANIFEST_VERSION:
+                    entries = data.get('entries', {})
+                else:
+                    logging.warning(f"增量清单版本不符，将重新处理所有文件: {path}")
+            except (OSError, ValueError) as e:
+                logging.warning(f"读取增量清单失败，将重新处理所有文件: {e}")
+        return cls(output_dir, entries)
+
+    @staticmethod
+    def _key(pdf_file):
+        return str(Path(pdf_file).resolve())
+
+    def is_up_to_date(self, pdf_file, args):
+        """源文件与设置均未变化、上次处理成功且输出文件都存在时返回 True。"""
+        with self._lock:
+            entry = self.entries.get(self._key(pdf_file))
+        if not entry or not entry.get('success') or entry.get('settings') != _settings(args):
+            return False
+        stat = Path(pdf_file).stat()
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime_ns != entry['mtime_ns']:
+            # 修改时间变化但大小相同（如被复制或 touch）：以内容哈希为准
+            if workspace.file_sha256(pdf_file) != entry.get('sha256'):
+                return False
+            with self._lock:
+                entry['mtime_ns'] = stat.st_mtime_ns
+        output_dir = self.path.parent
+        return all((output_dir / name).exists() for name in entry.get('outputs', []))
+
+    def record(self, pdf_file, args, outcome):
+        """记录一个文件的处理结果（outcome 为 {'success', 'scheme', 'outputs'}）并立即写回清单。"""
+        stat = Path(pdf_file).stat()
+        entry = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': workspace.file_sha256(pdf_file),
+            'settings': _settings(args),
+            'success': outcome['success'],
+            'scheme': outcome.get('scheme'),
+            'outputs': [Path(p).name for p in outcome.get('outputs', [])],
+            'processed': utils.get_current_timestamp(),
+        }
+        with self._lock:
+            self.entries[self._key(pdf_file)] = entry
+        self.save()
+
+    def save(self):
+        """原子地写回清单（先写临时文件再替换），写入失败只记录警告。"""
+        try:
+            with self._lock:
+                workspace.write_json_atomic(self.path, {'version': MANIFEST_VERSION, 'entries': self.entries})
+        except OSError as e:
+            logging.warning(f"写入增量清单失败: {e}")
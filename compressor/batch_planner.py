@@ -0,0 +1,130 @@
+# compressor/batch_planner.py
+
+"""
+批量处理的成本估计与进度
+
+目录中文件的处理时间差异很大：已满足目标大小的文件几乎立即完成，
+需要压缩的文件耗时大致与页数成正比（光栅化、OCR 与每次重建都是逐页的）。
+本模块据此估计每个文件的成本，并行处理时按成本从大到小排序（最长任务优先），
+避免排在最后的大文件拖长整批的尾部；处理过程中按已完成的页数与耗时给出吞吐量和预计剩余时间。
+"""
+
+import logging
+import threading
+import time
+from . import pipeline, utils
+
+# 无法读取页数时按文件大小估计页数（每 MB 的页数）
+_PAGES_PER_MB_GUESS = 5
+
+# 无需压缩的文件只复制或跳过，按一页的极小比例计算成本
+_SKIP_COST = 0.01
+
+# 预处理（光栅化与 OCR）约占一个文件处理时间的比例；OCR 完成的页面按此比例计入进度
+_PRECOMPUTE_SHARE = 0.5
+
+# 页面级进度日志的最小间隔（秒）
+_PAGE_LOG_INTERVAL = 30
+
+
+def estimate_file_cost(pdf_file, target_size_mb):
+    """
+    估计文件的处理成本，返回 {'file', 'size_mb', 'pages', 'needs_compression', 'cost'}。
+    成本以“需要处理的页数”计；无需压缩的文件不读取页数。
+    """
+    size_mb = utils.get_file_size_mb(pdf_file)
+    needs_compression = size_mb >= target_size_mb
+    pages = 0
+    if needs_compression:
+        pages = pipeline.get_pdf_page_count(pdf_file) or max(1, round(size_mb * _PAGES_PER_MB_GUESS))
+    return {
+        'file': pdf_file,
+        'size_mb': size_mb,
+        'pages': pages,
+        'needs_compression': needs_compression,
+        'cost': pages if needs_compression else _SKIP_COST,
+    }
+
+
+def order_by_cost(estimates):
+    """按成本从大到小排序（成本相同时按文件名），用于最长任务优先调度。"""
+    return sorted(estimates, key=lambda e: (-e['cost'], str(e['file'])))
+
+
+class BatchProgress:
+    """
+    线程安全的批量进度统计。文件内每完成一批页面的 OCR 时调用 pages_done()，
+    每个文件完成时调用 complete()；按已完成的页数与经过的墙钟时间计算吞吐量（页/分钟），
+    并外推剩余页数的预计完成时间。
+    OCR 完成的页面按 _PRECOMPUTE_SHARE 计入部分进度，文件完成时补足其余部分。
+    """
+
+    def __init__(self, estimates):
+        self.total_files = len(estimates)
+        self.total_cost = sum(e['cost'] for e in estimates)
+        self.done_files = 0
+        self.done_cost = 0.0
+        self.started = time.monotonic()
+        self._partial = {}
+        self._last_page_log = self.started
+        self._lock = threading.Lock()
+
+    def _snapshot(self, now):
+        elapsed = now - self.started
+        rate = self.done_cost / elapsed if elapsed > 0 and self.done_cost >= 1 else None
+        remaining = max(0.0, self.total_cost - self.done_cost)
+        return {
+            'done_files': self.done_files,
+            'pages_per_min': rate * 60 if rate else None,
+            'eta_seconds': remaining / rate if rate else None,
+        }
+
+    def pages_done(self, estimate, pages, now=None):
+        """
+        记录文件内新完成 OCR 的页数，返回与 complete() 相同格式的快照。
+        为避免刷屏，至多每 _PAGE_LOG_INTERVAL 秒输出一次进度日志。
+        """
+        now = time.monotonic() if now is None else now
+        key = str(estimate['file'])
+        with self._lock:
+            partial = self._partial.get(key, 0.0)
+            credit = min(pages * _PRECOMPUTE_SHARE, estimate['cost'] * _PRECOMPUTE_SHARE - partial)
+            if credit > 0:
+                self._partial[key] = partial + credit
+                self.done_cost += credit
+            snapshot = self._snapshot(now)
+            should_log = now - self._last_page_log >= _PAGE_LOG_INTERVAL
+            if should_log:
+                self._last_page_log = now
+
+        if should_log and snapshot['pages_per_min'] is not None:
+            logging.info(
+                f">>> 处理进度: {snapshot['done_files']}/{self.total_files} 个文件已完成（{estimate['file'].name} 进行中），"
+                f"吞吐量 {snapshot['pages_per_min']:.1f} 页/分钟，预计剩余 {_format_duration(snapshot['eta_seconds'])} <<<"
+            )
+        return snapshot
+
+    def complete(self, estimate, success, now=None):
+        """记录一个文件完成，返回 {'done_files', 'pages_per_min', 'eta_seconds'}（尚无法估计时为 None）。"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.done_files += 1
+            self.done_cost += estimate['cost'] - self._partial.pop(str(estimate['file']), 0.0)
+            snapshot = self._snapshot(now)
+
+        status = "成功" if success else "失败"
+        message = f">>> 处理进度: {snapshot['done_files']}/{self.total_files} 已完成 ({estimate['file'].name}: {status})"
+        if snapshot['pages_per_min'] is not None:
+            message += f"，吞吐量 {snapshot['pages_per_min']:.1f} 页/分钟，预计剩余 {_format_duration(snapshot['eta_seconds'])}"
+        logging.info(message + " <<<")
+        return snapshot
+
+
+def _format_duration(seconds):
+    """把秒数格式化为 'H小时M分' 或 'M分S秒'。"""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}小时{minutes}分"
+    return f"{minutes}分{secs}秒"
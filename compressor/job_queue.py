@@ -0,0 +1,225 @@
+# compressor/job_queue.py
+
+"""
+守护进程的持久化任务队列（SQLite）
+
+每个进入收件目录的 PDF 以（路径、大小、修改时间）为唯一键入队一次，状态依次为
+queued → running → publishing → done，处理失败时为 failed。每次状态转换都是一个
+独立提交的事务，进程在任意时刻崩溃后重启时：
+  - running 的任务重新排队（超过最大尝试次数时标记为 failed），其暂存输出被丢弃；
+  - publishing 的任务继续发布暂存目录中尚未移动的文件后标记为 done。
+输出文件先写入暂存目录，发布时逐个原子地移动到发件目录，已移动的文件不再留在暂存目录中，
+因此每个输出文件至多发布一次。
+同一数据库同时只允许一个守护进程使用（数据库旁的 .lock 文件上的排他锁，进程退出或崩溃时由系统释放），
+因此启动时遗留的 running 任务一定属于已退出的进程，可以无条件重新排队。
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+STATES = ('queued', 'running', 'publishing', 'done', 'failed')
+
+# 任务因进程崩溃而中断后最多重新执行的次数
+MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner INTEGER,
+    message TEXT,
+    outputs TEXT,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    UNIQUE (source, size, mtime_ns)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+"""
+
+
+class JobQueue:
+    """
+    SQLite 任务队列。每个线程使用自己的连接；认领任务使用 BEGIN IMMEDIATE 事务，
+    同一任务不会被两个工作线程同时认领。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._lock_handle = None
+        self._connection().executescript(_SCHEMA)
+
+    def acquire_daemon_lock(self):
+        """
+        获取数据库的守护进程排他锁（非阻塞），已被其他进程持有时返回 False。
+        锁随文件句柄存在，进程退出或崩溃时由操作系统释放，因此与 PID 是否被复用无关。
+        """
+        lock_path = self.db_path.with_name(self.db_path.name + ".lock")
+        handle = open(lock_path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            handle.close()
+            return False
+        handle.seek(0)
+        handle.truncate()
+        handle.write(f"{os.getpid()}\n")
+        handle.flush()
+        self._lock_handle = handle
+        return True
+
+    def release_daemon_lock(self):
+        """释放 acquire_daemon_lock 获取的锁。"""
+        if self._lock_handle is not None:
+            self._lock_handle.close()
+            self._lock_handle = None
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    def enqueue(self, source, size, mtime_ns):
+        """入队一个源文件，同一（路径、大小、修改时间）只入队一次。返回是否为新任务。"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (source, size, mtime_ns, state, enqueued_at) VALUES (?, ?, ?, 'queued', ?)",
+                (str(source), size, mtime_ns, time.time())
+            )
+            return cursor.rowcount == 1
+
+    def claim(self):
+        """认领最早入队的任务并标记为 running，返回任务记录（dict）；队列为空时返回 None。"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE state = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET state = 'running', owner = ?, attempts = attempts + 1, started_at = ? WHERE id = ?",
+                (os.getpid(), time.time(), row['id'])
+            )
+        return dict(row, state='running', attempts=row['attempts'] + 1)
+
+    def mark_publishing(self, job_id, outputs):
+        """记录待发布的输出文件名并进入 publishing 状态。"""
+        self._set_state(job_id, 'publishing', outputs='\n'.join(outputs))
+
+    def mark_done(self, job_id, message=None):
+        self._set_state(job_id, 'done', message=message, finished_at=time.time())
+
+    def mark_failed(self, job_id, message):
+        self._set_state(job_id, 'failed', message=message, finished_at=time.time())
+
+    def _set_state(self, job_id, state, **fields):
+        fields['state'] = state
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._transaction() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", list(fields.values()) + [job_id])
+
+    def find_job(self, source, size, mtime_ns):
+        """按（路径、大小、修改时间）查找任务，不存在时返回 None。"""
+        row = self._connection().execute(
+            "SELECT * FROM jobs WHERE source = ? AND size = ? AND mtime_ns = ?", (str(source), size, mtime_ns)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def jobs_in_state(self, state):
+        rows = self._connection().execute("SELECT * FROM jobs WHERE state = ? ORDER BY id", (state,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def requeue_interrupted(self):
+        """
+        把上次运行遗留的 running 任务重新排队，超过最大尝试次数的标记为 failed。
+        只能在持有 acquire_daemon_lock 的锁、且本进程尚未认领任何任务时调用。
+        返回 (重新排队的任务, 标记失败的任务)。
+        """
+        requeued, failed = [], []
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT * FROM jobs WHERE state = 'running'").fetchall()
+            for row in rows:
+                if row['attempts'] >= MAX_ATTEMPTS:
+                    conn.execute(
+                        "UPDATE jobs SET state = 'failed', message = ?, finished_at = ? WHERE id = ?",
+                        (f"处理中断 {row['attempts']} 次，放弃", time.time(), row['id'])
+                    )
+                    failed.append(dict(row))
+                else:
+                    conn.execute("UPDATE jobs SET state = 'queued', owner = NULL WHERE id = ?", (row['id'],))
+                    requeued.append(dict(row))
+        return requeued, failed
+
+    def status(self, window_seconds=3600, now=None):
+        """
+        返回队列状态：各状态的任务数、最近 window_seconds 内完成的任务数与源文件总大小 (MB)、
+        以及这些任务的平均处理时长（秒）。
+        """
+        now = time.time() if now is None else now
+        conn = self._connection()
+        counts = {state: 0 for state in STATES}
+        for row in conn.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state"):
+            counts[row['state']] = row['n']
+        recent = conn.execute(
+            "SELECT COUNT(*) AS n, COALESCE(SUM(size), 0) AS bytes, AVG(finished_at - started_at) AS seconds "
+            "FROM jobs WHERE state = 'done' AND finished_at >= ?",
+            (now - window_seconds,)
+        ).fetchone()
+        return {
+            'counts': counts,
+            'window_seconds': window_seconds,
+            'recent_done': recent['n'],
+            'recent_mb': recent['bytes'] / (1024 * 1024),
+            'mean_seconds': recent['seconds'],
+        }
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT 上下文，异常时回滚。"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+            logging.error(f"任务队列事务失败，已回滚: {exc}")
+        return False
@@ -0,0 +1,205 @@
+# compressor/mrc_variants.py
+
+"""
+同一 DPI 多个重建变体的 MRC 分层共享（辅助脚本）
+
+本脚本不属于 compressor 包的导入路径：它由 recode_pdf 所在 Python 环境（pipx 虚拟环境）的
+解释器作为独立进程运行，因此可以直接调用 archive-pdf-tools 的内部模块，而本工具自身的进程
+仍只依赖 recode_pdf 命令行。用法：
+
+  <archive-pdf-tools 的 python> mrc_variants.py --dpi 300 JOB.json
+
+JOB.json 为 {'image_glob', 'hocr_file', 'dpi', 'tmp_dir', 'supported_versions', 'variants':
+[{'bg_downsample', 'jpeg2000_encoder', 'output'}, ...]}。每页只做一次文字/前景分割与 JBIG2 掩码编码，
+前景按编码器各编码一次，背景按各变体的 bg_downsample 降采样后分别编码，再插入各自的输出 PDF。
+处理步骤与参数默认值与 recode_pdf --mask-compression jbig2 -J <编码器> 相同。
+
+内部模块不是 archive-pdf-tools 的公开接口，因此只在 supported_versions 列出的版本上运行：
+版本不符、内部模块无法导入、hOCR 页数与图像数不一致或遇到不支持的页面时不生成任何输出，
+以 EXIT_UNSUPPORTED 退出，由调用方退回逐个方案运行 recode_pdf。
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from glob import glob
+from tempfile import mkstemp
+
+try:
+    import fitz
+    import numpy as np
+    from PIL import Image
+
+    from hocr.parse import hocr_page_iterator, hocr_page_to_word_data
+    from internetarchivepdf.const import VERSION, COMPRESSOR_JPEG2000, DENOISE_FAST
+    from internetarchivepdf.mrc import (create_mrc_hocr_components, encode_mrc_mask,
+                                        encode_mrc_foreground, encode_mrc_background)
+    from internetarchivepdf.pdfhacks import fast_insert_image, write_pdfa, write_basic_ua, write_metadata
+    from internetarchivepdf.recode import create_tess_textonly_pdf
+except ImportError as e:
+    _IMPORT_ERROR = e
+else:
+    _IMPORT_ERROR = None
+    Image.MAX_IMAGE_PIXELS = 625000000
+
+# 无法共享分层、调用方应退回 recode_pdf 时的退出码
+EXIT_UNSUPPORTED = 3
+
+# recode_pdf 对各 JPEG2000 编码器使用的默认压缩参数 (背景, 前景)，取自 supported_versions 中的版本
+_DEFAULT_FLAGS = {
+    'openjpeg': ('-r 500', '-r 750'),
+    'grok': ('-r 500', '-r 750'),
+    'kakadu': ('-slope 44250', '-slope 44500'),
+    'pillow': ('quality_mode:"rates";quality_layers:[500]', 'quality_mode:"rates";quality_layers:[750]'),
+}
+
+
+def _load_image(image_file):
+    image = Image.open(image_file)
+    image.load()
+    if image.mode == 'RGBA':
+        image = image.convert('RGB')
+    elif image.mode == 'LA':
+        image = image.convert('L')
+    return image
+
+
+def _downsample(background, factor):
+    """与 create_mrc_hocr_components 相同的背景降采样。"""
+    if not factor:
+        return background
+    image = Image.fromarray(background)
+    w, h = image.size
+    if int(w / factor) <= 0 or int(h / factor) <= 0:
+        return background
+    image.thumbnail((int(w / factor), int(h / factor)))
+    return np.array(image)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        contents = f.read()
+    os.remove(path)
+    return contents
+
+
+def _insert_layers(page, image, bg_contents, bg_size, fg_contents, fg_size, mask_contents):
+    """按 insert_images_mrc 的方式把背景、前景与掩码插入页面。"""
+    if image.mode in ('L', 'RGB'):
+        fast_insert_image(page, page.rect, stream=bg_contents, mask=None, width=bg_size[0], height=bg_size[1],
+                          stream_fmt=COMPRESSOR_JPEG2000, gray=image.mode == 'L')
+        fast_insert_image(page, page.rect, stream=fg_contents, mask=mask_contents, width=fg_size[0],
+                          height=fg_size[1], stream_fmt=COMPRESSOR_JPEG2000, gray=image.mode == 'L')
+    else:
+        page.insert_image(page.rect, stream=bg_contents, mask=None, overlay=False,
+                          width=bg_size[0], height=bg_size[1], alpha=0)
+        page.insert_image(page.rect, stream=fg_contents, mask=mask_contents, overlay=True,
+                          width=fg_size[0], height=fg_size[1], alpha=0)
+
+
+def _unsupported_reason(job, image_files):
+    """返回不能共享分层的原因，可以共享时返回 None。"""
+    if _IMPORT_ERROR is not None:
+        return f"无法导入 archive-pdf-tools 内部模块: {_IMPORT_ERROR}"
+    if VERSION not in job.get('supported_versions', ()):
+        return f"archive-pdf-tools {VERSION} 未经核对（支持的版本: {', '.join(job.get('supported_versions', ()))}）"
+    unknown = {v['jpeg2000_encoder'] for v in job['variants']} - set(_DEFAULT_FLAGS)
+    if unknown:
+        return f"不支持的 JPEG2000 编码器: {', '.join(sorted(unknown))}"
+    hocr_pages = sum(1 for _ in hocr_page_iterator(job['hocr_file']))
+    if hocr_pages != len(image_files):
+        return f"hOCR 页数 ({hocr_pages}) 与图像数 ({len(image_files)}) 不一致"
+    return None
+
+
+def build_variants(job):
+    """
+    按任务描述生成各变体的输出 PDF，返回退出码。
+    不能共享分层时（见 _unsupported_reason，或页面为 1 位图像）不保留任何输出并返回 EXIT_UNSUPPORTED。
+    """
+    image_files = sorted(glob(job['image_glob']))
+    reason = _unsupported_reason(job, image_files)
+    if reason is not None:
+        logging.error(reason)
+        return EXIT_UNSUPPORTED
+    dpi = int(job['dpi'])
+    tmp_dir = job.get('tmp_dir')
+    variants = job['variants']
+    errors = set()
+
+    fd, text_pdf = mkstemp(prefix='pdfrenderer', suffix='.pdf', dir=tmp_dir)
+    os.close(fd)
+    create_tess_textonly_pdf(job['hocr_file'], text_pdf, image_files=image_files, dpi=dpi,
+                             skip_pages=[], tmp_dir=tmp_dir, errors=errors)
+    docs = [fitz.open(text_pdf) for _ in variants]
+    try:
+        for idx, hocr_page in enumerate(hocr_page_iterator(job['hocr_file'])):
+            image = _load_image(image_files[idx])
+            if image.mode == '1':
+                logging.error(f"第 {idx + 1} 页为 1 位图像，recode_pdf 对其使用不同的处理路径")
+                return EXIT_UNSUPPORTED
+            components = create_mrc_hocr_components(
+                image, hocr_page_to_word_data(hocr_page), dpi=dpi, denoise_mask=DENOISE_FAST, errors=errors
+            )
+            mask = next(components)
+            foreground = next(components)
+            background = next(components)
+
+            fast_insert = image.mode in ('L', 'RGB')
+            mask_jbig2, mask_png = encode_mrc_mask(mask, tmp_dir=tmp_dir, jbig2=True, embedded_jbig2=fast_insert)
+            os.remove(mask_png)
+            mask_contents = _read(mask_jbig2)
+
+            fg_size = (foreground.shape[1], foreground.shape[0])
+            fg_contents = {}
+            for variant in variants:
+                encoder = variant['jpeg2000_encoder']
+                if encoder not in fg_contents:
+                    fg_flags = _DEFAULT_FLAGS[encoder][1].split(' ')
+                    fg_contents[encoder] = _read(encode_mrc_foreground(
+                        foreground, fg_flags, tmp_dir=tmp_dir, jpeg2000_implementation=encoder,
+                        mrc_image_format=COMPRESSOR_JPEG2000
+                    ))
+
+            for doc, variant in zip(docs, variants):
+                encoder = variant['jpeg2000_encoder']
+                scaled = _downsample(background, variant['bg_downsample'])
+                bg_flags = _DEFAULT_FLAGS[encoder][0].split(' ')
+                bg_contents = _read(encode_mrc_background(
+                    scaled, bg_flags, tmp_dir=tmp_dir, jpeg2000_implementation=encoder,
+                    mrc_image_format=COMPRESSOR_JPEG2000
+                ))
+                _insert_layers(doc[idx], image, bg_contents, (scaled.shape[1], scaled.shape[0]),
+                               fg_contents[encoder], fg_size, mask_contents)
+
+        for doc, variant in zip(docs, variants):
+            write_pdfa(doc)
+            write_basic_ua(doc, language=None)
+            write_metadata(None, doc, extra_metadata={})
+            doc.save(variant['output'], deflate=True, pretty=True)
+        for error in errors:
+            logging.warning(f"archive-pdf-tools 运行时警告: {error}")
+        return 0
+    finally:
+        for doc in docs:
+            doc.close()
+        os.remove(text_pdf)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以共享的 MRC 分层重建同一 DPI 的多个变体")
+    parser.add_argument("--dpi", type=int, help="图像 DPI（覆盖任务文件中的值，也供资源调度估计内存）")
+    parser.add_argument("job", help="任务描述 JSON 文件")
+    args = parser.parse_args()
+    with open(args.job, 'r', encoding='utf-8') as f:
+        job = json.load(f)
+    if args.dpi:
+        job['dpi'] = args.dpi
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format='mrc_variants: %(levelname)s %(message)s')
+    sys.exit(build_variants(job))
+
+
+if __name__ == '__main__':
+    main()
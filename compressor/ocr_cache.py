@@ -0,0 +1,135 @@
+# compressor/ocr_cache.py
+
+"""
+跨运行的 OCR 结果缓存
+
+以页面图像内容哈希 + OCR 语言 + 引擎版本（及后端）为键，在磁盘上保存 gzip 压缩的
+单页 hOCR。同一份 PDF 以不同目标大小重复处理时，阶段2可直接复用已有结果。
+缓存总大小超过上限时按最近使用时间（mtime）淘汰最旧的条目。
+"""
+
+import functools
+import gzip
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from . import ocr_engine, utils
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "pdf_compressor" / "ocr"
+DEFAULT_MAX_SIZE_MB = 1024
+
+_ENTRY_SUFFIX = ".hocr.gz"
+
+
+@functools.lru_cache(maxsize=None)
+def tesseract_version():
+    """返回 tesseract 命令行版本（如 'tesseract 5.3.0'），无法获取时返回 'unknown'。"""
+    output = utils.run_command_output(["tesseract", "--version"])
+    return output.splitlines()[0].strip() if output and output.strip() else 'unknown'
+
+
+class OcrCache:
+    """磁盘 OCR 缓存，线程安全地统计命中与未命中次数。"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size_mb=DEFAULT_MAX_SIZE_MB, engine='unknown'):
+        self.cache_dir = Path(cache_dir)
+        # max_size_mb 为 None 时不限制容量（如工作区内的私有缓存）
+        self.max_bytes = None if max_size_mb is None else int(max_size_mb * 1024 * 1024)
+        self.engine = engine
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key_for(self, image_path, lang):
+        """计算页面图像的缓存键。"""
+        digest = hashlib.sha256()
+        digest.update(f"{lang}\0{self.engine}\0".encode('utf-8'))
+        with open(image_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return self.cache_dir / key[:2] / f"{key}{_ENTRY_SUFFIX}"
+
+    def lookup(self, key):
+        """查询缓存，命中时返回 hOCR 字节串并刷新其最近使用时间，否则返回 None。"""
+        entry = self._entry_path(key)
+        try:
+            with gzip.open(entry, 'rb') as f:
+                data = f.read()
+            os.utime(entry)
+        except (OSError, EOFError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def store(self, key, hocr_path):
+        """将单页 hOCR 文件压缩写入缓存（先写临时文件再原子替换）。"""
+        entry = self._entry_path(key)
+        tmp_entry = entry.with_name(f"{entry.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            with open(hocr_path, 'rb') as src, gzip.open(tmp_entry, 'wb') as dst:
+                for block in iter(lambda: src.read(1024 * 1024), b''):
+                    dst.write(block)
+            os.replace(tmp_entry, entry)
+        except OSError as e:
+            logging.warning(f"写入 OCR 缓存失败 ({hocr_path}): {e}")
+            try:
+                tmp_entry.unlink()
+            except OSError:
+                pass
+
+    def prune(self):
+        """缓存总大小超过上限时，按最近使用时间淘汰最旧的条目。返回淘汰条目数。"""
+        if self.max_bytes is None:
+            return 0
+        entries = []
+        total = 0
+        for entry in self.cache_dir.glob(f"*/*{_ENTRY_SUFFIX}"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return 0
+
+        evicted = 0
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                entry.unlink()
+            except OSError:
+                continue  # 可能已被并发运行的其他进程淘汰
+            total -= size
+            evicted += 1
+        logging.info(f"OCR 缓存超过上限 {self.max_bytes / 1024 / 1024:.0f}MB，已淘汰 {evicted} 个最久未使用的条目。")
+        return evicted
+
+    def log_stats(self):
+        """在日志中输出命中/未命中统计。"""
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0.0
+        logging.info(f"OCR 缓存统计: 命中 {self.hits}，未命中 {self.misses}，命中率 {rate:.1f}% ({self.cache_dir})")
+
+
+def create_cache(backend, cache_dir=DEFAULT_CACHE_DIR, max_size_mb=DEFAULT_MAX_SIZE_MB):
+    """
+    为指定 OCR 后端创建缓存。引擎标识包含后端名与实际引擎版本，
+    升级 tesseract 或切换后端后不会误用旧结果。
+    """
+    if backend == 'inprocess' and ocr_engine.is_available():
+        engine = f"{backend}:{ocr_engine.engine_version()}"
+    else:
+        engine = f"{backend}:{tesseract_version()}"
+    return OcrCache(cache_dir, max_size_mb, engine=engine)
@@ -0,0 +1,142 @@
+# compressor/ocr_engine.py
+
+"""
+进程内 OCR 引擎（可选依赖 tesserocr）
+
+在每个工作进程中初始化并常驻一个 tesseract 引擎实例，页面 OCR 时直接调用
+引擎并以字符串形式返回 hOCR，省去逐页 fork/exec 与语言模型加载的开销。
+未安装 tesserocr 时 is_available() 返回 False，由调用方退回子进程后端。
+
+工作进程以 forkserver（不支持时为 spawn）方式启动，不继承父进程的线程与已加载的库；
+tesserocr 在工作进程中设置 OMP_THREAD_LIMIT 之后才导入，因此每个引擎确实只使用一个线程。
+"""
+
+import atexit
+import importlib.util
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from . import scheduler, utils
+
+DEFAULT_LANG = 'chi_sim'
+
+# 工作进程内的常驻引擎实例
+_engine = None
+
+# 父进程中共享的引擎进程池，按（语言, 进程数）区分，跨文件复用
+_pools = {}
+_pool_lock = threading.Lock()
+
+_version = None
+
+
+def is_available():
+    """当前环境是否可以使用进程内 OCR 引擎（只查找模块，不在父进程中导入 tesserocr）。"""
+    return importlib.util.find_spec('tesserocr') is not None
+
+
+def engine_version():
+    """
+    返回进程内引擎的 tesseract 版本字符串；不可用或查询失败时返回 None。
+    版本在一个一次性的工作进程中查询，父进程不导入 tesserocr（见模块说明）。
+    """
+    global _version
+    if _version is None and is_available():
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=_mp_context()) as pool:
+                _version = pool.submit(_worker_version).result(timeout=utils.get_command_timeout())
+        except Exception as e:
+            logging.warning(f"查询进程内 OCR 引擎版本失败: {e}")
+    return _version
+
+
+def _worker_version():
+    """在工作进程中返回 libtesseract 的版本（与 _init_worker 相同，先限制线程数再导入）。"""
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    import tesserocr
+    return tesserocr.tesseract_version().splitlines()[0].strip()
+
+
+def _init_worker(lang):
+    """工作进程初始化：限制为单线程后再导入 tesserocr 并创建常驻引擎。"""
+    global _engine
+    # 必须在加载 libtesseract（及其 OpenMP 运行时）之前设置
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    import tesserocr
+    _engine = tesserocr.PyTessBaseAPI(lang=lang)
+
+
+def _recognize(image_path):
+    """在工作进程中识别一张图像，返回该页的 hOCR 片段（ocr_page div）。"""
+    _engine.SetImageFile(image_path)
+    return _engine.GetHOCRText(0)
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _get_pool(lang, workers):
+    key = (lang, workers)
+    with _pool_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            logging.info(f"启动进程内 OCR 引擎池: {workers} 个常驻 tesseract 引擎 (语言: {lang})")
+            pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=_mp_context(),
+                initializer=_init_worker, initargs=(lang,)
+            )
+            _pools[key] = pool
+        return pool
+
+
+def _discard_pool(key, pool):
+    """终止卡住的引擎进程池（超时后工作进程无法中断，只能连同进程一起丢弃）。"""
+    with _pool_lock:
+        if _pools.get(key) is pool:
+            del _pools[key]
+    for process in list((getattr(pool, '_processes', None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False)
+
+
+def recognize(image_path, lang=DEFAULT_LANG, workers=1, timeout=None):
+    """
+    使用常驻引擎识别单张图像，返回 hOCR 字符串。
+    workers 为引擎进程数（与调用方的页面并发度一致）；每次识别前向全局资源调度器
+    申请一个单线程 tesseract 的资源，与子进程后端共享同一预算。
+    timeout 与 --command-timeout 取较小者作为本页的超时（含排队时间），
+    超时时终止该引擎进程池并抛出 TimeoutError，下次调用会重新创建进程池。
+    """
+    limits = [t for t in (timeout, utils.get_command_timeout()) if t is not None]
+    deadline = time.monotonic() + min(limits) if limits else None
+    key = (lang, max(1, workers or 1))
+    pool = _get_pool(*key)
+    sched = scheduler.get_scheduler()
+    allocation = sched.acquire(*scheduler.command_cost(['tesseract'], {'OMP_THREAD_LIMIT': '1'}), deadline=deadline)
+    if allocation is None:
+        raise TimeoutError(f"等待 OCR 资源超时: {image_path}")
+    try:
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            return pool.submit(_recognize, str(image_path)).result(timeout=remaining)
+        except FutureTimeoutError:
+            _discard_pool(key, pool)
+            raise TimeoutError(f"进程内 OCR 超时 ({min(limits):.0f}秒): {image_path}")
+    finally:
+        sched.release(allocation)
+
+
+def shutdown():
+    """关闭所有引擎进程池。"""
+    with _pool_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=True)
+        _pools.clear()
+
+
+atexit.register(shutdown)
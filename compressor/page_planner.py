@@ -0,0 +1,210 @@
+# compressor/page_planner.py
+
+"""
+逐页方案规划
+
+文档中常混有密集文字页与照片、证书等图像页，整份文件使用同一组 DPI/背景降采样参数时，
+为了让图像页达到目标大小，文字页也被迫降到同样的质量。
+本模块根据 hOCR 文字覆盖率与页面图像大小把页面分类，按类别抽样重建估计每页在各方案下的大小，
+再为每一页分配方案：在预测总大小不超过预算的前提下，使页面降级的总级数最少。
+"""
+
+import heapq
+import logging
+import math
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from . import pipeline, predictor
+
+PAGE_CLASSES = ('text', 'mixed', 'image')
+
+# 文字覆盖率不低于该值且图像不明显大于中位数的页面视为文字页
+TEXT_COVERAGE = 0.15
+
+# 文字覆盖率低于该值，或图像大于中位数该倍数的页面视为图像页
+IMAGE_COVERAGE = 0.03
+IMAGE_SIZE_RATIO = 2.0
+
+# 每个类别抽样重建的页数
+DEFAULT_SAMPLES_PER_CLASS = 2
+
+
+def classify_page(coverage, image_bytes, median_bytes):
+    """按文字覆盖率与图像大小（相对中位数）把页面分为 'text'、'mixed' 或 'image'。"""
+    relative_size = image_bytes / median_bytes if median_bytes else 1.0
+    if coverage < IMAGE_COVERAGE or relative_size >= IMAGE_SIZE_RATIO:
+        return 'image'
+    if coverage >= TEXT_COVERAGE and relative_size < IMAGE_SIZE_RATIO * 0.75:
+        return 'text'
+    return 'mixed'
+
+
+def page_statistics(image_files, hocr_file):
+    """
+    返回每页的统计信息 [{'image_bytes', 'coverage', 'class'}, ...]，
+    hOCR 页数与图像数不一致时返回 None。
+    """
+    coverages = pipeline.hocr_page_coverages(hocr_file)
+    if coverages is None or len(coverages) != len(image_files):
+        logging.warning("hOCR 页数与图像数不一致，无法逐页规划方案。")
+        return None
+    sizes = [Path(f).stat().st_size for f in image_files]
+    median_bytes = sorted(sizes)[len(sizes) // 2] if sizes else 0
+    stats = [
+        {'image_bytes': size, 'coverage': coverage, 'class': classify_page(coverage, size, median_bytes)}
+        for size, coverage in zip(sizes, coverages)
+    ]
+    counts = {name: sum(1 for s in stats if s['class'] == name) for name in PAGE_CLASSES}
+    logging.info(
+        f"页面分类: 文字页 {counts['text']}，图文混合页 {counts['mixed']}，图像页 {counts['image']}"
+    )
+    return stats
+
+
+def estimate_page_sizes(image_files, temp_dir, stats, schemes, samples_per_class=DEFAULT_SAMPLES_PER_CLASS,
+                        workers=1, pdf_path=None, source_dpi=None):
+    """
+    估计每页在各方案下的输出字节数。
+    每个类别按分层抽样选取 samples_per_class 页，在每个方案下单独重建，
+    以该类别的（输出字节数 / 图像字节数）比率乘以各页图像字节数得到估计值。
+    每个单页样本都包含一份单个 PDF 的固定开销（文字层字体、元数据等），合并后的文件只包含一份，
+    因此每个方案还把前两个样本页合并重建一次，以两者之差测得固定开销，计算比率前从样本中扣除
+    （同 predictor.predict_scheme_sizes）。
+    schemes 为 {方案ID: 重建参数}，参数中 strip_text 为真时样本使用去除文字标签的 hOCR；
+    pdf_path 与 source_dpi 的含义同 predictor.predict_scheme_sizes。
+
+    返回 ([{方案ID: 字节数}, ...]（与页面一一对应）, 固定开销字节数（各方案中的最大值）)，
+    任何样本失败时返回 None。
+    """
+    temp_dir = Path(temp_dir)
+    jobs = []
+    for page_class in PAGE_CLASSES:
+        members = [i for i, s in enumerate(stats) if s['class'] == page_class]
+        for position in predictor.select_sample_indices(len(members), samples_per_class):
+            page = members[position]
+            page_hocr = pipeline._page_hocr_path(image_files[page], temp_dir)
+            if not page_hocr.exists():
+                logging.warning(f"缺少样本页的单页 hOCR ({page_hocr.name})，无法逐页规划方案。")
+                return None
+            for scheme_id in schemes:
+                jobs.append((page_class, [page], scheme_id, [page_hocr]))
+    sample_pages = sorted({job[1][0] for job in jobs})
+    if len(sample_pages) >= 2:
+        pair_hocr = [pipeline._page_hocr_path(image_files[page], temp_dir) for page in sample_pages[:2]]
+        for scheme_id in schemes:
+            jobs.append(('pair', sample_pages[:2], scheme_id, pair_hocr))
+
+    def _run(job):
+        page_class, pages, scheme_id, hocr_files = job
+        images = [image_files[page] for page in pages]
+        params = schemes[scheme_id]
+        render = None
+        if pdf_path is not None and params['dpi'] != source_dpi:
+            render = (pdf_path, params['dpi'], source_dpi)
+        name = 'pair' if page_class == 'pair' else images[0].stem
+        sample_dir = temp_dir / "page_plan" / f"S{scheme_id}" / name
+        return predictor._recode_sample(sample_dir, images, hocr_files, params, params.get('strip_text'), render)
+
+    logging.info(f"逐页规划: 抽样重建 {len(sample_pages)} 页 × {len(schemes)} 个方案...")
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(_run, jobs))
+    if any(size is None for size in results):
+        logging.warning("部分样本页重建失败，无法逐页规划方案。")
+        return None
+
+    single = {(pages[0], scheme_id): size
+              for (page_class, pages, scheme_id, _), size in zip(jobs, results) if page_class != 'pair'}
+    overheads = {scheme_id: 0.0 for scheme_id in schemes}
+    for (page_class, pages, scheme_id, _), size in zip(jobs, results):
+        if page_class == 'pair':
+            overheads[scheme_id] = max(0.0, single[(pages[0], scheme_id)] + single[(pages[1], scheme_id)] - size)
+
+    output_bytes = {}
+    input_bytes = {}
+    for (page_class, pages, scheme_id, _), size in zip(jobs, results):
+        if page_class == 'pair':
+            continue
+        key = (page_class, scheme_id)
+        output_bytes[key] = output_bytes.get(key, 0) + max(0.0, size - overheads[scheme_id])
+        input_bytes[key] = input_bytes.get(key, 0) + stats[pages[0]]['image_bytes']
+    ratios = {key: output_bytes[key] / max(1, input_bytes[key]) for key in output_bytes}
+
+    page_sizes = [
+        {scheme_id: ratios[(s['class'], scheme_id)] * s['image_bytes'] for scheme_id in schemes}
+        for s in stats
+    ]
+    return page_sizes, max(overheads.values())
+
+
+def _greedy_levels(page_sizes, scheme_ids, budget_bytes):
+    """
+    贪心降级：从最保守的方案出发，每次把“再降一级能节省最多字节”的页面降一级，
+    直到预测总大小不超过 budget_bytes。返回每页的降级级数，无法满足预算时返回 None。
+    结果可行但不一定是降级总级数最少的分配，用作精确求解的级数上限。
+    """
+    levels = [0] * len(page_sizes)
+    total = sum(sizes[scheme_ids[0]] for sizes in page_sizes)
+
+    heap = []
+    for page, sizes in enumerate(page_sizes):
+        if len(scheme_ids) > 1:
+            heapq.heappush(heap, (-(sizes[scheme_ids[0]] - sizes[scheme_ids[1]]), page))
+    while total > budget_bytes:
+        if not heap:
+            return None
+        saving, page = heapq.heappop(heap)
+        total += saving
+        levels[page] += 1
+        level = levels[page]
+        if level + 1 < len(scheme_ids):
+            sizes = page_sizes[page]
+            heapq.heappush(heap, (-(sizes[scheme_ids[level]] - sizes[scheme_ids[level + 1]]), page))
+    return levels
+
+
+def assign_schemes(page_sizes, budget_bytes):
+    """
+    为每页分配方案：在预测总大小不超过 budget_bytes 的前提下使页面降级的总级数最少，
+    级数相同时取预测总大小最小的分配（仍相同时优先降级靠前的页面）。
+
+    这是一个多选背包问题：以贪心降级的总级数为上限，按“已用降级级数”做动态规划，
+    dp[L] 为前若干页恰好降级 L 级时的最小总字节数，复杂度为 O(页数 × 方案数 × 级数上限)，
+    结果是精确最优解。
+
+    page_sizes 为 [{方案ID: 字节数}, ...]。返回每页的方案ID列表；
+    所有页面都降到最激进方案仍超出预算时返回 None。
+    """
+    scheme_ids = sorted(page_sizes[0]) if page_sizes else []
+    greedy = _greedy_levels(page_sizes, scheme_ids, budget_bytes)
+    if greedy is None:
+        return None
+    max_levels = sum(greedy)
+    if max_levels == 0:
+        return [scheme_ids[0]] * len(page_sizes)
+
+    dp = [0.0] + [math.inf] * max_levels
+    choices = []
+    for sizes in page_sizes:
+        costs = [sizes[scheme_id] for scheme_id in scheme_ids]
+        best = [d + costs[0] for d in dp]
+        choice = array('B', bytes(len(dp)))
+        for level in range(1, len(costs)):
+            cost = costs[level]
+            for used in range(level, len(dp)):
+                candidate = dp[used - level] + cost
+                if candidate < best[used]:
+                    best[used] = candidate
+                    choice[used] = level
+        dp = best
+        choices.append(choice)
+
+    used = next((level for level, total in enumerate(dp) if total <= budget_bytes), None)
+    if used is None:
+        # 浮点累加顺序不同导致的边界误差：贪心分配本身是可行的
+        return [scheme_ids[level] for level in greedy]
+    levels = []
+    for choice in reversed(choices):
+        levels.append(choice[used])
+        used -= choice[used]
+    return [scheme_ids[level] for level in reversed(levels)]
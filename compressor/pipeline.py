@@ -1,35 +1,105 @@
 # compressor/pipeline.py
 
+import functools
 import logging
 import glob
-import subprocess
+import json
+import queue
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
-from . import utils
+from . import ocr_engine, utils
 
-def deconstruct_pdf_to_images(pdf_path, temp_dir, dpi):
+# OCR 识别语言（简体中文）
+OCR_LANG = 'chi_sim'
+
+# 合并后 hOCR 文件的 HTML 头部
+_HOCR_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"\n'
+    '"http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">\n'
+    '<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en" lang="en">\n'
+    '<head>\n<title></title>\n'
+    '<meta http-equiv="Content-Type" content="text/html;charset=utf-8" />\n'
+    '<meta name="ocr-system" content="tesseract" />\n'
+    '</head>\n<body>\n'
+)
+
+# hOCR 标签扫描：ocr_page 起始标记与 div 开闭标签
+_OCR_PAGE_START = b"<div class='ocr_page'"
+_DIV_TAG_RE = re.compile(rb"<div[\s>]|</div>")
+
+# hOCR title 属性及其中需要随图像分辨率缩放的坐标/尺寸字段
+_HOCR_TITLE_RE = re.compile(rb"""title=(['"])(.*?)\1""")
+_HOCR_BBOX_RE = re.compile(rb"\bbbox (\d+) (\d+) (\d+) (\d+)")
+_HOCR_SIZE_RE = re.compile(rb"\b(x_size|x_descenders|x_ascenders) (-?[\d.]+)")
+_HOCR_BASELINE_RE = re.compile(rb"\bbaseline (-?[\d.]+) (-?\d+)")
+_HOCR_SCAN_RES_RE = re.compile(rb"\bscan_res \d+ \d+")
+
+# 页面与单词的边界框（用于计算文字覆盖率）
+_HOCR_BOX_RE = re.compile(rb"""class=['"](ocr_page|ocrx_word)['"][^>]*?\bbbox (\d+) (\d+) (\d+) (\d+)""")
+
+# 流水线模式中生产者线程的结束/失败标记
+_PIPELINE_DONE = object()
+_PIPELINE_FAILED = object()
+
+def deconstruct_pdf_to_images(pdf_path, temp_dir, dpi, workers=1, first_page=None, last_page=None, deadline=None):
     """
     使用 pdftoppm 将 PDF 转换为 JPEG 图像序列。
     返回生成的图像文件路径列表。
     
     注意: 使用 JPEG 格式（质量85）可将单页文件从 25MB 压缩到约 0.5-1.5MB，
     显著提升处理速度并减少磁盘占用。JPEG 压缩对 OCR 识别率影响很小。
+
+    当 workers > 1 时，按页码区间将文档切分为若干分片，每个分片由一个独立的
+    pdftoppm -f/-l 进程并行光栅化。pdftoppm 按文档总页数决定页码补零宽度，
+    因此分片输出的 page-NNN.jpg 命名与单进程模式完全一致。
+
+    指定 first_page/last_page 时只光栅化该页码区间，并只返回该区间的图像
+    （供流水线模式逐块生产页面）。
+
+    deadline（time.monotonic() 时刻）为可选的截止时间，剩余时间作为各 pdftoppm 命令的超时。
     """
-    logging.info(f"阶段1 [解构]: 开始将 {pdf_path.name} 转换为图像 (DPI: {dpi})...")
     output_prefix = temp_dir / "page"
-    command = [
-        "pdftoppm",
-        "-jpeg",              # 使用 JPEG 格式（有损压缩）
-        "-jpegopt", "quality=85",  # 设置 JPEG 质量为 85（平衡质量和体积）
-        "-r", str(dpi),
-        str(pdf_path),
-        str(output_prefix)
-    ]
-    if not utils.run_command(command):
+    page_range = None
+    if first_page is not None and last_page is not None:
+        page_range = (first_page, last_page)
+        logging.info(f"阶段1 [解构]: 光栅化 {pdf_path.name} 第 {first_page}-{last_page} 页 (DPI: {dpi})...")
+    else:
+        logging.info(f"阶段1 [解构]: 开始将 {pdf_path.name} 转换为图像 (DPI: {dpi})...")
+
+    page_ranges = []
+    if workers and workers > 1 and page_range is None:
+        total_pages = get_pdf_page_count(pdf_path, timeout=_remaining(deadline))
+        page_ranges = split_page_ranges(total_pages, workers)
+
+    if len(page_ranges) > 1:
+        logging.info(f"分片光栅化: {len(page_ranges)} 个 pdftoppm 进程并行处理 {page_ranges[-1][1]} 页")
+        with ThreadPoolExecutor(max_workers=len(page_ranges)) as executor:
+            futures = [
+                executor.submit(
+                    utils.run_command,
+                    _build_pdftoppm_command(pdf_path, output_prefix, dpi, first, last),
+                    timeout=_remaining(deadline)
+                )
+                for first, last in page_ranges
+            ]
+            success = all(future.result() for future in futures)
+    else:
+        success = utils.run_command(_build_pdftoppm_command(pdf_path, output_prefix, dpi, *(page_range or ())),
+                                    timeout=_remaining(deadline))
+
+    if not success:
         logging.error("PDF解构失败。")
         return None
     
     # JPEG 文件扩展名为 .jpg
     image_files = sorted(glob.glob(f"{output_prefix}-*.jpg"))
+    if page_range is not None:
+        image_files = [f for f in image_files if first_page <= _page_number(f) <= last_page]
     if not image_files:
         logging.error("未生成任何图像文件。")
         return None
@@ -37,105 +107,537 @@ def deconstruct_pdf_to_images(pdf_path, temp_dir, dpi):
     logging.info(f"成功生成 {len(image_files)} 页图像。")
     return [Path(f) for f in image_files]
 
-def analyze_images_to_hocr(image_files, temp_dir):
+def _build_pdftoppm_command(pdf_path, output_prefix, dpi, first_page=None, last_page=None):
+    """构造 pdftoppm 命令，可选地限定页码区间。"""
+    command = [
+        "pdftoppm",
+        "-jpeg",              # 使用 JPEG 格式（有损压缩）
+        "-jpegopt", "quality=85",  # 设置 JPEG 质量为 85（平衡质量和体积）
+        "-r", str(dpi),
+    ]
+    if first_page is not None and last_page is not None:
+        command += ["-f", str(first_page), "-l", str(last_page)]
+    command += [str(pdf_path), str(output_prefix)]
+    return command
+
+def _page_number(image_path):
+    """从 page-NNN.jpg 形式的文件名中解析页码。"""
+    return int(Path(image_path).stem.rsplit('-', 1)[1])
+
+def split_page_ranges(total_pages, shard_count):
+    """
+    将 1..total_pages 切分为至多 shard_count 个连续且尽量均衡的页码区间。
+    返回 [(first, last), ...]，页码从1开始、闭区间。
+    """
+    if total_pages <= 0 or shard_count <= 0:
+        return []
+    shard_count = min(shard_count, total_pages)
+    base, extra = divmod(total_pages, shard_count)
+    ranges = []
+    first = 1
+    for i in range(shard_count):
+        size = base + (1 if i < extra else 0)
+        ranges.append((first, first + size - 1))
+        first += size
+    return ranges
+
+def analyze_images_to_hocr(image_files, temp_dir, workers=1, backend='page', cache=None, on_page=None, deadline=None):
     """
     使用 tesseract 对图像进行 OCR，生成并合并 hOCR 文件。
     返回合并后的 hOCR 文件路径。
+
+    当 workers > 1 时使用有界工作池并发识别各页，每个 tesseract 进程通过
+    OMP_THREAD_LIMIT=1 限制为单线程，避免与其他页面争抢CPU核心。
+    任一页面失败会立即取消尚未开始的页面并返回 None。
+
+    backend 选择 OCR 后端（见 OCR_BACKENDS）：'page' 每页启动一次 tesseract；
+    'batch' 每个工作线程只启动一次 tesseract，通过图像列表文件批量识别，
+    再将多页 hOCR 拆回逐页结果，从而省去重复的进程启动与语言模型加载；
+    'inprocess' 使用常驻工作进程中的 tesseract 引擎（需安装 tesserocr）。
+
+    cache 为可选的 ocr_cache.OcrCache，命中的页面直接复用缓存中的 hOCR。
+    on_page 为可选的进度回调，每完成一批页面的 OCR 时以新完成的页数调用。
+    deadline（time.monotonic() 时刻）为可选的截止时间，剩余时间作为每次识别的超时。
     """
-    logging.info(f"阶段2 [分析]: 开始对 {len(image_files)} 张图像进行 OCR...")
+    logging.info(f"阶段2 [分析]: 开始对 {len(image_files)} 张图像进行 OCR (后端: {backend})...")
+    hocr_files = _ocr_images(image_files, temp_dir, workers, backend, cache, on_page=on_page, deadline=deadline)
+    _finish_ocr_cache(cache)
+    if hocr_files is None:
+        return None
+
+    # 合并所有 hocr 文件
+    combined_hocr_path = temp_dir / "combined.hocr"
+    logging.info(f"合并 hOCR 文件到 {combined_hocr_path}...")
+    try:
+        with open(combined_hocr_path, 'wb') as outfile:
+            _write_hocr_header(outfile)
+            # 合并每个页面的内容
+            for hocr_file in hocr_files:
+                _append_hocr_page(outfile, hocr_file)
+            _write_hocr_footer(outfile)
+            
+    except IOError as e:
+        logging.error(f"合并 hOCR 文件时出错: {e}")
+        return None
+
+    logging.info("hOCR 文件合并成功。")
+    return combined_hocr_path
+
+def _write_hocr_header(outfile):
+    """写入合并后 hOCR 文件的 HTML 头部（outfile 为二进制模式）。"""
+    outfile.write(_HOCR_HEADER.encode('utf-8'))
+
+def _write_hocr_footer(outfile):
+    """写入合并后 hOCR 文件的 HTML 尾部。"""
+    outfile.write(b'</body>\n</html>\n')
+
+def _iter_ocr_page_segments(infile):
+    """
+    流式扫描二进制 hOCR 文件，逐段产出属于 ocr_page 子树的字节片段。
+
+    以行为单位读取，用正则只定位 <div 与 </div> 标签并维护嵌套深度，
+    整个文件只扫描一遍，内存占用与单行长度相关而与文件大小无关。
+
+    产出 (offset, data, page_end)：offset 为片段在文件中的字节偏移，
+    page_end 表示该片段是否结束了一个 ocr_page。文件在页面中途结束时，
+    会额外产出一个 offset 为 None 的补全片段（若干 </div>）。
+    """
+    depth = 0
+    offset = 0
+    for line in infile:
+        pos = 0
+        while pos < len(line):
+            if depth == 0:
+                start = line.find(_OCR_PAGE_START, pos)
+                if start == -1:
+                    break
+            else:
+                start = pos
+            end = -1
+            for match in _DIV_TAG_RE.finditer(line, start):
+                depth += -1 if match.group().startswith(b'</') else 1
+                if depth == 0:
+                    end = match.end()
+                    break
+            if end == -1:
+                yield offset + start, line[start:], False
+                break
+            yield offset + start, line[start:end], True
+            pos = end
+        offset += len(line)
+    if depth > 0:
+        yield None, b'</div>' * depth, True
+
+def _append_hocr_page(outfile, hocr_file):
+    """从 hOCR 文件中提取所有 ocr_page 内容并流式追加到合并文件。"""
+    with open(hocr_file, 'rb') as infile:
+        for offset, data, page_end in _iter_ocr_page_segments(infile):
+            if offset is None:
+                logging.warning(f"hOCR 文件 {hocr_file} 中的页面未正确闭合，已自动补全。")
+            outfile.write(data)
+            if page_end:
+                outfile.write(b'\n')
+
+def _page_hocr_path(img_path, temp_dir):
+    """单页 hOCR 结果的存放路径（与图像同名，扩展名为 .hocr）。"""
+    return temp_dir / f"{img_path.stem}.hocr"
+
+def _ocr_per_page(images, temp_dir, extra_env=None, deadline=None):
+    """'page' 后端：对每张图像单独运行一次 tesseract。"""
     hocr_files = []
-    
-    for i, img_path in enumerate(image_files):
+    for img_path in images:
         output_prefix = temp_dir / img_path.stem
         command = [
             "tesseract",
             str(img_path),
             str(output_prefix),
-            "-l", "chi_sim",  # 简体中文
+            "-l", OCR_LANG,
             "hocr"
         ]
-        if not utils.run_command(command):
+        if not utils.run_command(command, extra_env=extra_env, timeout=_remaining(deadline)):
             logging.error(f"对图像 {img_path.name} 的 OCR 失败。")
             return None
-        hocr_files.append(Path(f"{output_prefix}.hocr"))
-        logging.info(f"完成 OCR: {i+1}/{len(image_files)}")
+        hocr_files.append(_page_hocr_path(img_path, temp_dir))
+    return hocr_files
 
-    # 合并所有 hocr 文件
+def _ocr_list_file(images, temp_dir, extra_env=None, deadline=None):
+    """
+    'batch' 后端：将图像路径写入列表文件，由一次 tesseract 调用识别全部图像，
+    再把输出的多页 hOCR 按页拆分为与 'page' 后端同名的单页文件。
+    """
+    batch_name = f"ocr_batch_{images[0].stem}"
+    list_file = temp_dir / f"{batch_name}.txt"
+    output_prefix = temp_dir / batch_name
+    with open(list_file, 'w', encoding='utf-8') as f:
+        f.write(''.join(f"{img}\n" for img in images))
+
+    command = [
+        "tesseract",
+        str(list_file),
+        str(output_prefix),
+        "-l", OCR_LANG,
+        "hocr"
+    ]
+    if not utils.run_command(command, extra_env=extra_env, timeout=_remaining(deadline)):
+        logging.error(f"批量 OCR 失败: {images[0].name} 起共 {len(images)} 张图像。")
+        return None
+    return _split_multipage_hocr(Path(f"{output_prefix}.hocr"), images, temp_dir)
+
+def _split_multipage_hocr(multipage_hocr, images, temp_dir):
+    """将多页 hOCR 中的第 i 个 ocr_page 写入 images[i] 对应的单页 hOCR 文件。"""
+    hocr_files = [_page_hocr_path(img, temp_dir) for img in images]
+    page_index = 0
+    outfile = None
+    try:
+        with open(multipage_hocr, 'rb') as infile:
+            for _, data, page_end in _iter_ocr_page_segments(infile):
+                if page_index >= len(hocr_files):
+                    break
+                if outfile is None:
+                    outfile = open(hocr_files[page_index], 'wb')
+                    _write_hocr_header(outfile)
+                outfile.write(data)
+                if page_end:
+                    outfile.write(b'\n')
+                    _write_hocr_footer(outfile)
+                    outfile.close()
+                    outfile = None
+                    page_index += 1
+    except IOError as e:
+        logging.error(f"拆分多页 hOCR 文件 {multipage_hocr} 时出错: {e}")
+        return None
+    finally:
+        if outfile is not None:
+            outfile.close()
+
+    if page_index != len(hocr_files):
+        logging.error(f"多页 hOCR {multipage_hocr.name} 含 {page_index} 页，与输入图像数 {len(hocr_files)} 不符。")
+        return None
+    return hocr_files
+
+def _ocr_in_process(images, temp_dir, extra_env=None, workers=1, deadline=None):
+    """
+    'inprocess' 后端：由常驻于工作进程中的 tesseract 引擎识别图像，hOCR 以字符串返回。
+    workers 为引擎进程数（即页面 OCR 并发度）。未安装 tesserocr 时退回 'page' 子进程后端。
+    """
+    if not ocr_engine.is_available():
+        global _inprocess_fallback_warned
+        if not _inprocess_fallback_warned:
+            _inprocess_fallback_warned = True
+            logging.warning("未安装 tesserocr，进程内 OCR 后端退回逐页 tesseract 子进程模式。")
+        return _ocr_per_page(images, temp_dir, extra_env, deadline=deadline)
+
+    hocr_files = []
+    for img_path in images:
+        try:
+            page_hocr = ocr_engine.recognize(img_path, lang=OCR_LANG, workers=workers, timeout=_remaining(deadline))
+        except Exception as e:
+            logging.error(f"对图像 {img_path.name} 的进程内 OCR 失败: {e}")
+            return None
+        hocr_file = _page_hocr_path(img_path, temp_dir)
+        with open(hocr_file, 'wb') as outfile:
+            _write_hocr_header(outfile)
+            outfile.write(page_hocr.encode('utf-8'))
+            outfile.write(b'\n')
+            _write_hocr_footer(outfile)
+        hocr_files.append(hocr_file)
+    return hocr_files
+
+_inprocess_fallback_warned = False
+
+# OCR 后端注册表：名称 -> 函数(images, temp_dir, extra_env, deadline=None) -> 逐页 hOCR 路径列表或 None
+OCR_BACKENDS = {
+    'page': _ocr_per_page,
+    'batch': _ocr_list_file,
+    'inprocess': _ocr_in_process,
+}
+
+def _resolve_ocr_backend(backend, cache=None, workers=1, deadline=None):
+    """
+    返回后端对应的 OCR 函数；提供缓存时包装为先查缓存、只识别未命中页面的函数。
+    'inprocess' 后端的引擎进程数取 workers；deadline 传给后端作为识别的截止时间。
+    """
+    ocr_fn = OCR_BACKENDS.get(backend)
+    if ocr_fn is None:
+        logging.error(f"未知的 OCR 后端: {backend}")
+        return None
+    if backend == 'inprocess':
+        ocr_fn = functools.partial(ocr_fn, workers=workers, deadline=deadline)
+    elif deadline is not None:
+        ocr_fn = functools.partial(ocr_fn, deadline=deadline)
+    if cache is None:
+        return ocr_fn
+
+    def cached_ocr_fn(images, temp_dir, extra_env=None):
+        misses = []
+        for img_path in images:
+            key = cache.key_for(img_path, OCR_LANG)
+            data = cache.lookup(key)
+            if data is None:
+                misses.append((img_path, key))
+            else:
+                _page_hocr_path(img_path, temp_dir).write_bytes(data)
+        if misses:
+            miss_hocr = ocr_fn([img_path for img_path, _ in misses], temp_dir, extra_env)
+            if miss_hocr is None:
+                return None
+            for (_, key), hocr_file in zip(misses, miss_hocr):
+                cache.store(key, hocr_file)
+        return [_page_hocr_path(img_path, temp_dir) for img_path in images]
+
+    return cached_ocr_fn
+
+def _finish_ocr_cache(cache):
+    """OCR 结束后执行缓存容量控制并输出命中统计。"""
+    if cache is not None:
+        cache.prune()
+        cache.log_stats()
+
+def _make_ocr_tasks(image_files, workers, backend):
+    """按后端特点将图像切分为任务：'page' 每页一个任务，'batch' 每个工作线程一个连续分组。"""
+    if backend == 'batch':
+        return [image_files[first - 1:last] for first, last in split_page_ranges(len(image_files), workers)]
+    return [[img] for img in image_files]
+
+def _ocr_images(image_files, temp_dir, workers=1, backend='page', cache=None, on_page=None, deadline=None):
+    """
+    对图像列表执行 OCR，返回与 image_files 顺序一致的 hOCR 路径列表，失败时返回 None。
+    on_page 不为 None 时，每个任务完成后以该任务的页数调用。
+    """
+    total = len(image_files)
+    workers = max(1, min(workers or 1, total))
+    ocr_fn = _resolve_ocr_backend(backend, cache, workers=workers, deadline=deadline)
+    if ocr_fn is None:
+        return None
+    tasks = _make_ocr_tasks(image_files, workers, backend)
+
+    if workers == 1:
+        hocr_files = []
+        for task in tasks:
+            task_hocr = ocr_fn(task, temp_dir)
+            if task_hocr is None:
+                return None
+            hocr_files.extend(task_hocr)
+            logging.info(f"完成 OCR: {len(hocr_files)}/{total}")
+            if on_page is not None:
+                on_page(len(task_hocr))
+        return hocr_files
+
+    logging.info(f"并行 OCR: {workers} 个工作线程，每个 tesseract 限制为单线程")
+    single_thread_env = {'OMP_THREAD_LIMIT': '1'}
+    hocr_files = [None] * total
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        future_to_start = {}
+        start = 0
+        for task in tasks:
+            future_to_start[executor.submit(ocr_fn, task, temp_dir, single_thread_env)] = start
+            start += len(task)
+        completed = 0
+        for future in as_completed(future_to_start):
+            task_hocr = future.result()
+            if task_hocr is None:
+                # 快速失败：取消所有尚未开始的任务
+                cancelled = sum(1 for f in future_to_start if f.cancel())
+                logging.error(f"OCR 失败，已取消 {cancelled} 个待处理任务。")
+                return None
+            first = future_to_start[future]
+            hocr_files[first:first + len(task_hocr)] = task_hocr
+            completed += len(task_hocr)
+            logging.info(f"完成 OCR: {completed}/{total}")
+            if on_page is not None:
+                on_page(len(task_hocr))
+    return hocr_files
+
+def rasterize_and_analyze(pdf_path, temp_dir, dpi, workers=1, chunk_pages=4, backend='page', cache=None,
+                          on_page=None, deadline=None):
+    """
+    流水线式执行阶段1和阶段2：边光栅化边 OCR。
+
+    生产者线程按 chunk_pages 页一块调用 deconstruct_pdf_to_images，最多 workers 个
+    pdftoppm 进程并行光栅化相邻的页面块，并按页码顺序将完成的块放入有界队列；
+    消费者把页面交给 OCR 工作池（'page' 后端逐页提交，'batch' 后端整块提交），
+    并按页码顺序将完成的 hOCR 片段追加到 combined.hocr。
+    这样第1页的 OCR 可以在第50页仍在渲染时开始。
+    'batch' 后端的块大小取 总页数/workers，与分阶段模式一样只启动 workers 个 tesseract 进程。
+    on_page 为可选的进度回调，每完成一批页面的 OCR 时以新完成的页数调用；
+    deadline（time.monotonic() 时刻）为可选的截止时间，剩余时间作为光栅化与 OCR 命令的超时。
+
+    返回 (image_files, combined_hocr_path)，失败时返回 None。
+    无法获取页数时退回到先解构、后分析的分阶段模式。
+    """
+    total_pages = get_pdf_page_count(pdf_path, timeout=_remaining(deadline))
+    if total_pages <= 0:
+        logging.warning("无法获取页数，流水线模式退回分阶段处理。")
+        image_files = deconstruct_pdf_to_images(pdf_path, temp_dir, dpi, workers=workers, deadline=deadline)
+        if not image_files:
+            return None
+        hocr_file = analyze_images_to_hocr(image_files, temp_dir, workers=workers, backend=backend, cache=cache,
+                                           on_page=on_page, deadline=deadline)
+        if not hocr_file:
+            return None
+        return image_files, hocr_file
+
+    workers = max(1, workers or 1)
+    ocr_fn = _resolve_ocr_backend(backend, cache, workers=workers, deadline=deadline)
+    if ocr_fn is None:
+        return None
+    if backend == 'batch':
+        # 每个 tesseract 进程都要加载一次语言模型：块数与工作线程数相同
+        chunk_pages = max(chunk_pages, -(-total_pages // workers))
+    chunk_count = -(-total_pages // max(1, chunk_pages))
+    chunks = split_page_ranges(total_pages, chunk_count)
+    # 在途页面上限：已渲染未提交的页面 + 正在/等待 OCR 的页面
+    max_in_flight = max(workers * 2, chunk_pages)
+    page_queue = queue.Queue(maxsize=max(2, workers))
+    stop_event = threading.Event()
+    logging.info(
+        f"阶段1+2 [流水线]: {pdf_path.name} 共 {total_pages} 页，"
+        f"分 {len(chunks)} 块光栅化（最多 {workers} 块并行），{workers} 个 OCR 工作线程 (后端: {backend})"
+    )
+
+    def _put(item):
+        # 带超时的阻塞写入，以便消费者失败时生产者能及时退出
+        while not stop_event.is_set():
+            try:
+                page_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        # 最多 workers 个页面块同时光栅化，完成后仍按页码顺序放入队列
+        raster_futures = deque()
+        next_chunk = 0
+        try:
+            with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as rasterizer:
+                while raster_futures or next_chunk < len(chunks):
+                    while next_chunk < len(chunks) and len(raster_futures) < workers and not stop_event.is_set():
+                        first, last = chunks[next_chunk]
+                        raster_futures.append(rasterizer.submit(
+                            deconstruct_pdf_to_images, pdf_path, temp_dir, dpi, first_page=first, last_page=last,
+                            deadline=deadline
+                        ))
+                        next_chunk += 1
+                    if stop_event.is_set():
+                        break
+                    images = raster_futures.popleft().result()
+                    if not images:
+                        _put(_PIPELINE_FAILED)
+                        break
+                    if not _put(images):
+                        break
+                else:
+                    _put(_PIPELINE_DONE)
+                for future in raster_futures:
+                    future.cancel()
+        except Exception as e:
+            logging.error(f"流水线光栅化线程异常: {e}", exc_info=True)
+            _put(_PIPELINE_FAILED)
+
+    extra_env = {'OMP_THREAD_LIMIT': '1'} if workers > 1 else None
     combined_hocr_path = temp_dir / "combined.hocr"
-    logging.info(f"合并 hOCR 文件到 {combined_hocr_path}...")
+    image_files = []
+    finished = {}
+    next_to_write = 0
+    producer = threading.Thread(target=_produce, name="pdftoppm-producer", daemon=True)
+    producer.start()
     try:
-        with open(combined_hocr_path, 'w', encoding='utf-8') as outfile:
-            # 写入HTML头部
-            outfile.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-            outfile.write('<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"\n')
-            outfile.write('"http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">\n')
-            outfile.write('<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en" lang="en">\n')
-            outfile.write('<head>\n<title></title>\n')
-            outfile.write('<meta http-equiv="Content-Type" content="text/html;charset=utf-8" />\n')
-            outfile.write('<meta name="ocr-system" content="tesseract" />\n')
-            outfile.write('</head>\n<body>\n')
-            
-            # 合并每个页面的内容
-            for hocr_file in hocr_files:
-                with open(hocr_file, 'r', encoding='utf-8') as infile:
-                    content = infile.read()
-                    # 提取页面内容(去掉HTML头部和尾部)
-                    start_marker = '<div class=\'ocr_page\''
-                    end_marker = '</div>'
-                    
-                    start_idx = content.find(start_marker)
-                    if start_idx != -1:
-                        # 找到对应的结束标签
-                        page_content = content[start_idx:]
-                        # 找到完整的div结束
-                        div_count = 0
-                        end_idx = -1
-                        for i, char in enumerate(page_content):
-                            if page_content[i:i+5] == '<div ':
-                                div_count += 1
-                            elif page_content[i:i+6] == '</div>':
-                                div_count -= 1
-                                if div_count == 0:
-                                    end_idx = i + 6
-                                    break
-                        
-                        if end_idx != -1:
-                            outfile.write(page_content[:end_idx] + '\n')
-                        else:
-                            # 备用方案：查找第一个</div>
-                            first_end = page_content.find('</div>')
-                            if first_end != -1:
-                                outfile.write(page_content[:first_end + 6] + '\n')
-            
-            outfile.write('</body>\n</html>\n')
-            
+        with open(combined_hocr_path, 'wb') as outfile, \
+                ThreadPoolExecutor(max_workers=workers) as executor:
+            _write_hocr_header(outfile)
+            pending = {}
+            in_flight = 0
+            producing = True
+            while producing or pending:
+                if producing and in_flight < max_in_flight:
+                    item = page_queue.get()
+                    if item is _PIPELINE_DONE:
+                        producing = False
+                    elif item is _PIPELINE_FAILED:
+                        logging.error("流水线光栅化失败。")
+                        for future in pending:
+                            future.cancel()
+                        return None
+                    else:
+                        tasks = [item] if backend == 'batch' else [[img] for img in item]
+                        for task in tasks:
+                            future = executor.submit(ocr_fn, task, temp_dir, extra_env)
+                            pending[future] = (len(image_files), len(task))
+                            image_files.extend(task)
+                            in_flight += len(task)
+                    done = [f for f in pending if f.done()]
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    first, count = pending.pop(future)
+                    in_flight -= count
+                    task_hocr = future.result()
+                    if task_hocr is None:
+                        cancelled = sum(1 for f in pending if f.cancel())
+                        logging.error(f"OCR 失败，已取消 {cancelled} 个待处理任务。")
+                        return None
+                    for offset, hocr_file in enumerate(task_hocr):
+                        finished[first + offset] = hocr_file
+                    if on_page is not None:
+                        on_page(len(task_hocr))
+
+                # 按页码顺序追加已完成的 hOCR 片段
+                while next_to_write in finished:
+                    _append_hocr_page(outfile, finished.pop(next_to_write))
+                    next_to_write += 1
+                    logging.info(f"完成 OCR: {next_to_write}/{total_pages}")
+
+            _write_hocr_footer(outfile)
     except IOError as e:
         logging.error(f"合并 hOCR 文件时出错: {e}")
         return None
+    finally:
+        stop_event.set()
+        producer.join()
+        _finish_ocr_cache(cache)
 
-    logging.info("hOCR 文件合并成功。")
-    return combined_hocr_path
+    if not image_files:
+        logging.error("未生成任何图像文件。")
+        return None
+    logging.info(f"流水线完成: {len(image_files)} 页图像，hOCR 已合并到 {combined_hocr_path}")
+    return image_files, combined_hocr_path
 
-def reconstruct_pdf(image_files, hocr_file, temp_dir, params, output_pdf_path):
+class SizeLimitExceeded(Exception):
+    """重建输出已确定超出大小上限，重建被提前终止。size_mb 为终止时已确定的大小下限。"""
+
+    def __init__(self, size_mb):
+        super().__init__(f"重建输出已超过大小上限 (至少 {size_mb:.2f}MB)")
+        self.size_mb = size_mb
+
+def reconstruct_pdf(image_files, hocr_file, temp_dir, params, output_pdf_path, shards=1,
+                    size_limit_mb=None, cancel_event=None, timeout=None):
     """
     使用 recode_pdf 重建 PDF。
+
+    shards > 1 时按页码区间把图像栈与 hOCR 切分为若干分片，每个分片由一个独立的
+    recode_pdf 进程并行重建，再用 qpdf --pages 按顺序合并为最终输出。
+
+    指定 size_limit_mb 时，已完成分片的大小之和按启发式下限判断超出上限后终止其余分片并抛出
+    SizeLimitExceeded。shards 为 1 时按 EARLY_ABORT_CHUNKS 个分片重建：未超限时直接合并这些分片
+    作为输出，每页只编码一次。
+    cancel_event 被设置时终止正在运行的 recode_pdf；timeout 为整个重建（含分片合并）的超时秒数。
     """
+    if image_files and len(image_files) > 1:
+        if size_limit_mb is not None and not (shards and shards > 1):
+            shards = EARLY_ABORT_CHUNKS
+        if shards and shards > 1:
+            result = _reconstruct_sharded(image_files, hocr_file, params, output_pdf_path, shards, shards, size_limit_mb,
+                                          timeout=timeout)
+            if result is not None:
+                return result
+
     logging.info(f"阶段3 [重建]: 使用参数 {params} 重建 PDF...")
-    
-    # recode_pdf 需要一个 glob 模式（支持 JPEG 和 TIFF）
-    # 根据实际生成的图像文件确定扩展名
-    if image_files and len(image_files) > 0:
-        # 从第一个文件获取扩展名
-        first_file = Path(image_files[0])
-        ext = first_file.suffix  # 例如: .jpg 或 .tif
-        image_stack_glob = str(temp_dir / f"page-*{ext}")
-    else:
-        # 后备方案：默认使用 jpg（与新的 JPEG 格式匹配）
-        image_stack_glob = str(temp_dir / "page-*.jpg")
 
     command = [
         "recode_pdf",
-        "--from-imagestack", image_stack_glob,
+        "--from-imagestack", _image_stack_glob(image_files, temp_dir),
         "--hocr-file", str(hocr_file),
         "--dpi", str(params['dpi']),
         "--bg-downsample", str(params['bg_downsample']),
@@ -144,29 +646,456 @@ def reconstruct_pdf(image_files, hocr_file, temp_dir, params, output_pdf_path):
         "-o", str(output_pdf_path)
     ]
     
-    if not utils.run_command(command):
-        logging.error("PDF 重建失败。")
+    if not utils.run_command(command, cancel_event=cancel_event, timeout=timeout):
+        if cancel_event is None or not cancel_event.is_set():
+            logging.error("PDF 重建失败。")
         return False
         
     logging.info(f"PDF 重建成功，输出至 {output_pdf_path}")
     return True
 
-def get_pdf_page_count(pdf_path):
-    """使用 pdfinfo 获取PDF的总页数。"""
-    command = ["pdfinfo", str(pdf_path)]
-    try:
-        result = subprocess.run(
-            command, 
-            check=True, 
-            capture_output=True, 
-            text=True, 
-            encoding='utf-8'
+def _image_stack_glob(image_files, temp_dir):
+    """
+    recode_pdf 需要一个 glob 模式（支持 JPEG 和 TIFF）。
+    根据实际生成的图像文件确定扩展名与所在目录（各 DPI 图像栈位于各自的子目录中）。
+    """
+    if image_files and len(image_files) > 0:
+        # 从第一个文件获取扩展名
+        first_file = Path(image_files[0])
+        ext = first_file.suffix  # 例如: .jpg 或 .tif
+        return str(first_file.parent / f"page-*{ext}")
+    # 后备方案：默认使用 jpg（与新的 JPEG 格式匹配）
+    return str(Path(temp_dir) / "page-*.jpg")
+
+# 共享 MRC 分层的辅助脚本，由 archive-pdf-tools 所在环境的解释器运行
+MRC_VARIANTS_SCRIPT = Path(__file__).with_name("mrc_variants.py")
+
+# 辅助脚本所依赖的内部模块与默认参数已核对过的 archive-pdf-tools 版本；其他版本一律退回 recode_pdf
+MRC_VARIANTS_VERSIONS = ('1.5.7',)
+
+@functools.lru_cache(maxsize=None)
+def archive_pdf_tools_version():
+    """返回 recode_pdf --version 报告的 archive-pdf-tools 版本（如 '1.5.7'），无法获取时返回 None。"""
+    output = utils.run_command_output(["recode_pdf", "--version"])
+    return output.split()[-1] if output and output.strip() else None
+
+def reconstruct_mrc_variants(image_files, hocr_file, temp_dir, dpi, variants, timeout=None):
+    """
+    一次重建同一图像栈与 DPI 下的多组重建参数：每页的 MRC 分层（文字掩码、前景、背景）只计算一次，
+    各变体只按自己的 bg_downsample 与编码器重新编码背景（前景按编码器各编码一次）。
+    variants 为 [(params, output_pdf_path), ...]。
+
+    分层计算需要调用 archive-pdf-tools 的内部模块，因此由 mrc_variants.py 辅助脚本在 recode_pdf
+    所在的 Python 环境（pipx 虚拟环境）中运行。这些内部模块不是公开接口，因此只在
+    MRC_VARIANTS_VERSIONS 列出的版本上使用。版本不符、找不到该解释器、hOCR 页数与图像数不一致、
+    辅助脚本失败或超时时不保留任何输出并返回 False，由调用方逐个变体使用 recode_pdf 重建。
+    """
+    version = archive_pdf_tools_version()
+    if version not in MRC_VARIANTS_VERSIONS:
+        logging.warning(
+            f"archive-pdf-tools 版本 {version or '未知'} 不在共享 MRC 分层支持的版本 "
+            f"({', '.join(MRC_VARIANTS_VERSIONS)}) 中，退回 recode_pdf。"
         )
-        for line in result.stdout.splitlines():
-            if line.startswith("Pages:"):
+        return False
+    python = utils.find_recode_pdf_python()
+    if python is None:
+        logging.warning("未找到 recode_pdf 所在的 Python 环境，无法共享 MRC 分层。")
+        return False
+    page_index = index_hocr_pages(hocr_file)
+    if page_index is None or len(page_index) != len(image_files):
+        logging.warning("hOCR 页面索引与图像数不一致，无法共享 MRC 分层。")
+        return False
+
+    job_file = Path(temp_dir) / f"mrc_variants_{dpi:03d}.json"
+    job = {
+        'image_glob': _image_stack_glob(image_files, temp_dir),
+        'hocr_file': str(hocr_file),
+        'dpi': dpi,
+        'tmp_dir': str(temp_dir),
+        'supported_versions': list(MRC_VARIANTS_VERSIONS),
+        'variants': [
+            {
+                'bg_downsample': params['bg_downsample'],
+                'jpeg2000_encoder': params.get('jpeg2000_encoder', 'openjpeg'),
+                'output': str(output_pdf_path),
+            }
+            for params, output_pdf_path in variants
+        ],
+    }
+    with open(job_file, 'w', encoding='utf-8') as f:
+        json.dump(job, f, ensure_ascii=False)
+
+    names = ', '.join(params['name'] for params, _ in variants)
+    logging.info(f"阶段3 [重建]: 以共享的 MRC 分层重建 {dpi} DPI 方案 {names}")
+    try:
+        command = [python, str(MRC_VARIANTS_SCRIPT), "--dpi", str(dpi), str(job_file)]
+        success = utils.run_command(command, timeout=timeout)
+    finally:
+        job_file.unlink()
+    missing = [str(path) for _, path in variants if not Path(path).exists()]
+    if success and not missing:
+        return True
+    logging.warning(f"共享 MRC 分层重建失败或输出不完整: {names}")
+    for _, path in variants:
+        _unlink_if_exists(path)
+    return False
+
+def _unlink_if_exists(path):
+    try:
+        Path(path).unlink()
+    except FileNotFoundError:
+        pass
+
+def _scale_number(value, factor):
+    return str(int(round(float(value) * factor))).encode('ascii')
+
+def _rescale_hocr_title(title, factor, dpi):
+    """缩放单个 title 属性值中的 bbox、字号、基线偏移，并更新 scan_res。"""
+    title = _HOCR_BBOX_RE.sub(
+        lambda m: b"bbox " + b" ".join(_scale_number(v, factor) for v in m.groups()), title
+    )
+    title = _HOCR_SIZE_RE.sub(
+        lambda m: m.group(1) + b" " + f"{float(m.group(2)) * factor:.2f}".encode('ascii'), title
+    )
+    title = _HOCR_BASELINE_RE.sub(
+        lambda m: b"baseline " + m.group(1) + b" " + _scale_number(m.group(2), factor), title
+    )
+    return _HOCR_SCAN_RES_RE.sub(f"scan_res {dpi} {dpi}".encode('ascii'), title)
+
+def rescale_hocr(source_hocr, output_hocr, factor, dpi):
+    """
+    将 hOCR 中的像素坐标按 factor 缩放，使其与 dpi 分辨率的图像匹配。
+    只改写 title 属性，逐行流式处理。
+    """
+    def _rewrite(match):
+        quote = match.group(1)
+        return b"title=" + quote + _rescale_hocr_title(match.group(2), factor, dpi) + quote
+
+    with open(source_hocr, 'rb') as infile, open(output_hocr, 'wb') as outfile:
+        for line in infile:
+            outfile.write(_HOCR_TITLE_RE.sub(_rewrite, line))
+    return Path(output_hocr)
+
+def build_dpi_stack(pdf_path, image_files, hocr_file, temp_dir, dpi, source_dpi, workers=1):
+    """
+    为指定 DPI 生成独立的图像栈：在 temp_dir/dpi_NNN/ 中以该 DPI 重新光栅化 PDF，
+    并把 source_dpi 下的合并 hOCR 坐标缩放到该分辨率。
+    返回 (图像路径列表, hOCR 路径)，失败时返回 None。
+    """
+    stack_dir = Path(temp_dir) / f"dpi_{dpi:03d}"
+    stack_dir.mkdir(parents=True, exist_ok=True)
+    logging.info(f"生成 {dpi} DPI 图像栈: {stack_dir}")
+    stack_images = deconstruct_pdf_to_images(pdf_path, stack_dir, dpi, workers=workers)
+    if not stack_images:
+        return None
+    if len(stack_images) != len(image_files):
+        logging.error(f"{dpi} DPI 图像栈页数 ({len(stack_images)}) 与原图像栈 ({len(image_files)}) 不一致。")
+        return None
+    try:
+        stack_hocr = rescale_hocr(hocr_file, stack_dir / "combined.hocr", dpi / source_dpi, dpi)
+    except IOError as e:
+        logging.error(f"缩放 hOCR 坐标时出错: {e}")
+        return None
+    return stack_images, stack_hocr
+
+def index_hocr_pages(hocr_file):
+    """
+    扫描一遍 hOCR 文件，返回每个 ocr_page 的字节区间 [(start, end), ...]。
+    页面未正确闭合时返回 None。结果按文件路径、大小与修改时间缓存，
+    同一 hOCR 被多个方案分片重建时只扫描一次。
+    """
+    stat = Path(hocr_file).stat()
+    cache_key = (str(hocr_file), stat.st_size, stat.st_mtime_ns)
+    with _hocr_index_lock:
+        if cache_key in _hocr_index_cache:
+            return _hocr_index_cache[cache_key]
+
+    pages = []
+    start = None
+    with open(hocr_file, 'rb') as infile:
+        for offset, data, page_end in _iter_ocr_page_segments(infile):
+            if offset is None:
+                return None
+            if start is None:
+                start = offset
+            if page_end:
+                pages.append((start, offset + len(data)))
+                start = None
+
+    with _hocr_index_lock:
+        _hocr_index_cache[cache_key] = pages
+    return pages
+
+_hocr_index_cache = {}
+_hocr_index_lock = threading.Lock()
+
+def _write_hocr_shard(hocr_file, page_index, first, last, output_hocr):
+    """按页面索引从合并 hOCR 中直接读取第 first..last 页（从0开始、闭区间）写入分片 hOCR。"""
+    _write_hocr_pages(hocr_file, page_index, range(first, last + 1), output_hocr)
+
+def _write_hocr_pages(hocr_file, page_index, pages, output_hocr):
+    """按页面索引从合并 hOCR 中读取 pages（从0开始的页码，按给定顺序）写入新的 hOCR。"""
+    with open(hocr_file, 'rb') as infile, open(output_hocr, 'wb') as outfile:
+        _write_hocr_header(outfile)
+        for page in pages:
+            start, end = page_index[page]
+            infile.seek(start)
+            outfile.write(infile.read(end - start))
+            outfile.write(b'\n')
+        _write_hocr_footer(outfile)
+
+def _hocr_areas(data):
+    """返回 hOCR 内容（bytes）中 (单词边界框总面积, 页面总面积)。"""
+    page_area = 0
+    word_area = 0
+    for match in _HOCR_BOX_RE.finditer(data):
+        x0, y0, x1, y1 = (int(v) for v in match.groups()[1:])
+        area = max(0, x1 - x0) * max(0, y1 - y0)
+        if match.group(1) == b'ocr_page':
+            page_area += area
+        else:
+            word_area += area
+    return word_area, page_area
+
+def hocr_text_coverage(data):
+    """返回 hOCR 内容（bytes）中单词边界框面积占页面面积的比例，没有页面时返回 0。"""
+    word_area, page_area = _hocr_areas(data)
+    return word_area / page_area if page_area else 0.0
+
+def hocr_file_coverage(hocr_file):
+    """
+    返回合并 hOCR 文件整体的文字覆盖率。按页面索引逐页读取，内存占用与单页大小相当；
+    页面未正确闭合时返回 0。
+    """
+    page_index = index_hocr_pages(hocr_file)
+    if not page_index:
+        return 0.0
+    word_area = page_area = 0
+    with open(hocr_file, 'rb') as infile:
+        for start, end in page_index:
+            infile.seek(start)
+            words, page = _hocr_areas(infile.read(end - start))
+            word_area += words
+            page_area += page
+    return word_area / page_area if page_area else 0.0
+
+def hocr_page_coverages(hocr_file):
+    """返回合并 hOCR 中每一页的文字覆盖率列表，页面未正确闭合时返回 None。"""
+    page_index = index_hocr_pages(hocr_file)
+    if page_index is None:
+        return None
+    coverages = []
+    with open(hocr_file, 'rb') as infile:
+        for start, end in page_index:
+            infile.seek(start)
+            coverages.append(hocr_text_coverage(infile.read(end - start)))
+    return coverages
+
+def reconstruct_page_groups(groups, page_count, output_pdf_path, workers=1):
+    """
+    逐页方案重建：每个页面组使用各自的重建参数运行一次 recode_pdf，
+    再用 qpdf --pages 按原页码顺序交错合并为最终输出。
+
+    groups 为 [{'image_files', 'hocr_file', 'pages', 'params', 'strip_text'}, ...]：
+    image_files 与 hocr_file 为该组参数所用图像栈的全部页面，pages 为本组包含的页码（从0开始），
+    strip_text 为真时本组 hOCR 去除文字标签（S7）。所有组的 pages 合起来应覆盖 0..page_count-1。
+    返回 True/False。
+    """
+    output_pdf_path = Path(output_pdf_path)
+    group_root = output_pdf_path.parent / f"{output_pdf_path.stem}_groups"
+    group_root.mkdir(parents=True, exist_ok=True)
+    logging.info(f"阶段3 [重建]: 逐页方案，{len(groups)} 个页面组 (并行 {workers}) 重建 {page_count} 页")
+
+    def _run_group(number, group):
+        page_index = index_hocr_pages(group['hocr_file'])
+        if page_index is None or len(page_index) != len(group['image_files']):
+            logging.error(f"页面组 {number} 的 hOCR 页面索引与图像数不一致。")
+            return None
+        group_dir = group_root / f"group_{number:03d}"
+        group_dir.mkdir(exist_ok=True)
+        pages = sorted(group['pages'])
+        group_images = []
+        for page in pages:
+            image = Path(group['image_files'][page])
+            link = group_dir / image.name
+            if not link.exists():
+                utils.link_or_copy(image, link)
+            group_images.append(link)
+        group_hocr = group_dir / "group.hocr"
+        _write_hocr_pages(group['hocr_file'], page_index, pages, group_hocr)
+        if group.get('strip_text'):
+            optimize_hocr_for_extreme_compression(group_hocr)
+        group_pdf = group_dir / "group.pdf"
+        if not reconstruct_pdf(group_images, group_hocr, group_dir, group['params'], group_pdf):
+            return None
+        return group_pdf
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(groups)))) as executor:
+            group_pdfs = list(executor.map(lambda item: _run_group(*item), enumerate(groups, 1)))
+        if any(pdf is None for pdf in group_pdfs):
+            logging.error("部分页面组重建失败。")
+            return False
+
+        # 每一页在其所属组输出中的位置（从1开始），连续的同组页面合并为一个页码区间
+        owner = {}
+        for group_pdf, group in zip(group_pdfs, groups):
+            for position, page in enumerate(sorted(group['pages']), 1):
+                owner[page] = (group_pdf, position)
+        if sorted(owner) != list(range(page_count)):
+            logging.error("页面组未完整覆盖文档的所有页面。")
+            return False
+        page_args = []
+        run_pdf, run_first, run_last = None, None, None
+        for page in range(page_count):
+            group_pdf, position = owner[page]
+            if group_pdf == run_pdf and position == run_last + 1:
+                run_last = position
+                continue
+            if run_pdf is not None:
+                page_args += [str(run_pdf), f"{run_first}-{run_last}"]
+            run_pdf, run_first, run_last = group_pdf, position, position
+        page_args += [str(run_pdf), f"{run_first}-{run_last}"]
+
+        command = ["qpdf", "--empty", "--pages"] + page_args + ["--", str(output_pdf_path)]
+        if not utils.run_command(command):
+            logging.error("合并页面组 PDF 失败。")
+            return False
+        logging.info(f"逐页方案重建并合并成功，输出至 {output_pdf_path}")
+        return True
+    finally:
+        utils.cleanup_directory(group_root)
+
+def _reconstruct_sharded(image_files, hocr_file, params, output_pdf_path, shards, workers=None, size_limit_mb=None,
+                         timeout=None):
+    """
+    分片并行重建，最多 workers 个分片同时运行。返回 True/False；分片条件不满足
+    （如 hOCR 页数与图像数不符）时返回 None，由调用方退回单进程重建。
+
+    指定 size_limit_mb 时，每完成一个分片累计其大小，并按 _merge_saving_bytes() 扣除合并时
+    每个分片预计节省的字节数（各自的文档目录、信息字典与交叉引用表）。扣除后仍超出上限时
+    判断最终输出超限，终止其余分片并抛出 SizeLimitExceeded。这是启发式下限而非证明：
+    每分片的节省量取自此前实际合并的测量值，尚无测量时使用 _SHARD_MERGE_SAVING_BYTES。
+    """
+    page_index = index_hocr_pages(hocr_file)
+    if page_index is None or len(page_index) != len(image_files):
+        logging.warning("hOCR 页面索引与图像数不一致，退回单进程重建。")
+        return None
+
+    output_pdf_path = Path(output_pdf_path)
+    page_ranges = split_page_ranges(len(image_files), shards)
+    workers = min(workers or len(page_ranges), len(page_ranges))
+    shard_root = output_pdf_path.parent / f"{output_pdf_path.stem}_shards"
+    shard_root.mkdir(parents=True, exist_ok=True)
+    cancel_event = threading.Event()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    logging.info(
+        f"阶段3 [重建]: {len(page_ranges)} 个 recode_pdf 分片 (并行 {workers}) 重建 {len(image_files)} 页，参数 {params}"
+        + (f"，大小上限 {size_limit_mb:.2f}MB" if size_limit_mb is not None else "")
+    )
+
+    def _run_shard(shard_number, first, last):
+        if cancel_event.is_set():
+            return None
+        shard_dir = shard_root / f"shard_{shard_number:03d}"
+        shard_dir.mkdir(exist_ok=True)
+        shard_images = []
+        for image in image_files[first - 1:last]:
+            link = shard_dir / Path(image).name
+            if not link.exists():
+                utils.link_or_copy(image, link)
+            shard_images.append(link)
+        shard_hocr = shard_dir / "shard.hocr"
+        _write_hocr_shard(hocr_file, page_index, first - 1, last - 1, shard_hocr)
+        shard_pdf = shard_dir / "shard.pdf"
+        if not reconstruct_pdf(shard_images, shard_hocr, shard_dir, params, shard_pdf, cancel_event=cancel_event,
+                               timeout=_remaining(deadline)):
+            return None
+        return shard_pdf
+
+    try:
+        shard_pdfs = {}
+        completed_bytes = 0
+        exceeded_mb = None
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_run_shard, number, first, last): number
+                for number, (first, last) in enumerate(page_ranges, 1)
+            }
+            for future in as_completed(futures):
+                shard_pdf = future.result()
+                if shard_pdf is None:
+                    cancel_event.set()
+                    continue
+                shard_pdfs[futures[future]] = shard_pdf
+                completed_bytes += shard_pdf.stat().st_size
+                if size_limit_mb is None or cancel_event.is_set():
+                    continue
+                lower_bound_mb = (completed_bytes - len(shard_pdfs) * _merge_saving_bytes()) / (1024 * 1024)
+                if lower_bound_mb > size_limit_mb:
+                    exceeded_mb = lower_bound_mb
+                    logging.info(
+                        f"已完成 {len(shard_pdfs)}/{len(page_ranges)} 个分片，输出至少 {lower_bound_mb:.2f}MB，"
+                        f"超过上限 {size_limit_mb:.2f}MB，提前终止重建。"
+                    )
+                    cancel_event.set()
+
+        if exceeded_mb is not None:
+            raise SizeLimitExceeded(exceeded_mb)
+        if len(shard_pdfs) != len(page_ranges):
+            logging.error("部分分片重建失败。")
+            return False
+
+        command = ["qpdf", "--empty", "--pages"] + [str(shard_pdfs[n]) for n in sorted(shard_pdfs)] + ["--", str(output_pdf_path)]
+        if not utils.run_command(command, timeout=_remaining(deadline)):
+            logging.error("合并分片 PDF 失败。")
+            return False
+        _record_merge_saving(completed_bytes, len(shard_pdfs), output_pdf_path.stat().st_size)
+        logging.info(f"分片重建并合并成功，输出至 {output_pdf_path}")
+        return True
+    finally:
+        utils.cleanup_directory(shard_root)
+
+def _remaining(deadline):
+    """距 deadline（time.monotonic() 时刻）的剩余秒数；deadline 为 None 时返回 None。"""
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+# 提前终止模式下的最少分片数：分片越多，越早能确定输出超限
+EARLY_ABORT_CHUNKS = 4
+
+# 尚未测量时，合并分片时每个分片预计节省的字节数（分片各自的文档目录、信息字典与交叉引用表）
+_SHARD_MERGE_SAVING_BYTES = 64 * 1024
+
+# 此前合并中测量到的每分片节省字节数的最大值（None 表示尚无测量）
+_observed_merge_saving = None
+_merge_saving_lock = threading.Lock()
+
+def _merge_saving_bytes():
+    """提前终止判断使用的每分片合并节省量：有测量值时取测量值，否则为 _SHARD_MERGE_SAVING_BYTES。"""
+    with _merge_saving_lock:
+        return _SHARD_MERGE_SAVING_BYTES if _observed_merge_saving is None else _observed_merge_saving
+
+def _record_merge_saving(shard_bytes, shard_count, merged_bytes):
+    """记录一次合并中每个分片实际节省的字节数（分片大小之和与合并后大小之差按分片数平均）。"""
+    global _observed_merge_saving
+    saving = max(0, shard_bytes - merged_bytes) // shard_count
+    with _merge_saving_lock:
+        if _observed_merge_saving is None or saving > _observed_merge_saving:
+            _observed_merge_saving = saving
+
+def get_pdf_page_count(pdf_path, timeout=None):
+    """使用 pdfinfo 获取PDF的总页数（经由全局资源调度与命令超时），失败时返回 0。"""
+    stdout = utils.run_command_output(["pdfinfo", str(pdf_path)], timeout=timeout)
+    if stdout is None:
+        logging.error(f"获取 {Path(pdf_path).name} 的页数失败。")
+        return 0
+    for line in stdout.splitlines():
+        if line.startswith("Pages:"):
+            try:
                 return int(line.split(":")[1].strip())
-    except (subprocess.CalledProcessError, FileNotFoundError) as e:
-        logging.error(f"获取 {pdf_path.name} 的页数失败: {e}")
+            except ValueError:
+                break
+    logging.error(f"pdfinfo 输出中没有有效的页数: {Path(pdf_path).name}")
     return 0
 
 
@@ -183,7 +1112,6 @@ def optimize_hocr_for_extreme_compression(hocr_file):
     Returns:
         Path: 优化后的 hOCR 文件路径（原地修改）
     """
-    import re
     
     if not hocr_file.exists():
         logging.warning(f"hOCR 文件不存在，跳过优化: {hocr_file}")
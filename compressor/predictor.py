@@ -0,0 +1,186 @@
+# compressor/predictor.py
+
+"""
+基于抽样页面的方案大小预测
+
+从文档中分层抽取少量页面，在每个压缩方案下只重建这些页面，
+再以页面图像（JPEG）字节数为辅助变量用比率估计外推整份文档的输出大小，
+并给出近似 95% 置信区间。策略据此只完整重建预测最合适的一两个方案。
+"""
+
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from . import pipeline, utils
+
+DEFAULT_SAMPLE_PAGES = 8
+
+# 95% 置信区间对应的正态分位数
+_Z_95 = 1.96
+
+# 样本不足以估计方差时使用的相对误差
+_FALLBACK_RELATIVE_ERROR = 0.5
+
+
+def select_sample_indices(total_pages, sample_size):
+    """
+    分层抽样：把文档均分为 sample_size 层，每层取中间一页。
+    返回从 0 开始、递增且不重复的页面下标列表。
+    """
+    if total_pages <= 0:
+        return []
+    sample_size = max(1, min(sample_size, total_pages))
+    indices = []
+    for stratum in range(sample_size):
+        first = stratum * total_pages // sample_size
+        last = (stratum + 1) * total_pages // sample_size - 1
+        indices.append((first + last) // 2)
+    return indices
+
+
+def estimate_total(sample_sizes, sample_weights, total_weight, total_count, overhead=0.0):
+    """
+    比率估计：以辅助变量（页面图像字节数）外推总量。
+
+    sample_sizes 为样本页单独重建后的字节数，overhead 为单个 PDF 的固定开销
+    （每个单页样本都包含一份，整份文档只包含一份）。
+    返回 (估计值, 置信区间下限, 置信区间上限)，单位与 sample_sizes 相同。
+    """
+    n = len(sample_sizes)
+    content = [size - overhead for size in sample_sizes]
+    ratio = sum(content) / sum(sample_weights)
+    estimate = ratio * total_weight + overhead
+
+    if n < 2:
+        half_width = estimate * _FALLBACK_RELATIVE_ERROR
+    else:
+        residuals = [y - ratio * x for y, x in zip(content, sample_weights)]
+        variance = sum(e * e for e in residuals) / (n - 1)
+        finite_correction = max(0.0, 1 - n / total_count)
+        half_width = _Z_95 * total_count * math.sqrt(finite_correction * variance / n)
+    return estimate, max(overhead, estimate - half_width), estimate + half_width
+
+
+def _prepare_sample(sample_dir, image_files, hocr_files, optimize_hocr, render=None):
+    """
+    在 sample_dir 中准备一组页面的图像与合并 hOCR，返回 (图像列表, hOCR 路径)。
+    render 为 (pdf_path, dpi, source_dpi) 时，以该 DPI 重新光栅化样本页并缩放其 hOCR，
+    与 DPI 图像金字塔下的完整重建保持一致。
+    """
+    sample_dir.mkdir(parents=True, exist_ok=True)
+    images = []
+    for i, image in enumerate(image_files):
+        if render is not None:
+            pdf_path, dpi, source_dpi = render
+            page = pipeline._page_number(image)
+            rendered = pipeline.deconstruct_pdf_to_images(pdf_path, sample_dir, dpi, first_page=page, last_page=page)
+            if not rendered:
+                return None
+            images.append(rendered[0])
+            scaled_hocr = sample_dir / f"{image.stem}.hocr"
+            hocr_files[i] = pipeline.rescale_hocr(hocr_files[i], scaled_hocr, dpi / source_dpi, dpi)
+            continue
+        dest = sample_dir / image.name
+        if not dest.exists():
+            utils.link_or_copy(image, dest)
+        images.append(dest)
+
+    hocr_file = sample_dir / "sample.hocr"
+    with open(hocr_file, 'wb') as outfile:
+        pipeline._write_hocr_header(outfile)
+        for page_hocr in hocr_files:
+            pipeline._append_hocr_page(outfile, page_hocr)
+        pipeline._write_hocr_footer(outfile)
+    if optimize_hocr:
+        pipeline.optimize_hocr_for_extreme_compression(hocr_file)
+    return images, hocr_file
+
+
+def _recode_sample(sample_dir, image_files, hocr_files, params, optimize_hocr, render=None):
+    """重建一组样本页面，返回输出字节数，失败时返回 None。"""
+    prepared = _prepare_sample(sample_dir, image_files, list(hocr_files), optimize_hocr, render)
+    if prepared is None:
+        return None
+    images, hocr_file = prepared
+    output_pdf = sample_dir / "sample.pdf"
+    if not pipeline.reconstruct_pdf(images, hocr_file, sample_dir, params, output_pdf):
+        return None
+    return output_pdf.stat().st_size
+
+
+def predict_scheme_sizes(image_files, temp_dir, schemes, sample_pages=DEFAULT_SAMPLE_PAGES, workers=1,
+                         pdf_path=None, source_dpi=None):
+    """
+    预测各方案完整重建后的文件大小。
+
+    image_files 为预处理生成的全部页面图像，其单页 hOCR 位于 temp_dir；
+    schemes 为 {方案ID: 重建参数}，方案 7 的样本使用去除文字标签的 hOCR。
+    除逐页样本外，每个方案还会把前两个样本页合并重建一次，用于估计单个 PDF 的固定开销。
+    提供 pdf_path 时（DPI 图像金字塔模式），DPI 与 source_dpi 不同的方案使用按其 DPI
+    重新光栅化的样本页。
+
+    返回 {方案ID: {'size_mb', 'low_mb', 'high_mb'}}，任何样本失败时返回 None。
+    """
+    temp_dir = Path(temp_dir)
+    indices = select_sample_indices(len(image_files), sample_pages)
+    if not indices:
+        return None
+    samples = [image_files[i] for i in indices]
+    sample_hocr = [pipeline._page_hocr_path(image, temp_dir) for image in samples]
+    missing = [f.name for f in sample_hocr if not f.exists()]
+    if missing:
+        logging.warning(f"缺少样本页的单页 hOCR ({', '.join(missing)})，跳过大小预测。")
+        return None
+
+    predict_dir = temp_dir / "predict"
+    jobs = []
+    for scheme_id, params in schemes.items():
+        for image, page_hocr in zip(samples, sample_hocr):
+            jobs.append((scheme_id, image.stem, [image], [page_hocr]))
+        if len(samples) >= 2:
+            jobs.append((scheme_id, 'pair', samples[:2], sample_hocr[:2]))
+
+    logging.info(
+        f"大小预测: 抽取 {len(samples)}/{len(image_files)} 页 "
+        f"(第 {', '.join(str(i + 1) for i in indices)} 页)，在 {len(schemes)} 个方案下重建样本..."
+    )
+
+    def _run(job):
+        scheme_id, name, images, hocr_files = job
+        sample_dir = predict_dir / f"S{scheme_id}" / name
+        params = schemes[scheme_id]
+        render = None
+        if pdf_path is not None and params['dpi'] != source_dpi:
+            render = (pdf_path, params['dpi'], source_dpi)
+        return _recode_sample(sample_dir, images, hocr_files, params, scheme_id == 7, render)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(_run, jobs))
+    if any(size is None for size in results):
+        logging.warning("部分样本页重建失败，无法进行大小预测。")
+        return None
+
+    sizes = {}
+    for (scheme_id, name, _, _), size in zip(jobs, results):
+        sizes.setdefault(scheme_id, {})[name] = size
+
+    weights = [image.stat().st_size for image in samples]
+    total_weight = sum(f.stat().st_size for f in image_files)
+    predictions = {}
+    for scheme_id in schemes:
+        page_sizes = [sizes[scheme_id][image.stem] for image in samples]
+        overhead = 0.0
+        if 'pair' in sizes[scheme_id]:
+            overhead = max(0.0, page_sizes[0] + page_sizes[1] - sizes[scheme_id]['pair'])
+        estimate, low, high = estimate_total(page_sizes, weights, total_weight, len(image_files), overhead)
+        predictions[scheme_id] = {
+            'size_mb': estimate / (1024 * 1024),
+            'low_mb': low / (1024 * 1024),
+            'high_mb': high / (1024 * 1024),
+        }
+        logging.info(
+            f"  S{scheme_id} 预测大小: {predictions[scheme_id]['size_mb']:.2f}MB "
+            f"(95% 区间 {predictions[scheme_id]['low_mb']:.2f} - {predictions[scheme_id]['high_mb']:.2f}MB)"
+        )
+    return predictions
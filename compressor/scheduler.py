@@ -0,0 +1,155 @@
+# compressor/scheduler.py
+
+"""
+全局资源调度
+
+文件级（--jobs）、方案级与页面级并行叠加时，同时运行的 tesseract、recode_pdf 等外部进程
+数量可能远超 CPU 核心数和可用内存。utils.run_command 启动任何外部命令前都要先向本模块
+申请资源：按工具估计命令占用的 CPU 令牌数与内存（MB），资源不足时按申请顺序排队等待，
+所有层级的并行因此共享同一个全局预算。
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+# 等待资源时检查取消标志的间隔（秒）
+_WAIT_POLL_SECONDS = 0.5
+
+# 未列出的工具按一个 CPU 令牌、中等内存估计
+_DEFAULT_COST = (1, 100)
+
+# 未设置 OMP_THREAD_LIMIT 时 tesseract 最多使用的线程数
+_TESSERACT_DEFAULT_THREADS = 4
+
+# 共享 MRC 分层的辅助脚本（见 pipeline.reconstruct_mrc_variants）
+_MRC_VARIANTS_SCRIPT = 'mrc_variants.py'
+
+
+def _option_value(command, option, default):
+    """读取命令中某个选项之后的数值参数，缺失或无法解析时返回 default。"""
+    try:
+        return float(command[command.index(option) + 1])
+    except (ValueError, IndexError):
+        return default
+
+
+def _thread_limit(extra_env):
+    """tesseract 等 OpenMP 程序使用的线程数：取 OMP_THREAD_LIMIT，未设置时按其默认线程数估计。"""
+    limit = (extra_env or {}).get('OMP_THREAD_LIMIT', os.environ.get('OMP_THREAD_LIMIT'))
+    try:
+        return max(1, int(limit))
+    except (TypeError, ValueError):
+        return min(_TESSERACT_DEFAULT_THREADS, os.cpu_count() or 1)
+
+
+def command_cost(command, extra_env=None):
+    """
+    估计外部命令的资源占用，返回 (CPU 令牌数, 内存 MB)。
+    recode_pdf 与 pdftoppm 的内存随 DPI 的平方增长（单页像素数），
+    共享 MRC 分层的辅助脚本（python mrc_variants.py）按 recode_pdf 估计；
+    pdfinfo 等只读取元数据的命令不占用 CPU 令牌。
+    """
+    tool = Path(command[0]).name.lower() if command else ''
+    if tool.endswith('.exe'):
+        tool = tool[:-4]
+    if len(command) > 1 and Path(command[1]).name == _MRC_VARIANTS_SCRIPT:
+        tool = 'recode_pdf'
+    if tool == 'recode_pdf':
+        dpi = _option_value(command, '--dpi', 300)
+        return 1, int(200 + 40 * (dpi / 100) ** 2)
+    if tool == 'pdftoppm':
+        dpi = _option_value(command, '-r', 150)
+        return 1, int(50 + 15 * (dpi / 100) ** 2)
+    if tool == 'tesseract':
+        threads = _thread_limit(extra_env)
+        return threads, 250 * threads
+    if tool == 'qpdf':
+        return 1, 150
+    if tool in ('pdfinfo', 'which', 'where'):
+        return 0, 20
+    return _DEFAULT_COST
+
+
+class ResourceScheduler:
+    """
+    CPU 令牌与内存预留的先到先得分配器。
+    memory_mb 为 None 时不限制内存；单个申请超过总量时按总量分配（即独占运行）。
+    """
+
+    def __init__(self, cpu_tokens, memory_mb=None):
+        self.cpu_tokens = max(1, int(cpu_tokens))
+        self.memory_mb = memory_mb
+        self.cpu_in_use = 0
+        self.memory_in_use = 0
+        self._queue = deque()
+        self._condition = threading.Condition()
+
+    def _clamp(self, cpu, memory_mb):
+        cpu = min(cpu, self.cpu_tokens)
+        if self.memory_mb is not None:
+            memory_mb = min(memory_mb, self.memory_mb)
+        return cpu, memory_mb
+
+    def _fits(self, cpu, memory_mb):
+        if self.cpu_in_use + cpu > self.cpu_tokens:
+            return False
+        return self.memory_mb is None or self.memory_in_use + memory_mb <= self.memory_mb
+
+    def acquire(self, cpu, memory_mb, cancel_event=None, deadline=None):
+        """
+        申请资源，按申请顺序排队直到资源足够。
+        成功时返回实际分配的 (cpu, memory_mb)，须原样传给 release；
+        等待期间 cancel_event 被设置或到达 deadline（time.monotonic() 时刻）时返回 None。
+        """
+        cpu, memory_mb = self._clamp(cpu, memory_mb)
+        ticket = object()
+        with self._condition:
+            self._queue.append(ticket)
+            try:
+                while self._queue[0] is not ticket or not self._fits(cpu, memory_mb):
+                    if cancel_event is not None and cancel_event.is_set():
+                        return None
+                    wait = _WAIT_POLL_SECONDS if cancel_event is not None else None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return None
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._condition.wait(wait)
+                self.cpu_in_use += cpu
+                self.memory_in_use += memory_mb
+                return cpu, memory_mb
+            finally:
+                self._queue.remove(ticket)
+                self._condition.notify_all()
+
+    def release(self, allocation):
+        """归还 acquire 返回的资源。"""
+        cpu, memory_mb = allocation
+        with self._condition:
+            self.cpu_in_use -= cpu
+            self.memory_in_use -= memory_mb
+            self._condition.notify_all()
+
+
+_scheduler = ResourceScheduler(os.cpu_count() or 1)
+
+
+def configure(cpu_tokens=None, memory_mb=None):
+    """
+    设置全局调度器的 CPU 令牌数（缺省为 CPU 核心数）与内存上限（MB，None 表示不限制）。
+    应在开始处理文件之前调用。
+    """
+    global _scheduler
+    _scheduler = ResourceScheduler(cpu_tokens or os.cpu_count() or 1, memory_mb)
+    limit = f"{memory_mb}MB" if memory_mb is not None else "不限制"
+    logging.info(f"全局资源调度: CPU 令牌 {_scheduler.cpu_tokens} 个，内存上限 {limit}")
+
+
+def get_scheduler():
+    """返回当前的全局调度器。"""
+    return _scheduler
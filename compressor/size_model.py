@@ -0,0 +1,270 @@
+# compressor/size_model.py
+
+"""
+基于历史运行的方案大小模型
+
+每次运行结束后，把实测的（重建参数 → 输出大小）连同文档的廉价特征（页数、原文件大小、
+平均页面图像大小、hOCR 文字覆盖率）追加到 JSONL 历史文件中。
+在此之上用岭回归拟合 log(输出大小) 的线性模型，新文档在完整重建之前即可预测各方案的大小，
+策略据此直接从预测的最优方案开始验证，而不必总是先执行 S1。
+
+同一组重建参数的输出大小还取决于运行模式（DPI 金字塔、重建分片、共享 MRC 分层），
+因此每条记录附带 run_mode() 的结果，拟合时只使用模式相同的历史记录。
+"""
+
+import json
+import logging
+import math
+import threading
+from pathlib import Path
+from . import pipeline, utils
+
+DEFAULT_HISTORY_PATH = Path.home() / ".cache" / "pdf_compressor" / "size_history.jsonl"
+
+# 拟合模型所需的最少历史文档数
+MIN_TRAINING_DOCUMENTS = 5
+
+# 岭回归的正则化系数（不作用于截距），只用于保证少量样本时方程组可解
+_RIDGE_LAMBDA = 1e-6
+
+# 95% 预测区间对应的正态分位数
+_Z_95 = 1.96
+
+_history_lock = threading.Lock()
+
+
+def run_mode(args):
+    """返回影响输出大小的运行模式（随历史记录保存，拟合时按模式区分）。"""
+    return {
+        'dpi_pyramid': bool(getattr(args, 'dpi_pyramid', False)),
+        'reconstruct_shards': getattr(args, 'reconstruct_shards', 1) or 1,
+        'share_mrc_layers': bool(getattr(args, 'share_mrc_layers', False)),
+    }
+
+
+def document_features(input_pdf_path, image_files, hocr_file):
+    """
+    计算文档的廉价特征：页数、原文件大小 (MB)、平均每页图像大小 (KB)
+    以及 hOCR 中单词边界框占页面面积的比例（文字覆盖率，逐页读取 hOCR）。
+    """
+    page_count = len(image_files)
+    image_bytes = sum(f.stat().st_size for f in map(Path, image_files) if f.exists())
+    try:
+        text_density = pipeline.hocr_file_coverage(hocr_file)
+    except OSError as e:
+        logging.warning(f"读取 hOCR 文件失败，文字覆盖率按 0 计算: {e}")
+        text_density = 0.0
+    return {
+        'page_count': page_count,
+        'source_mb': utils.get_file_size_mb(input_pdf_path),
+        'mean_image_kb': image_bytes / 1024 / max(1, page_count),
+        'text_density': text_density,
+    }
+
+
+# _design_row 的列数
+_DESIGN_WIDTH = 8
+
+
+def _design_row(features, params):
+    """回归的自变量：截距、文档特征（取对数）与重建参数（取对数）。"""
+    pages = max(1, features['page_count'])
+    return [
+        1.0,
+        math.log(pages),
+        math.log(max(features['mean_image_kb'], 1e-3)),
+        math.log(max(features['source_mb'], 1e-6) / pages),
+        features['text_density'],
+        math.log(params['dpi']),
+        math.log(params['bg_downsample']),
+        1.0 if params.get('strip_text') else 0.0,
+    ]
+
+
+def load_history(history_path=DEFAULT_HISTORY_PATH):
+    """读取历史记录（每行一个文档），跳过无法解析的行。文件不存在时返回空列表。"""
+    history_path = Path(history_path)
+    if not history_path.is_file():
+        return []
+    records = []
+    with open(history_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logging.warning(f"跳过无法解析的历史记录: {history_path}:{line_number}")
+    return records
+
+
+def record_run(history_path, source_name, features, observations, mode=None):
+    """
+    追加一个文档的历史记录。observations 为
+    [{'scheme', 'dpi', 'bg_downsample', 'strip_text', 'size_mb'}, ...]，为空时不写入。
+    mode 为 run_mode() 的结果。
+    """
+    if not observations:
+        return
+    history_path = Path(history_path)
+    record = {
+        'timestamp': utils.get_current_timestamp(),
+        'source_name': source_name,
+        'features': features,
+        'results': observations,
+        'mode': mode,
+    }
+    try:
+        with _history_lock:
+            history_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(history_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        logging.info(f"已记录 {len(observations)} 个方案的实测大小到大小模型历史: {history_path}")
+    except OSError as e:
+        logging.warning(f"写入大小模型历史失败: {e}")
+
+
+def _solve(matrix, vector):
+    """高斯消元（部分选主元）求解线性方程组，矩阵奇异时返回 None。"""
+    n = len(vector)
+    rows = [list(matrix[i]) + [vector[i]] for i in range(n)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        if abs(rows[pivot][col]) < 1e-12:
+            return None
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        for r in range(col + 1, n):
+            factor = rows[r][col] / rows[col][col]
+            for c in range(col, n + 1):
+                rows[r][c] -= factor * rows[col][c]
+    solution = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        solution[r] = (rows[r][n] - sum(rows[r][c] * solution[c] for c in range(r + 1, n))) / rows[r][r]
+    return solution
+
+
+def _empty_stats(k):
+    """回归的充分统计量：XᵀX、Xᵀy、yᵀy 与观测数、文档数。"""
+    return {'xtx': [[0.0] * k for _ in range(k)], 'xty': [0.0] * k, 'yty': 0.0, 'rows': 0, 'documents': 0}
+
+
+def _add_record(stats, record):
+    """把一个文档的观测累加到统计量中。"""
+    stats['documents'] += 1
+    xtx, xty = stats['xtx'], stats['xty']
+    for observation in record.get('results', []):
+        if observation.get('size_mb', 0) <= 0:
+            continue
+        row = _design_row(record['features'], observation)
+        y = math.log(observation['size_mb'])
+        for i, xi in enumerate(row):
+            xty[i] += xi * y
+            for j, xj in enumerate(row):
+                xtx[i][j] += xi * xj
+        stats['yty'] += y * y
+        stats['rows'] += 1
+
+
+def _fit_stats(stats):
+    """由充分统计量求解岭回归，文档数不足或方程组奇异时返回 None。"""
+    if stats['documents'] < MIN_TRAINING_DOCUMENTS or not stats['rows']:
+        return None
+    k = len(stats['xty'])
+    normal = [list(row) for row in stats['xtx']]
+    for i in range(1, k):
+        normal[i][i] += _RIDGE_LAMBDA * stats['rows']
+    coef = _solve(normal, stats['xty'])
+    if coef is None:
+        return None
+
+    # 残差平方和 = yᵀy - 2cᵀXᵀy + cᵀXᵀXc
+    fitted = sum(c * sum(x * d for x, d in zip(row, coef)) for c, row in zip(coef, stats['xtx']))
+    sse = max(0.0, stats['yty'] - 2 * sum(c * v for c, v in zip(coef, stats['xty'])) + fitted)
+    dof = max(1, stats['rows'] - k)
+    return {'coef': coef, 'sigma': math.sqrt(sse / dof), 'documents': stats['documents'], 'observations': stats['rows']}
+
+
+def _mode_key(mode):
+    return json.dumps(mode, sort_keys=True)
+
+
+def fit_model(records, mode=None):
+    """
+    用历史记录拟合 log(输出大小) 的岭回归模型；指定 mode 时只使用该运行模式的记录
+    （未记录模式的旧记录不参与）。
+    返回 {'coef', 'sigma', 'documents', 'observations'}；文档数不足或方程组奇异时返回 None。
+    sigma 为对数空间的残差标准差，用于给出预测区间。
+    """
+    stats = _empty_stats(_DESIGN_WIDTH)
+    for record in records:
+        if mode is None or record.get('mode') == mode:
+            _add_record(stats, record)
+    return _fit_stats(stats)
+
+
+def predict_size(model, features, params):
+    """预测一组重建参数的输出大小，返回 {'size_mb', 'low_mb', 'high_mb'}。"""
+    mean = sum(c * x for c, x in zip(model['coef'], _design_row(features, params)))
+    spread = _Z_95 * model['sigma']
+    return {
+        'size_mb': math.exp(mean),
+        'low_mb': math.exp(mean - spread),
+        'high_mb': math.exp(mean + spread),
+    }
+
+
+def predict_scheme_sizes(model, features, schemes):
+    """
+    预测各方案的输出大小。schemes 为 {方案ID: 重建参数}（参数中 strip_text 表示去除文字标签）。
+    返回与 predictor.predict_scheme_sizes 相同格式的 {方案ID: {'size_mb', 'low_mb', 'high_mb'}}。
+    """
+    predictions = {scheme_id: predict_size(model, features, params) for scheme_id, params in schemes.items()}
+    logging.info(f"大小模型 (基于 {model['documents']} 个历史文档、{model['observations']} 个观测) 预测:")
+    for scheme_id, p in predictions.items():
+        logging.info(f"  S{scheme_id} 预测大小: {p['size_mb']:.2f}MB (95% 区间 {p['low_mb']:.2f} - {p['high_mb']:.2f}MB)")
+    return predictions
+
+
+def accuracy_report(records, block_size=10):
+    """
+    按时间顺序回放历史：每个文档只用它之前、运行模式相同的文档拟合模型并预测其各方案大小，
+    以此衡量模型在新文档上的准确度随历史增长的变化。
+
+    返回按 block_size 个文档分组的列表
+    [{'first', 'last', 'observations', 'mape', 'coverage'}, ...]，
+    mape 为平均绝对百分比误差，coverage 为实测值落入 95% 预测区间的比例。
+    每种运行模式的前 MIN_TRAINING_DOCUMENTS 个文档没有可用模型，不计入报告。
+    """
+    blocks = {}
+    # 每种运行模式的统计量随回放逐个文档累加，只需对每个文档求解一次方程组
+    stats_by_mode = {}
+    for index, record in enumerate(records):
+        stats = stats_by_mode.setdefault(_mode_key(record.get('mode')), _empty_stats(_DESIGN_WIDTH))
+        model = _fit_stats(stats)
+        _add_record(stats, record)
+        if model is None:
+            continue
+        block = blocks.setdefault(
+            (index - MIN_TRAINING_DOCUMENTS) // block_size,
+            {'first': index + 1, 'errors': [], 'covered': 0}
+        )
+        block['last'] = index + 1
+        for observation in record.get('results', []):
+            if observation.get('size_mb', 0) <= 0:
+                continue
+            prediction = predict_size(model, record['features'], observation)
+            block['errors'].append(abs(prediction['size_mb'] - observation['size_mb']) / observation['size_mb'])
+            if prediction['low_mb'] <= observation['size_mb'] <= prediction['high_mb']:
+                block['covered'] += 1
+
+    report = []
+    for _, block in sorted(blocks.items()):
+        n = len(block['errors'])
+        report.append({
+            'first': block['first'],
+            'last': block['last'],
+            'observations': n,
+            'mape': sum(block['errors']) / n if n else None,
+            'coverage': block['covered'] / n if n else None,
+        })
+    return report
@@ -1,17 +1,36 @@
 # compressor/splitter.py
 
+import json
 import logging
 import math
+import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from . import utils, pipeline
 
+try:
+    import pikepdf
+except ImportError:  # 可选依赖
+    pikepdf = None
+
+# 拆分规划的安全余量：各部分的预测大小不超过目标的该比例
+_SAFE_TARGET_RATIO = 0.98
+
+# 实测大小超出目标时按实测偏差收紧预算重新拆分的最多次数
+_SPLIT_ATTEMPTS = 3
+
+# 每个间接对象在输出文件中的固定开销（"N 0 obj ... endobj" 与交叉引用表条目）
+_OBJECT_OVERHEAD_BYTES = 40
+
+_REF_RE = re.compile(r"^(\d+) (\d+) R$")
+
 def run_splitting_strategy(compression_results, output_dir, args):
     """
     执行新的拆分策略。
     该策略不进行二次压缩，只对选定的最佳母版进行物理拆分。
 
     Args:
-        compression_results (dict): 压缩阶段生成的所有中间结果。
+        compression_results (dict): 压缩阶段返回的详情，其中 all_results 为所有中间结果。
         output_dir (Path): 最终输出目录。
         args (argparse.Namespace): 命令行参数。
 
@@ -26,7 +45,10 @@ def run_splitting_strategy(compression_results, output_dir, args):
         logging.error("❌ 拆分失败：没有任何压缩结果可用于拆分。")
         return False
     
-    under_8mb = [res for res in all_results.values() if res.get('size_mb', float('inf')) <= 8.0]
+    under_8mb = [
+        res for res in all_results.values()
+        if res.get('path') and res.get('size_mb', float('inf')) <= 8.0
+    ]
     if not under_8mb:
         logging.error("❌ 拆分失败：所有压缩结果均大于 8MB，无法进行有效拆分。")
         return False
@@ -34,7 +56,7 @@ def run_splitting_strategy(compression_results, output_dir, args):
     logging.info(f"✓ 找到 {len(under_8mb)} 个小于 8MB 的压缩结果，可以进行拆分。")
     
     # 1. 选择拆分母版 (Select Splitting Source)
-    source_to_split = _select_splitting_source(compression_results)
+    source_to_split = _select_splitting_source(all_results)
     if not source_to_split:
         logging.error("拆分失败：在压缩结果中找不到合适的拆分母版。")
         return False
@@ -43,57 +65,60 @@ def run_splitting_strategy(compression_results, output_dir, args):
     source_size_mb = source_to_split['size_mb']
     logging.info(f"选定拆分母版: {source_path.name}, 大小: {source_size_mb:.2f}MB")
 
-    # 2. 计算页面密度 (Calculate Page Density)
+    # 2. 统计页数，并尽量精确地计量每页在母版中的字节开销
     total_pages = pipeline.get_pdf_page_count(source_path)
     if total_pages == 0:
         logging.error(f"无法获取 {source_path.name} 的页数，拆分中止。")
         return False
-    
-    page_density = source_size_mb / total_pages
-    logging.info(f"母版总页数: {total_pages}, 平均页面密度: {page_density:.4f} MB/页")
 
-    # 3. 确定最优拆分数量 (Determine Optimal Split Count)
     target_size_mb = args.target_size
-    try:
-        split_count = _determine_optimal_split_count(source_size_mb, target_size_mb, args.max_splits)
-    except ValueError as e:
-        logging.error(f"拆分失败: {e}")
-        return False
-    
-    logging.info(f"目标拆分数量: {split_count} 部分")
+    page_costs = measure_page_costs(source_path)
+    if page_costs is not None and len(page_costs['page_objects']) != total_pages:
+        logging.warning("qpdf 报告的页数与 pdfinfo 不一致，退回按平均页面密度拆分。")
+        page_costs = None
 
-    # 4. 计算各部分页数 (Calculate Pages per Split)
-    try:
-        split_plan = _calculate_split_plan(total_pages, split_count, page_density, target_size_mb)
-    except ValueError as e:
-        logging.error(f"拆分失败: 无法规划页面分配。{e}")
-        return False
+    # 3. 规划拆分并执行物理拆分；实测超出目标时按实测偏差收紧预算重新规划
+    original_stem = Path(args.input).stem
+    safe_ratio = _SAFE_TARGET_RATIO
+    for attempt in range(1, _SPLIT_ATTEMPTS + 1):
+        try:
+            if page_costs is not None:
+                split_plan = _plan_exact_partition(page_costs, target_size_mb * 1024 * 1024 * safe_ratio)
+            else:
+                split_plan = _plan_by_average_density(source_size_mb, total_pages, target_size_mb, args.max_splits)
+        except (ValueError, RuntimeError) as e:
+            logging.error(f"拆分失败: 无法规划页面分配。{e}")
+            return False
+        if len(split_plan) > args.max_splits:
+            logging.error(f"拆分失败: 按目标大小 {target_size_mb}MB 需要 {len(split_plan)} 个部分，超过了最大限制 {args.max_splits}。")
+            return False
 
-    logging.info("生成拆分计划:")
-    for i, part in enumerate(split_plan, 1):
-        logging.info(f"  - 部分 {i}: 页码 {part['start']} - {part['end']} ({part['pages']} 页)")
+        logging.info(f"生成拆分计划 (第 {attempt} 次，{len(split_plan)} 部分):")
+        for i, part in enumerate(split_plan, 1):
+            predicted = f"，预测 {part['predicted_mb']:.2f}MB" if part.get('predicted_mb') is not None else ""
+            logging.info(f"  - 部分 {i}: 页码 {part['start']} - {part['end']} ({part['pages']} 页{predicted})")
 
-    # 5. 执行物理拆分 (Execute Physical Split)
-    logging.info("开始执行物理拆分...")
-    original_stem = Path(args.input).stem
-    
-    for i, part_info in enumerate(split_plan, 1):
-        part_path = output_dir / f"{original_stem}_part{i}.pdf"
-        success = _split_pdf_physical(
-            source_path,
-            part_path,
-            part_info['start'],
-            part_info['end']
-        )
-        if not success:
-            logging.error(f"拆分第 {i} 部分时失败。")
+        logging.info("开始执行物理拆分...")
+        part_paths = [output_dir / f"{original_stem}_part{i}.pdf" for i in range(1, len(split_plan) + 1)]
+        if not _split_pdf_parts(source_path, split_plan, part_paths, workers=getattr(args, 'page_workers', 1) or 1):
             # 理论上qpdf很稳定，如果失败，通常是IO问题，直接宣告失败
             return False
-    
+
+        # 4. 以 qpdf 实际写出的大小校验预测
+        worst_ratio = _verify_split_sizes(split_plan, part_paths, target_size_mb)
+        if worst_ratio <= 1.0:
+            break
+        _remove_files(part_paths)
+        if attempt == _SPLIT_ATTEMPTS:
+            logging.error(f"拆分失败: {_SPLIT_ATTEMPTS} 次规划后仍有部分超出目标大小。")
+            return False
+        safe_ratio /= worst_ratio
+        logging.warning(f"部分拆分结果超出目标，将预算收紧为目标的 {safe_ratio * 100:.1f}% 后重新拆分。")
+
     logging.info("所有部分均已成功拆分！")
-    # 清理压缩阶段留下的临时目录
+    # 清理压缩阶段留下的临时目录（持久化工作区除外）
     temp_dir_of_compression = source_path.parent
-    if getattr(args, 'keep_temp_on_failure', False) is False:
+    if getattr(args, 'keep_temp_on_failure', False) is False and not getattr(args, 'workspace', False):
         utils.cleanup_directory(temp_dir_of_compression)
     return True
 
@@ -104,11 +129,13 @@ def _select_splitting_source(all_results):
     1. 寻找大小最接近8MB但 <= 8MB 的文件。
     2. 如果没有，则选择所有结果中最小的那个。
     """
-    if not all_results:
+    # 提前终止（超出上限）的方案没有输出文件，不能作为母版
+    candidates = [res for res in all_results.values() if res.get('path')]
+    if not candidates:
         return None
 
     # 筛选出小于等于8MB的结果
-    under_8mb = [res for res in all_results.values() if res['size_mb'] <= 8.0]
+    under_8mb = [res for res in candidates if res['size_mb'] <= 8.0]
 
     if under_8mb:
         # 在小于8MB的结果中，按大小降序排序，取第一个（最接近8MB）
@@ -118,9 +145,180 @@ def _select_splitting_source(all_results):
     else:
         # 如果没有小于8MB的，就选择所有结果中最小的那个
         logging.warning("没有找到小于8MB的压缩结果，将选择最小的一个作为拆分母版。")
-        smallest_source = sorted(all_results.values(), key=lambda x: x['size_mb'])[0]
+        smallest_source = sorted(candidates, key=lambda x: x['size_mb'])[0]
         return smallest_source
 
+def measure_page_costs(pdf_path, timeout=None):
+    """
+    用 qpdf --json 计量母版中每页的字节开销。
+
+    从每个页面对象出发沿间接引用收集该页可达的对象（内容流、XObject、字体等；
+    不经过 /Parent 与 /P，也不进入其他页面对象），以流长度加字典序列化长度估计对象大小，
+    再整体缩放使所有对象之和等于文件大小。任何页面都不可达的对象（目录、大纲、元数据等）
+    计为每个拆分部分都会包含的固定开销。
+
+    返回 {'page_objects': [每页可达对象集合], 'object_bytes': {对象: 字节数},
+    'overhead_bytes': 固定开销, 'page_bytes': [各页分摊后的字节数（共享对象按引用页数平摊）]}，
+    qpdf 不可用、超时或输出无法解析时返回 None。qpdf 经由 utils.run_command_output 运行，
+    受全局资源调度与命令超时（timeout 与 --command-timeout 取较小者）约束。
+    """
+    command = ["qpdf", "--json=2", "--json-key=pages", "--json-key=qpdf", "--json-stream-data=none", str(pdf_path)]
+    output = utils.run_command_output(command, timeout=timeout)
+    if output is None:
+        logging.warning(f"无法用 qpdf 计量 {Path(pdf_path).name} 的逐页大小，退回按平均页面密度拆分。")
+        return None
+    try:
+        data = json.loads(output)
+    except ValueError as e:
+        logging.warning(f"qpdf JSON 输出无法解析，退回按平均页面密度拆分: {e}")
+        return None
+    try:
+        return page_costs_from_qpdf_json(data, Path(pdf_path).stat().st_size)
+    except (KeyError, IndexError, TypeError) as e:
+        logging.warning(f"qpdf JSON 输出格式无法识别，退回按平均页面密度拆分: {e}")
+        return None
+
+def page_costs_from_qpdf_json(data, file_bytes):
+    """由 qpdf --json=2 的输出（含 pages 与 qpdf 两个键）计算逐页字节开销，格式见 measure_page_costs。"""
+    objects = {
+        key[len("obj:"):]: value
+        for key, value in data['qpdf'][1].items()
+        if key.startswith("obj:")
+    }
+
+    def _resolve_int(value):
+        if isinstance(value, str) and _REF_RE.match(value):
+            value = objects.get(value, {}).get('value')
+        return value if isinstance(value, int) else 0
+
+    def _estimated_size(entry):
+        if 'stream' in entry:
+            stream_dict = entry['stream'].get('dict', {})
+            return _resolve_int(stream_dict.get('/Length')) + len(json.dumps(stream_dict)) + _OBJECT_OVERHEAD_BYTES
+        return len(json.dumps(entry.get('value'))) + _OBJECT_OVERHEAD_BYTES
+
+    def _body(entry):
+        return entry['stream'].get('dict', {}) if 'stream' in entry else entry.get('value')
+
+    def _is_page(ref):
+        body = _body(objects.get(ref, {}))
+        return isinstance(body, dict) and body.get('/Type') == '/Page'
+
+    def _references(value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if key not in ('/Parent', '/P'):
+                    yield from _references(item)
+        elif isinstance(value, list):
+            for item in value:
+                yield from _references(item)
+        elif isinstance(value, str) and _REF_RE.match(value):
+            yield value
+
+    page_objects = []
+    for page in data['pages']:
+        root = page['object']
+        reachable = {root}
+        stack = [root]
+        while stack:
+            ref = stack.pop()
+            for child in _references(_body(objects.get(ref, {}))):
+                if child not in reachable and child in objects and not _is_page(child):
+                    reachable.add(child)
+                    stack.append(child)
+        page_objects.append(reachable)
+
+    estimated = {ref: _estimated_size(entry) for ref, entry in objects.items()}
+    scale = file_bytes / max(1, sum(estimated.values()))
+    object_bytes = {ref: size * scale for ref, size in estimated.items()}
+
+    used = set().union(*page_objects) if page_objects else set()
+    overhead_bytes = sum(size for ref, size in object_bytes.items() if ref not in used)
+
+    reference_counts = {}
+    for reachable in page_objects:
+        for ref in reachable:
+            reference_counts[ref] = reference_counts.get(ref, 0) + 1
+    page_bytes = [
+        sum(object_bytes[ref] / reference_counts[ref] for ref in reachable)
+        for reachable in page_objects
+    ]
+    return {
+        'page_objects': page_objects,
+        'object_bytes': object_bytes,
+        'overhead_bytes': overhead_bytes,
+        'page_bytes': page_bytes,
+    }
+
+def _plan_exact_partition(page_costs, limit_bytes):
+    """
+    把页面划分为尽量少的连续部分，使每部分的预测大小不超过 limit_bytes。
+    一个部分的预测大小为固定开销加上其页面可达对象并集的大小（共享对象在同一部分内只计一次），
+    该值随部分延长单调不减，因此逐页贪心地尽量延长当前部分即可得到最少的部分数（线性时间）。
+    返回 [{'start', 'end', 'pages', 'predicted_mb'}, ...]（页码从1开始）；单页已超出上限时抛出 ValueError。
+    """
+    object_bytes = page_costs['object_bytes']
+    overhead = page_costs['overhead_bytes']
+    plan = []
+
+    def _close(start, end, size):
+        plan.append({'start': start + 1, 'end': end + 1, 'pages': end - start + 1, 'predicted_mb': size / (1024 * 1024)})
+
+    start, seen, size = 0, set(), overhead
+    for page, reachable in enumerate(page_costs['page_objects']):
+        added = sum(object_bytes[ref] for ref in reachable - seen)
+        if size + added > limit_bytes and page > start:
+            _close(start, page - 1, size)
+            start, seen, size = page, set(), overhead
+            added = sum(object_bytes[ref] for ref in reachable)
+        if size + added > limit_bytes:
+            raise ValueError(f"第 {page + 1} 页单独成册的预测大小 ({(size + added) / (1024 * 1024):.2f}MB) 已超过目标。")
+        seen |= reachable
+        size += added
+    if page_costs['page_objects']:
+        _close(start, len(page_costs['page_objects']) - 1, size)
+
+    # 母版本身不超过上限时（理论上不会触发拆分）仍拆分为两部分
+    if len(plan) == 1 and plan[0]['pages'] >= 2:
+        middle = plan[0]['pages'] // 2
+        plan = [
+            {'start': 1, 'end': middle, 'pages': middle, 'predicted_mb': None},
+            {'start': middle + 1, 'end': plan[0]['end'], 'pages': plan[0]['pages'] - middle, 'predicted_mb': None},
+        ]
+    return plan
+
+def _plan_by_average_density(source_size_mb, total_pages, target_size_mb, max_splits):
+    """无法计量逐页大小时的拆分规划：假设每页大小等于平均页面密度。"""
+    page_density = source_size_mb / total_pages
+    logging.info(f"母版总页数: {total_pages}, 平均页面密度: {page_density:.4f} MB/页")
+    split_count = _determine_optimal_split_count(source_size_mb, target_size_mb, max_splits)
+    logging.info(f"目标拆分数量: {split_count} 部分")
+    return _calculate_split_plan(total_pages, split_count, page_density, target_size_mb)
+
+def _verify_split_sizes(split_plan, part_paths, target_size_mb):
+    """
+    记录各部分的预测与实际大小，返回实际大小与目标之比的最大值（不超过1表示全部满足目标）。
+    """
+    worst_ratio = 0.0
+    for i, (part, part_path) in enumerate(zip(split_plan, part_paths), 1):
+        actual_mb = utils.get_file_size_mb(part_path)
+        worst_ratio = max(worst_ratio, actual_mb / target_size_mb)
+        if part.get('predicted_mb') is not None:
+            error = (actual_mb - part['predicted_mb']) / part['predicted_mb'] * 100 if part['predicted_mb'] else 0.0
+            logging.info(f"  - 部分 {i}: 预测 {part['predicted_mb']:.2f}MB，实际 {actual_mb:.2f}MB ({error:+.1f}%)")
+        else:
+            logging.info(f"  - 部分 {i}: 实际 {actual_mb:.2f}MB")
+        if actual_mb > target_size_mb:
+            logging.warning(f"部分 {i} 的实际大小 {actual_mb:.2f}MB 超出目标 {target_size_mb:.2f}MB。")
+    return worst_ratio
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            Path(path).unlink()
+        except OSError:
+            pass
+
 def _determine_optimal_split_count(source_size_mb, target_size_mb, max_splits):
     """
     计算最优的拆分数量 k。
@@ -145,7 +343,7 @@ def _calculate_split_plan(total_pages, k, page_density, target_size_mb):
     
     # 计算单个部分能容纳的最大页数（安全红线）
     # 留出一点缓冲，例如98%
-    safe_target_size = target_size_mb * 0.98
+    safe_target_size = target_size_mb * _SAFE_TARGET_RATIO
     if page_density == 0:
         # 避免除零错误，虽然不太可能发生
         raise ValueError("页面密度为0，无法进行拆分规划。")
@@ -199,6 +397,41 @@ def _calculate_split_plan(total_pages, k, page_density, target_size_mb):
 
     return plan
 
+def _split_pdf_parts(pdf_path, split_plan, part_paths, workers=1):
+    """
+    按拆分计划一次写出所有部分。
+    安装了 pikepdf 时在进程内只解析一次母版，依次写出各部分；
+    否则并行执行逐部分的 qpdf 拆分（每个进程各自解析母版，但总耗时约为单次拆分）。
+    """
+    if pikepdf is not None:
+        try:
+            _split_pdf_in_process(pdf_path, split_plan, part_paths)
+            return True
+        except Exception as e:
+            logging.warning(f"pikepdf 拆分失败，退回 qpdf 逐部分拆分: {e}")
+
+    def _split(item):
+        part_info, part_path = item
+        return _split_pdf_physical(pdf_path, part_path, part_info['start'], part_info['end'])
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(part_paths)))) as executor:
+        results = list(executor.map(_split, zip(split_plan, part_paths)))
+    for i, success in enumerate(results, 1):
+        if not success:
+            logging.error(f"拆分第 {i} 部分时失败。")
+            return False
+    return True
+
+def _split_pdf_in_process(pdf_path, split_plan, part_paths):
+    """用 pikepdf 打开一次母版，把各部分的页面复制到新文档后写出。"""
+    logging.info(f"正在用 pikepdf 拆分 {pdf_path.name} 为 {len(part_paths)} 部分（母版只解析一次）")
+    with pikepdf.open(pdf_path) as source:
+        for part_info, part_path in zip(split_plan, part_paths):
+            with pikepdf.new() as part:
+                part.pages.extend(source.pages[part_info['start'] - 1:part_info['end']])
+                part.save(part_path)
+            logging.info(f"  - 页码 {part_info['start']}-{part_info['end']} -> {part_path.name}")
+
 def _split_pdf_physical(pdf_path, output_path, start_page, end_page):
     """
     使用 qpdf 进行纯物理拆分。
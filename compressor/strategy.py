@@ -1,9 +1,13 @@
 # compressor/strategy.py
 
 import logging
+import math
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from . import utils, pipeline
+from . import utils, pipeline, ocr_cache, workspace, predictor, size_model, page_planner
 
 # 定义从S1（最保守）到S7（最激进）的7个压缩方案
 # 方案设计考虑了DPI、背景降采样和JPEG2000编码器的组合
@@ -18,37 +22,108 @@ COMPRESSION_SCHEMES = {
     7: {'name': 'S7-终极', 'dpi': 72, 'bg_downsample': 10, 'jpeg2000_encoder': 'grok'},
 }
 
-def _precompute_dar_steps(input_pdf_path, temp_dir):
+def _precompute_dar_steps(input_pdf_path, temp_dir, args=None, run_workspace=None, deadline=None):
     """
     执行一次性的解构和分析步骤。
+    args 中的 page_workers 控制页面级并行度（缺省为串行），
+    pipeline_mode 为 'streaming' 时光栅化与 OCR 以流水线方式重叠执行，
+    ocr_backend 选择 OCR 后端（'page'、'batch' 或 'inprocess'），
+    ocr_cache 为真时启用跨运行的 OCR 结果缓存，
+    page_progress 为可选的页面进度回调（见 batch_planner.BatchProgress.pages_done）。
+    deadline（time.monotonic() 时刻）为时间预算的截止时间，剩余时间作为光栅化与 OCR 命令的超时。
+
+    提供 run_workspace 时，已完成的预处理结果直接从工作区恢复；
+    未启用全局 OCR 缓存时使用工作区内的私有缓存，使中断的 OCR 可以逐页续做。
     """
     try:
         # 使用S1的DPI进行解构，因为它是最高质量的
         dpi_for_deconstruct = COMPRESSION_SCHEMES[1]['dpi']
+        page_workers = getattr(args, 'page_workers', 1) or 1
+        ocr_backend = getattr(args, 'ocr_backend', 'page')
+        on_page = getattr(args, 'page_progress', None)
+
+        if run_workspace is not None:
+            restored = _restore_precomputed_data(run_workspace, dpi_for_deconstruct)
+            if restored:
+                return restored
+
+        cache = None
+        if getattr(args, 'ocr_cache', False):
+            cache = ocr_cache.create_cache(
+                ocr_backend,
+                cache_dir=getattr(args, 'ocr_cache_dir', None) or ocr_cache.DEFAULT_CACHE_DIR,
+                max_size_mb=getattr(args, 'ocr_cache_max_mb', ocr_cache.DEFAULT_MAX_SIZE_MB)
+            )
+        elif run_workspace is not None:
+            cache = ocr_cache.create_cache(ocr_backend, cache_dir=run_workspace.path / "ocr_cache", max_size_mb=None)
+
+        if getattr(args, 'pipeline_mode', 'staged') == 'streaming':
+            logging.info(f"Rasterizing and analyzing PDF in streaming mode with DPI: {dpi_for_deconstruct}")
+            streamed = pipeline.rasterize_and_analyze(
+                input_pdf_path, temp_dir, dpi=dpi_for_deconstruct, workers=page_workers,
+                backend=ocr_backend, cache=cache, on_page=on_page, deadline=deadline
+            )
+            if not streamed:
+                logging.error("预处理失败：流水线解构/分析未完成。")
+                return None
+            image_files, hocr_file = streamed
+            return _finish_precompute(image_files, hocr_file, dpi_for_deconstruct, run_workspace)
+
         logging.info(f"Deconstructing PDF with DPI: {dpi_for_deconstruct}")
-        image_files = pipeline.deconstruct_pdf_to_images(input_pdf_path, temp_dir, dpi=dpi_for_deconstruct)
+        image_files = pipeline.deconstruct_pdf_to_images(
+            input_pdf_path, temp_dir, dpi=dpi_for_deconstruct, workers=page_workers, deadline=deadline
+        )
         if not image_files:
             logging.error("预处理失败：未能从PDF中提取图像。")
             return None
         
         logging.info("Analyzing images to generate hOCR...")
-        hocr_file = pipeline.analyze_images_to_hocr(image_files, temp_dir)
+        hocr_file = pipeline.analyze_images_to_hocr(
+            image_files, temp_dir, workers=page_workers, backend=ocr_backend, cache=cache, on_page=on_page,
+            deadline=deadline
+        )
         if not hocr_file:
             logging.error("预处理失败：未能生成hOCR文件。")
             return None
             
-        return {'image_files': image_files, 'hocr_file': hocr_file}
+        return _finish_precompute(image_files, hocr_file, dpi_for_deconstruct, run_workspace)
     except Exception as e:
         logging.error(f"预处理步骤中发生错误: {e}", exc_info=True)
         return None
 
-def run_compression_strategy(input_pdf_path, output_dir, target_size_mb, keep_temp_on_failure=False):
+def _finish_precompute(image_files, hocr_file, dpi, run_workspace):
+    """组装预处理结果；启用工作区时记录预处理步骤已完成。"""
+    if run_workspace is not None:
+        run_workspace.complete_step(
+            'precompute',
+            dpi=dpi,
+            image_files=[Path(f).name for f in image_files],
+            hocr_file=Path(hocr_file).name
+        )
+    return {'image_files': image_files, 'hocr_file': hocr_file, 'workspace': run_workspace}
+
+def _restore_precomputed_data(run_workspace, dpi):
+    """从工作区恢复已完成的预处理结果，记录缺失或不完整时返回 None。"""
+    step = run_workspace.get_step('precompute')
+    if not step or step.get('dpi') != dpi:
+        return None
+    image_files = [run_workspace.path / name for name in step['image_files']]
+    hocr_file = run_workspace.path / step['hocr_file']
+    if not hocr_file.exists() or not all(f.exists() for f in image_files):
+        logging.warning("工作区中的预处理结果不完整，将重新执行预处理。")
+        return None
+    logging.info(f"从工作区恢复预处理结果: {len(image_files)} 页图像与 hOCR，跳过解构和分析。")
+    return {'image_files': image_files, 'hocr_file': hocr_file, 'workspace': run_workspace}
+
+def run_compression_strategy(input_pdf_path, output_dir, target_size_mb, keep_temp_on_failure=False, args=None):
     """
     运行新的二进制双向搜索压缩策略。
+    args 为可选的命令行参数对象，用于读取并行度等性能相关选项。
     返回一个状态元组 (status, details)。
     status: 'SUCCESS', 'FAILURE', 'SKIPPED', 'ERROR'
     details: 包含结果信息的字典
     """
+    started = time.monotonic()
     original_size_mb = utils.get_file_size_mb(input_pdf_path)
     logging.info(f"文件 {input_pdf_path.name} (大小: {original_size_mb:.2f}MB) 应用新的压缩策略...")
 
@@ -56,56 +131,241 @@ def run_compression_strategy(input_pdf_path, output_dir, target_size_mb, keep_te
         logging.warning(f"文件 {input_pdf_path.name} ({original_size_mb:.2f}MB) 已满足要求，跳过压缩。")
         return 'SKIPPED', {'message': 'File size is already within target.'}
 
-    temp_dir = Path(utils.create_temp_directory())
+    # 启用工作区时，中间结果保存在以文件哈希为键的持久目录中，运行结束后不清理
+    run_workspace = None
+    if getattr(args, 'workspace', False):
+        run_workspace = workspace.open_workspace(
+            input_pdf_path, root=getattr(args, 'workspace_dir', None) or workspace.DEFAULT_WORKSPACE_ROOT
+        )
+        temp_dir = run_workspace.path
+    else:
+        temp_dir = Path(utils.create_temp_directory())
     
     try:
+        # 单个文件的处理时间预算（含预处理时间）：预处理的外部命令以剩余时间为超时
+        time_budget = None
+        if getattr(args, 'time_budget', None):
+            time_budget = TimeBudget(args.time_budget, started)
+
         # 预计算步骤：只执行一次最耗时的解构和分析
         logging.info(f"预处理：使用最高DPI ({COMPRESSION_SCHEMES[1]['dpi']}) 生成图像和hOCR文件...")
-        precomputed_data = _precompute_dar_steps(input_pdf_path, temp_dir)
+        precomputed_data = _precompute_dar_steps(
+            input_pdf_path, temp_dir, args, run_workspace,
+            deadline=time_budget.deadline if time_budget is not None else None
+        )
         if not precomputed_data:
+            if time_budget is not None and time_budget.remaining() <= 0:
+                logging.error(f"预处理未能在时间预算 {args.time_budget:.0f}秒内完成。")
+                return 'ERROR', {'message': 'Preprocessing (DAR) exceeded the time budget.'}
             return 'ERROR', {'message': 'Preprocessing (DAR) failed.'}
 
-        # 运行核心策略逻辑
-        final_result_path, all_results = _run_strategy_logic(
-            input_pdf_path, output_dir, target_size_mb, temp_dir, precomputed_data
-        )
+        # 重建阶段的分片数（1 为单个 recode_pdf 进程）
+        precomputed_data['reconstruct_shards'] = getattr(args, 'reconstruct_shards', 1) or 1
+        # 同一 DPI 的方案共享 MRC 分层，一次重建
+        precomputed_data['share_mrc_layers'] = getattr(args, 'share_mrc_layers', False)
+
+        if time_budget is not None:
+            precomputed_data['time_budget'] = time_budget
+            logging.info(f"时间预算: {args.time_budget:.0f}秒，预处理后剩余 {time_budget.remaining():.0f}秒。")
+
+        # 启用 DPI 图像金字塔时，各方案按需使用与其 DPI 匹配的图像栈。
+        # 逐页方案总是使用图像金字塔：以 --dpi 72/100 重建预处理的 300 DPI 图像会改变页面尺寸，
+        # 合并后各页的 MediaBox 将不一致
+        if getattr(args, 'dpi_pyramid', False) or getattr(args, 'per_page_schemes', False):
+            precomputed_data.update({
+                'dpi_stacks': {},
+                'input_pdf': input_pdf_path,
+                'source_dpi': COMPRESSION_SCHEMES[1]['dpi'],
+                'workers': getattr(args, 'page_workers', 1) or 1,
+            })
+
+        # 启用大小预测时，先用抽样页面预测各方案大小，只完整重建预测最合适的方案
+        predictions = None
+        if getattr(args, 'size_prediction', False):
+            predictions = predictor.predict_scheme_sizes(
+                precomputed_data['image_files'], temp_dir,
+                {scheme_id: _scheme_params(scheme_id) for scheme_id in COMPRESSION_SCHEMES},
+                sample_pages=getattr(args, 'prediction_samples', predictor.DEFAULT_SAMPLE_PAGES),
+                workers=getattr(args, 'page_workers', 1) or 1,
+                pdf_path=input_pdf_path if 'dpi_stacks' in precomputed_data else None,
+                source_dpi=COMPRESSION_SCHEMES[1]['dpi']
+            )
+            if not predictions:
+                logging.warning("大小预测不可用，退回常规压缩策略。")
+
+        # 启用大小模型时，用历史运行拟合的模型预测各方案大小（抽样预测优先），运行结束后记录实测大小
+        size_history = None
+        if getattr(args, 'size_model', False):
+            size_history = getattr(args, 'size_history', None) or size_model.DEFAULT_HISTORY_PATH
+            features = size_model.document_features(
+                input_pdf_path, precomputed_data['image_files'], precomputed_data['hocr_file']
+            )
+            mode = size_model.run_mode(args)
+            if not predictions:
+                model = size_model.fit_model(size_model.load_history(size_history), mode)
+                if model:
+                    predictions = size_model.predict_scheme_sizes(model, features, {
+                        scheme_id: dict(_scheme_params(scheme_id), strip_text=(scheme_id == 7))
+                        for scheme_id in COMPRESSION_SCHEMES
+                    })
+                else:
+                    logging.info(f"当前运行模式下大小模型的历史文档不足 {size_model.MIN_TRAINING_DOCUMENTS} 个，本次使用常规压缩策略并记录结果。")
+
+        # 运行核心策略逻辑（逐页方案不可用或无法满足目标时退回整份文件的方案选择）
+        page_plan = None
+        if getattr(args, 'per_page_schemes', False):
+            page_plan = _run_per_page_strategy_logic(
+                input_pdf_path, output_dir, target_size_mb, temp_dir, precomputed_data,
+                workers=getattr(args, 'page_workers', 1) or 1
+            )
+            if not page_plan[0]:
+                logging.warning("逐页方案未能满足目标，退回整份文件的方案选择。")
+
+        if page_plan and page_plan[0]:
+            final_result_path, all_results = page_plan
+        elif predictions:
+            final_result_path, all_results = _run_predicted_strategy_logic(
+                input_pdf_path, output_dir, target_size_mb, temp_dir, precomputed_data, predictions
+            )
+        elif getattr(args, 'search_mode', 'ladder') == 'continuous':
+            final_result_path, all_results = _run_continuous_strategy_logic(
+                input_pdf_path, output_dir, target_size_mb, temp_dir, precomputed_data,
+                budget=getattr(args, 'search_budget', DEFAULT_SEARCH_BUDGET)
+            )
+        else:
+            final_result_path, all_results = _run_strategy_logic(
+                input_pdf_path, output_dir, target_size_mb, temp_dir, precomputed_data,
+                scheme_concurrency=getattr(args, 'scheme_concurrency', 1) or 1,
+                early_abort=getattr(args, 'early_abort', False),
+                allow_splitting=getattr(args, 'allow_splitting', False)
+            )
+
+        if size_history is not None:
+            size_model.record_run(size_history, input_pdf_path.name, features, _size_observations(all_results), mode)
 
         if final_result_path:
             best_scheme_id = final_result_path['scheme_id']
             final_path = final_result_path['path']
             return 'SUCCESS', {
                 'best_scheme_id': best_scheme_id,
+                'scheme_name': _scheme_name(best_scheme_id, all_results),
                 'final_path': final_path,
-                'all_results': all_results
+                'all_results': all_results,
+                'budget_limited': final_result_path.get('budget_limited', False)
             }
         else:
-            return 'FAILURE', {'all_results': all_results}
+            return 'FAILURE', {
+                'all_results': all_results,
+                'budget_limited': time_budget is not None and time_budget.exhausted
+            }
 
     except Exception as e:
         logging.critical(f"压缩策略执行期间发生意外错误: {e}", exc_info=True)
         return 'ERROR', {'message': str(e), 'all_results': {}}
     finally:
-        if keep_temp_on_failure and 'final_result_path' not in locals():
+        if run_workspace is not None:
+            logging.info(f"工作区保留在: {temp_dir}")
+        elif keep_temp_on_failure and 'final_result_path' not in locals():
              logging.warning(f"压缩失败，临时目录保留在: {temp_dir}")
         else:
             utils.cleanup_directory(temp_dir)
 
-def _run_strategy_logic(input_pdf_path, output_dir, target_size_mb, temp_dir, precomputed_data):
+def _make_scheme_runner(temp_dir, precomputed_data, original_filename, concurrency=1, size_limit=None):
+    """
+    创建按需执行方案的函数 run(scheme_id, lookahead=())。
+    返回值为 _execute_scheme 的结果；提前终止的方案返回 pipeline.SizeLimitExceeded 实例，
+    时间预算不足以执行该方案时抛出 BudgetExhausted。
+
+    concurrency > 1 时，执行 scheme_id 的同时从 lookahead（串行算法接下来将要访问的
+    方案，按访问顺序排列）中取出尚未执行的方案一并并发执行，结果缓存供后续调用直接返回。
+    各方案只读共享预处理结果且输出文件名互不相同，因此可以安全并发；
+    调用方仍按串行顺序逐个取结果，选择结果与串行算法完全一致。
+
+    size_limit 为可选的函数 size_limit(scheme_id) -> 大小上限(MB) 或 None，
+    在方案开始执行时求值，超过上限的重建被提前终止。
+
+    precomputed_data['share_mrc_layers'] 为真时，执行 scheme_id 的同时以共享的 MRC 分层
+    一并重建尚未执行的同 DPI 方案（见 _execute_scheme_group），结果同样缓存。
+    """
+    finished = {}
+
+    def execute(scheme_id):
+        limit = size_limit(scheme_id) if size_limit else None
+        try:
+            return _execute_scheme(scheme_id, temp_dir, precomputed_data, original_filename, size_limit_mb=limit)
+        except (pipeline.SizeLimitExceeded, BudgetExhausted) as e:
+            return e
+
+    def run(scheme_id, lookahead=()):
+        if scheme_id not in finished and precomputed_data.get('share_mrc_layers'):
+            finished.update(_execute_scheme_group(
+                _same_dpi_schemes(scheme_id, finished), temp_dir, precomputed_data, original_filename
+            ))
+        if scheme_id not in finished:
+            batch = [scheme_id]
+            for candidate in lookahead:
+                if len(batch) >= concurrency:
+                    break
+                if candidate not in finished and candidate not in batch:
+                    batch.append(candidate)
+            if len(batch) == 1:
+                finished[scheme_id] = execute(scheme_id)
+            else:
+                logging.info(f"并发执行方案: {', '.join(COMPRESSION_SCHEMES[i]['name'] for i in batch)}")
+                with ThreadPoolExecutor(max_workers=len(batch)) as executor:
+                    futures = {
+                        i: executor.submit(execute, i)
+                        for i in batch
+                    }
+                    for i, future in futures.items():
+                        finished[i] = future.result()
+        result = finished[scheme_id]
+        if isinstance(result, BudgetExhausted):
+            del finished[scheme_id]
+            raise result
+        return result
+
+    return run
+
+def _run_strategy_logic(input_pdf_path, output_dir, target_size_mb, temp_dir, precomputed_data, scheme_concurrency=1,
+                        early_abort=False, allow_splitting=False):
     """
     包含核心压缩策略逻辑的内部函数。
+    scheme_concurrency 为同时执行的方案数上限（缺省为串行），
+    并发时按串行算法的访问顺序预先执行后续方案，最终选择结果与串行执行相同。
+    early_abort 为真时，重建一旦确定超出不影响决策的大小上限即被终止，
+    该方案在 all_results 中记录为 'exceeded'（无输出路径）。
+    设置了时间预算且预算不足以执行下一个方案时，转入 _finish_within_budget。
     返回 (final_result_path_dict, all_results) 或 (None, all_results)
     """
     all_results = {}
 
-    # 步骤1: 总是先执行最保守的方案S1
+    def size_limit(scheme_id):
+        """
+        方案的提前终止上限。超过该值的结果不会改变方案选择：S1 还需判断是否超过目标的
+        1.5 倍，S7 还需判断是否超过 8MB；允许拆分时不超过 8MB 的结果可能被选为拆分母版。
+        """
+        limit = max(target_size_mb, 8.0) if allow_splitting else target_size_mb
+        if scheme_id == 1:
+            limit = max(limit, target_size_mb * 1.5)
+        elif scheme_id == 7:
+            limit = max(limit, 8.0)
+        return limit
+
+    run_scheme = _make_scheme_runner(
+        temp_dir, precomputed_data, input_pdf_path.name, scheme_concurrency,
+        size_limit=size_limit if early_abort else None
+    )
+
+    # 步骤1: 总是先执行最保守的方案S1（并发时同时推测执行S7）
     logging.info("--- 步骤1: 执行最保守方案 S1 ---")
-    s1_result_path = _execute_scheme(1, temp_dir, precomputed_data, input_pdf_path.name)
-    if not s1_result_path:
+    try:
+        s1_size_mb = _record_scheme_result(1, run_scheme(1, lookahead=(7,)), all_results)
+    except BudgetExhausted as e:
+        return _finish_within_budget(e, input_pdf_path, output_dir, target_size_mb, temp_dir, precomputed_data, all_results)
+    if s1_size_mb is None:
         logging.error("关键错误：方案S1执行失败，无法继续。")
         return None, all_results
-    
-    s1_size_mb = utils.get_file_size_mb(s1_result_path)
-    all_results[1] = {'path': s1_result_path, 'size_mb': s1_size_mb}
 
     # 检查S1是否已经满足要求
     if s1_size_mb <= target_size_mb:
@@ -120,10 +380,8 @@ def _run_strategy_logic(input_pdf_path, output_dir, target_size_mb, temp_dir, pr
             
             # 步骤2.1: 直接尝试最激进的方案S7
             logging.info("--- 步骤2.1: 执行最激进方案 S7 ---")
-            s7_result_path = _execute_scheme(7, temp_dir, precomputed_data, input_pdf_path.name)
-            if s7_result_path:
-                s7_size_mb = utils.get_file_size_mb(s7_result_path)
-                all_results[7] = {'path': s7_result_path, 'size_mb': s7_size_mb}
+            s7_size_mb = _record_scheme_result(7, run_scheme(7, lookahead=range(6, 1, -1)), all_results)
+            if s7_size_mb is not None:
                 
                 # 关键检查：如果S7结果大于8MB，说明无法拆分，直接宣告失败
                 if s7_size_mb > 8.0:
@@ -142,10 +400,8 @@ def _run_strategy_logic(input_pdf_path, output_dir, target_size_mb, temp_dir, pr
                     best_scheme_id = 7
                     # 从S6到S2向上回溯
                     for i in range(6, 1, -1):
-                        result_path = _execute_scheme(i, temp_dir, precomputed_data, input_pdf_path.name)
-                        if result_path:
-                            size_mb = utils.get_file_size_mb(result_path)
-                            all_results[i] = {'path': result_path, 'size_mb': size_mb}
+                        size_mb = _record_scheme_result(i, run_scheme(i, lookahead=range(i - 1, 1, -1)), all_results)
+                        if size_mb is not None:
                             if size_mb <= target_size_mb:
                                 best_scheme_id = i # 更新为当前更优的方案
                                 logging.info(f"方案 {COMPRESSION_SCHEMES[i]['name']} 成功，大小 {size_mb:.2f}MB，继续回溯...")
@@ -160,10 +416,10 @@ def _run_strategy_logic(input_pdf_path, output_dir, target_size_mb, temp_dir, pr
             logging.warning("S7方案未成功或未执行，将按顺序尝试剩余方案...")
             for i in range(2, 7):
                 if i not in all_results:
-                    result_path = _execute_scheme(i, temp_dir, precomputed_data, input_pdf_path.name)
-                    if result_path:
-                        size_mb = utils.get_file_size_mb(result_path)
-                        all_results[i] = {'path': result_path, 'size_mb': size_mb}
+                    size_mb = _record_scheme_result(
+                        i, run_scheme(i, lookahead=[j for j in range(i + 1, 7) if j not in all_results]), all_results
+                    )
+                    if size_mb is not None:
                         if size_mb <= target_size_mb:
                             logging.info(f"成功！方案 {COMPRESSION_SCHEMES[i]['name']} 满足要求。")
                             # 在这种情况下，我们找到了一个可行的方案，但不是通过回溯，所以直接返回
@@ -177,20 +433,491 @@ def _run_strategy_logic(input_pdf_path, output_dir, target_size_mb, temp_dir, pr
             logging.info(f"S1结果 ({s1_size_mb:.2f}MB) <= 阈值 ({target_size_mb * 1.5:.2f}MB)，启动【渐进式压缩】策略。")
             # 从S2到S7顺序执行，直到找到第一个满足条件的
             for i in range(2, 8):
-                result_path = _execute_scheme(i, temp_dir, precomputed_data, input_pdf_path.name)
-                if result_path:
-                    size_mb = utils.get_file_size_mb(result_path)
-                    all_results[i] = {'path': result_path, 'size_mb': size_mb}
+                size_mb = _record_scheme_result(i, run_scheme(i, lookahead=range(i + 1, 8)), all_results)
+                if size_mb is not None:
                     if size_mb <= target_size_mb:
                         logging.info(f"成功！方案 {COMPRESSION_SCHEMES[i]['name']} 满足要求。")
                         return _copy_to_output(i, all_results, output_dir, input_pdf_path.name), all_results
             
             logging.error("所有渐进式压缩方案均失败。")
             return None, all_results
+    except BudgetExhausted as e:
+        return _finish_within_budget(e, input_pdf_path, output_dir, target_size_mb, temp_dir, precomputed_data, all_results)
     except Exception as e:
         logging.critical(f"压缩策略逻辑执行期间发生意外错误: {e}", exc_info=True)
         return None, all_results
 
+def interpolate_scheme_params(q):
+    """
+    将质量参数 q∈[0, 1] 映射为重建参数：q=0 为 S1，q=1 为 S7，
+    中间沿 S1→S7 各方案连成的折线对 DPI 与背景降采样线性插值（取整），
+    编码器取最近的方案。q 越大输出越小、质量越低。
+    """
+    ids = sorted(COMPRESSION_SCHEMES)
+    position = min(max(q, 0.0), 1.0) * (len(ids) - 1)
+    k = min(int(position), len(ids) - 2)
+    fraction = position - k
+    lower, upper = COMPRESSION_SCHEMES[ids[k]], COMPRESSION_SCHEMES[ids[k + 1]]
+    dpi = int(round(lower['dpi'] + (upper['dpi'] - lower['dpi']) * fraction))
+    bg_downsample = int(round(lower['bg_downsample'] + (upper['bg_downsample'] - lower['bg_downsample']) * fraction))
+    encoder = (lower if fraction < 0.5 else upper)['jpeg2000_encoder']
+    return {
+        'name': f"Q{q:.3f}-连续 (DPI {dpi}, BG {bg_downsample})",
+        'dpi': dpi,
+        'bg_downsample': bg_downsample,
+        'jpeg2000_encoder': encoder
+    }
+
+# 连续搜索的默认评估预算（完整重建次数，含 S1 与 S7）
+DEFAULT_SEARCH_BUDGET = 6
+
+# 连续搜索的瞄准点：略低于目标，使下一次评估更可能落在目标以内
+_SEARCH_AIM_RATIO = 0.97
+
+# 每次迭代至少把搜索区间缩小的比例，避免割线法在区间一端停滞
+_SEARCH_MIN_STEP = 0.1
+
+def _run_continuous_strategy_logic(input_pdf_path, output_dir, target_size_mb, temp_dir, precomputed_data,
+                                   budget=DEFAULT_SEARCH_BUDGET):
+    """
+    连续参数搜索策略。
+    先以 S1 与 S7 确定搜索区间（沿用 S7 大于 8MB 失败、S7 介于目标与 8MB 之间时目标切换为 8MB 的规则），
+    然后利用输出大小随质量参数单调下降的性质，在对数大小上做割线插值（并保证区间每次至少缩小一定比例），
+    直到用完 budget 次完整重建或相邻参数已无法区分，返回满足目标的最高质量参数。
+    返回 (final_result_path_dict, all_results) 或 (None, all_results)
+    """
+    all_results = {}
+    evaluations = 0
+
+    def evaluate(q):
+        nonlocal evaluations
+        evaluations += 1
+        if q == 0.0:
+            return 1, _record_scheme_result(1, _execute_scheme(1, temp_dir, precomputed_data, input_pdf_path.name), all_results)
+        if q == 1.0:
+            return 7, _record_scheme_result(7, _execute_scheme(7, temp_dir, precomputed_data, input_pdf_path.name), all_results)
+        key = f"Q{int(round(q * 1000)):04d}"
+        params = interpolate_scheme_params(q)
+        output_pdf_path = temp_dir / f"output_{input_pdf_path.stem}_{key}.pdf"
+        result = _execute_params(key, params, output_pdf_path, temp_dir, precomputed_data)
+        size_mb = _record_scheme_result(key, result, all_results)
+        if size_mb is not None:
+            all_results[key].update({'name': params['name'], 'params': params})
+        return key, size_mb
+
+    try:
+        logging.info("--- 连续搜索: 执行 S1 ---")
+        s1_key, s1_size_mb = evaluate(0.0)
+        if s1_size_mb is None:
+            logging.error("关键错误：方案S1执行失败，无法继续。")
+            return None, all_results
+        if s1_size_mb <= target_size_mb:
+            logging.info(f"太棒了！最保守的方案S1已满足要求 (大小: {s1_size_mb:.2f}MB)。")
+            return _copy_to_output(s1_key, all_results, output_dir, input_pdf_path.name), all_results
+
+        logging.info("--- 连续搜索: 执行 S7 确定搜索区间 ---")
+        s7_key, s7_size_mb = evaluate(1.0)
+        if s7_size_mb is None:
+            logging.error("方案S7执行失败，无法确定搜索区间。")
+            return None, all_results
+        if s7_size_mb > 8.0:
+            logging.error(f"❌ 最激进方案 S7 的结果 ({s7_size_mb:.2f}MB) 仍大于 8MB 拆分阈值，即使拆分也无法满足 2MB 目标，任务失败。")
+            return None, all_results
+        if target_size_mb < 8.0 and s7_size_mb > target_size_mb:
+            logging.warning(f"⚠️ S7 结果 ({s7_size_mb:.2f}MB) 超过原目标 ({target_size_mb:.2f}MB) 但小于 8MB。")
+            logging.info("🔄 策略调整：将目标切换为 8MB，寻找最接近 8MB 的方案用于后续拆分。")
+            target_size_mb = 8.0
+        if s7_size_mb > target_size_mb:
+            logging.error("所有压缩方案均失败。")
+            return None, all_results
+
+        # (q, 结果键, 大小)：low 超出目标，high 满足目标
+        low = (0.0, s1_key, s1_size_mb)
+        high = (1.0, s7_key, s7_size_mb)
+        aim = math.log(target_size_mb * _SEARCH_AIM_RATIO)
+        while evaluations < budget:
+            width = high[0] - low[0]
+            q = low[0] + width * (math.log(low[2]) - aim) / (math.log(low[2]) - math.log(high[2]))
+            q = min(max(q, low[0] + width * _SEARCH_MIN_STEP), high[0] - width * _SEARCH_MIN_STEP)
+            candidate = interpolate_scheme_params(q)
+            if any(_same_rendering(candidate, interpolate_scheme_params(bound[0])) for bound in (low, high)):
+                logging.info("搜索区间两端的参数已无法再细分，停止搜索。")
+                break
+            key, size_mb = evaluate(q)
+            if size_mb is None:
+                logging.warning(f"参数 {candidate['name']} 重建失败，停止搜索。")
+                break
+            logging.info(f"连续搜索: {candidate['name']} -> {size_mb:.2f}MB (目标 {target_size_mb:.2f}MB)")
+            if size_mb <= target_size_mb:
+                high = (q, key, size_mb)
+            else:
+                low = (q, key, size_mb)
+
+        logging.info(
+            f"连续搜索完成 (完整重建 {evaluations} 次)，{_scheme_name(high[1], all_results)} "
+            f"({high[2]:.2f}MB) 是可满足目标的最高质量参数。"
+        )
+        return _copy_to_output(high[1], all_results, output_dir, input_pdf_path.name), all_results
+    except BudgetExhausted as e:
+        return _finish_within_budget(e, input_pdf_path, output_dir, target_size_mb, temp_dir, precomputed_data, all_results)
+    except Exception as e:
+        logging.critical(f"压缩策略逻辑执行期间发生意外错误: {e}", exc_info=True)
+        return None, all_results
+
+def _same_rendering(params_a, params_b):
+    """两组插值参数取整后是否产生相同的重建结果。"""
+    return all(params_a[k] == params_b[k] for k in ('dpi', 'bg_downsample', 'jpeg2000_encoder'))
+
+# 逐页方案的预算余量：规划时以目标的该比例为预算，抵消页面大小估计误差与合并开销
+_PAGE_PLAN_MARGIN = 0.95
+
+# 逐页方案实测超出目标时按实测值收紧预算重新规划的最多次数
+_PAGE_PLAN_ATTEMPTS = 3
+
+def _run_per_page_strategy_logic(input_pdf_path, output_dir, target_size_mb, temp_dir, precomputed_data, workers=1):
+    """
+    逐页方案策略：按文字覆盖率与图像大小对页面分类，抽样估计每页在各方案下的大小，
+    在预测总大小不超过目标的前提下为每页分配尽量保守的方案，然后按方案分组重建并按页码顺序合并。
+    实测超出目标时按实测偏差收紧预算重新规划。
+    返回 (final_result_path_dict, all_results) 或 (None, all_results)；
+    结果在 all_results 中记录为键 'P'。
+    """
+    all_results = {}
+    image_files = precomputed_data['image_files']
+    try:
+        stats = page_planner.page_statistics(image_files, precomputed_data['hocr_file'])
+        if stats is None:
+            return None, all_results
+        schemes = {
+            scheme_id: dict(_scheme_params(scheme_id), strip_text=(scheme_id == 7))
+            for scheme_id in COMPRESSION_SCHEMES
+        }
+        estimated = page_planner.estimate_page_sizes(
+            image_files, temp_dir, stats, schemes, workers=workers,
+            pdf_path=precomputed_data.get('input_pdf') if 'dpi_stacks' in precomputed_data else None,
+            source_dpi=precomputed_data.get('source_dpi')
+        )
+        if estimated is None:
+            return None, all_results
+        page_sizes, overhead_bytes = estimated
+
+        # 每页的估计值不含单个 PDF 的固定开销，求解前先从预算中扣除
+        budget_bytes = target_size_mb * 1024 * 1024 * _PAGE_PLAN_MARGIN - overhead_bytes
+        output_pdf_path = temp_dir / f"output_{input_pdf_path.stem}_P.pdf"
+        time_budget = precomputed_data.get('time_budget')
+        for attempt in range(1, _PAGE_PLAN_ATTEMPTS + 1):
+            if time_budget is not None and time_budget.remaining() <= 0:
+                logging.warning("时间预算已用尽，停止逐页规划。")
+                break
+            assignment = page_planner.assign_schemes(page_sizes, budget_bytes)
+            if assignment is None:
+                logging.warning("即使所有页面都使用最激进方案，预测大小仍超出目标。")
+                return None, all_results
+            counts = {i: assignment.count(i) for i in sorted(set(assignment))}
+            name = "逐页方案 (" + ", ".join(f"S{i}×{n}" for i, n in counts.items()) + ")"
+            predicted_mb = (sum(sizes[i] for sizes, i in zip(page_sizes, assignment)) + overhead_bytes) / (1024 * 1024)
+            logging.info(f"--- 第 {attempt} 次逐页规划: {name}，预测大小 {predicted_mb:.2f}MB ---")
+
+            groups = []
+            for scheme_id in counts:
+                stack = _get_dpi_stack(schemes[scheme_id]['dpi'], temp_dir, precomputed_data)
+                if stack is None:
+                    logging.error(f"方案 {COMPRESSION_SCHEMES[scheme_id]['name']} 的图像栈生成失败。")
+                    return None, all_results
+                groups.append({
+                    'image_files': stack[0],
+                    'hocr_file': stack[1],
+                    'pages': [page for page, i in enumerate(assignment) if i == scheme_id],
+                    'params': schemes[scheme_id],
+                    'strip_text': scheme_id == 7,
+                })
+            if not pipeline.reconstruct_page_groups(groups, len(image_files), output_pdf_path, workers=workers):
+                return None, all_results
+
+            size_mb = utils.get_file_size_mb(output_pdf_path)
+            all_results['P'] = {'path': output_pdf_path, 'size_mb': size_mb, 'name': name, 'assignment': assignment}
+            logging.info(f"逐页方案实际大小 {size_mb:.2f}MB (预测 {predicted_mb:.2f}MB，目标 {target_size_mb:.2f}MB)")
+            if size_mb <= target_size_mb:
+                return _copy_to_output('P', all_results, output_dir, input_pdf_path.name), all_results
+            budget_bytes = (budget_bytes + overhead_bytes) * target_size_mb / size_mb * _PAGE_PLAN_MARGIN - overhead_bytes
+
+        logging.warning("逐页方案未能在规划次数内满足目标。")
+        all_results.pop('P', None)
+        return None, all_results
+    except Exception as e:
+        logging.critical(f"逐页方案执行期间发生意外错误: {e}", exc_info=True)
+        return None, all_results
+
+def _scheme_name(scheme_id, all_results=None):
+    """返回方案（或连续搜索结果）的显示名称。"""
+    if scheme_id in COMPRESSION_SCHEMES:
+        return COMPRESSION_SCHEMES[scheme_id]['name']
+    return (all_results or {}).get(scheme_id, {}).get('name', str(scheme_id))
+
+class BudgetExhausted(Exception):
+    """时间预算不足以执行下一个方案。"""
+
+class TimeBudget:
+    """
+    单个文件的处理时间预算（线程安全）。
+    以已完成重建的耗时估计方案的执行时间（与 DPI 的平方，即像素数成正比），
+    预计无法在剩余时间内完成的方案不再执行。
+    """
+
+    def __init__(self, seconds, started=None):
+        self.deadline = (time.monotonic() if started is None else started) + seconds
+        self.exhausted = False
+        self._seconds_per_unit = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _units(params):
+        return (params['dpi'] / 100) ** 2
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def estimate(self, params):
+        """估计一组重建参数的执行秒数，尚无观测时返回 None。"""
+        with self._lock:
+            if not self._seconds_per_unit:
+                return None
+            unit = sum(self._seconds_per_unit) / len(self._seconds_per_unit)
+        return unit * self._units(params)
+
+    def affordable(self, params):
+        remaining = self.remaining()
+        estimate = self.estimate(params)
+        return remaining > 0 and (estimate is None or estimate <= remaining)
+
+    def check(self, params):
+        """预算不足以执行该参数的重建时标记预算耗尽并抛出 BudgetExhausted。"""
+        if not self.affordable(params):
+            self.exhausted = True
+            estimate = self.estimate(params)
+            raise BudgetExhausted(
+                f"剩余时间 {self.remaining():.0f}秒不足以执行方案 {params['name']}"
+                + (f" (预计 {estimate:.0f}秒)" if estimate is not None else "")
+            )
+
+    def record(self, params, seconds):
+        with self._lock:
+            self._seconds_per_unit.append(seconds / self._units(params))
+
+# 时间预算收尾阶段：对数大小预测的标准差，以及没有相邻观测时每级方案的大小比例
+_SIZE_LOG_SIGMA = 0.3
+_DEFAULT_STEP_RATIO = 0.6
+
+# 期望收益低于该值（满足目标的概率 × 提升的方案级数）的方案不再尝试
+_MIN_EXPECTED_GAIN = 0.25
+
+def _quality_rank(key):
+    """结果键在 S1→S7 质量轴上的位置（越小质量越高）；逐页方案等无法比较的结果返回 None。"""
+    if key in COMPRESSION_SCHEMES:
+        return key
+    if isinstance(key, str) and key.startswith('Q') and key[1:].isdigit():
+        return 1 + (len(COMPRESSION_SCHEMES) - 1) * int(key[1:]) / 1000
+    return None
+
+def _best_fitting_result(all_results, target_size_mb):
+    """返回满足目标且质量最高的结果键，没有时返回 None。"""
+    fitting = [
+        key for key, result in all_results.items()
+        if result.get('path') and result['size_mb'] <= target_size_mb and _quality_rank(key) is not None
+    ]
+    return min(fitting, key=_quality_rank) if fitting else None
+
+def _fit_probability(scheme_id, all_results, target_size_mb):
+    """根据已有结果在对数大小上插值（或外推）估计方案满足目标的概率。"""
+    known = sorted(
+        (_quality_rank(key), math.log(result['size_mb']))
+        for key, result in all_results.items()
+        if result.get('size_mb') and _quality_rank(key) is not None
+    )
+    if not known:
+        return 0.5
+    lower = [point for point in known if point[0] <= scheme_id]
+    upper = [point for point in known if point[0] > scheme_id]
+    if lower and upper:
+        (r0, y0), (r1, y1) = lower[-1], upper[0]
+        log_size = y0 + (y1 - y0) * (scheme_id - r0) / (r1 - r0)
+    else:
+        side = lower if lower else upper
+        near = side[-1] if lower else side[0]
+        if len(side) >= 2:
+            (r0, y0), (r1, y1) = side[-2:] if lower else side[:2]
+            slope = (y1 - y0) / (r1 - r0)
+        else:
+            slope = math.log(_DEFAULT_STEP_RATIO)
+        log_size = near[1] + slope * (scheme_id - near[0])
+    z = (math.log(target_size_mb) - log_size) / _SIZE_LOG_SIGMA
+    return 0.5 * (1 + math.erf(z / math.sqrt(2)))
+
+def _choose_by_expected_value(all_results, target_size_mb, best_key, time_budget, tried):
+    """
+    在剩余时间内可完成、且比当前最优结果质量更高的方案中，
+    选择期望收益（满足目标的概率 × 提升的方案级数）最大的一个；没有值得尝试的方案时返回 None。
+    """
+    best_rank = _quality_rank(best_key) if best_key is not None else max(COMPRESSION_SCHEMES) + 1
+    choice, choice_value = None, _MIN_EXPECTED_GAIN
+    for scheme_id in COMPRESSION_SCHEMES:
+        if scheme_id in tried or scheme_id >= best_rank or not time_budget.affordable(_scheme_params(scheme_id)):
+            continue
+        value = _fit_probability(scheme_id, all_results, target_size_mb) * (best_rank - scheme_id)
+        if value > choice_value:
+            choice, choice_value = scheme_id, value
+    if choice is not None:
+        logging.info(f"时间预算收尾: 选择期望收益最大的方案 {COMPRESSION_SCHEMES[choice]['name']} (期望收益 {choice_value:.2f})")
+    return choice
+
+def _finish_within_budget(exhausted, input_pdf_path, output_dir, target_size_mb, temp_dir, precomputed_data, all_results):
+    """
+    时间预算不足时的收尾：在剩余时间内可完成的方案中按期望收益依次选择并执行，
+    直到没有值得尝试的方案；然后返回已找到的满足目标的最高质量结果，标记为 budget_limited。
+    返回 (final_result_path_dict, all_results) 或 (None, all_results)
+    """
+    logging.warning(f"⏱ {exhausted}，按期望收益选择剩余可完成的方案。")
+    time_budget = precomputed_data['time_budget']
+    tried = set(all_results)
+    while True:
+        best_key = _best_fitting_result(all_results, target_size_mb)
+        choice = _choose_by_expected_value(all_results, target_size_mb, best_key, time_budget, tried)
+        if choice is None:
+            break
+        tried.add(choice)
+        try:
+            result = _execute_scheme(choice, temp_dir, precomputed_data, input_pdf_path.name)
+        except BudgetExhausted as e:
+            logging.info(f"{e}，跳过。")
+            continue
+        _record_scheme_result(choice, result, all_results)
+
+    best_key = _best_fitting_result(all_results, target_size_mb)
+    if best_key is None:
+        logging.error("时间预算已用尽，未找到满足目标的结果。")
+        return None, all_results
+    logging.warning(
+        f"时间预算已用尽，返回目前满足目标的最高质量结果 {_scheme_name(best_key, all_results)} "
+        f"({all_results[best_key]['size_mb']:.2f}MB)，标记为受时间预算限制。"
+    )
+    final_result_path = _copy_to_output(best_key, all_results, output_dir, input_pdf_path.name)
+    if final_result_path:
+        final_result_path['budget_limited'] = True
+    return final_result_path, all_results
+
+def _record_scheme_result(scheme_id, result, all_results):
+    """
+    将方案执行结果记入 all_results 并返回其大小（MB），重建失败时返回 None。
+    提前终止的方案记录为 {'path': None, 'size_mb': 已确定的大小下限, 'status': 'exceeded'}。
+    """
+    if isinstance(result, pipeline.SizeLimitExceeded):
+        logging.info(f"方案 {_scheme_name(scheme_id)} 已提前终止 (至少 {result.size_mb:.2f}MB)，记录为超出上限。")
+        all_results[scheme_id] = {'path': None, 'size_mb': result.size_mb, 'status': 'exceeded'}
+        return result.size_mb
+    if not result:
+        return None
+    size_mb = utils.get_file_size_mb(result)
+    all_results[scheme_id] = {'path': result, 'size_mb': size_mb}
+    return size_mb
+
+def _run_predicted_strategy_logic(input_pdf_path, output_dir, target_size_mb, temp_dir, precomputed_data, predictions):
+    """
+    由大小预测引导的压缩策略。
+    先完整重建预测能满足目标的最高质量方案进行验证：超出目标时依次向更激进的方案移动，
+    满足目标时在预测区间仍可能满足目标的前提下向更保守的方案回溯。
+    与常规策略相同，S7 大于 8MB 时直接失败，S7 介于目标与 8MB 之间时目标切换为 8MB。
+    返回 (final_result_path_dict, all_results) 或 (None, all_results)
+    """
+    all_results = {}
+    failed = set()
+
+    def build(scheme_id):
+        """完整重建并记录一个方案，返回其大小；重建失败时返回 None。"""
+        if scheme_id in all_results:
+            return all_results[scheme_id]['size_mb']
+        if scheme_id in failed:
+            return None
+        result_path = _execute_scheme(scheme_id, temp_dir, precomputed_data, input_pdf_path.name)
+        if not result_path:
+            failed.add(scheme_id)
+            return None
+        size_mb = utils.get_file_size_mb(result_path)
+        all_results[scheme_id] = {'path': result_path, 'size_mb': size_mb}
+        logging.info(f"方案 {COMPRESSION_SCHEMES[scheme_id]['name']} 实际大小 {size_mb:.2f}MB (预测 {predictions[scheme_id]['size_mb']:.2f}MB)")
+        return size_mb
+
+    try:
+        start_id = next(
+            (i for i in sorted(predictions) if predictions[i]['size_mb'] <= target_size_mb),
+            max(predictions)
+        )
+        logging.info(f"--- 预测引导: 首先验证方案 {COMPRESSION_SCHEMES[start_id]['name']} ---")
+
+        # 向更激进的方案移动，直到找到满足目标的方案
+        best_scheme_id = None
+        for i in range(start_id, max(COMPRESSION_SCHEMES) + 1):
+            size_mb = build(i)
+            if size_mb is not None and size_mb <= target_size_mb:
+                best_scheme_id = i
+                break
+
+        if best_scheme_id is None:
+            s7_result = all_results.get(7)
+            if not s7_result:
+                logging.error("所有压缩方案均失败。")
+                return None, all_results
+            if s7_result['size_mb'] > 8.0:
+                logging.error(f"❌ 最激进方案 S7 的结果 ({s7_result['size_mb']:.2f}MB) 仍大于 8MB 拆分阈值，即使拆分也无法满足 2MB 目标，任务失败。")
+                return None, all_results
+            logging.warning(f"⚠️ S7 结果 ({s7_result['size_mb']:.2f}MB) 超过原目标 ({target_size_mb:.2f}MB) 但小于 8MB。")
+            logging.info("🔄 策略调整：将目标切换为 8MB，寻找最接近 8MB 的方案用于后续拆分。")
+            target_size_mb = 8.0
+            best_scheme_id = 7
+
+        # 向更保守的方案回溯，跳过预测区间下限已超出目标的方案
+        for i in range(best_scheme_id - 1, 0, -1):
+            if i not in all_results and predictions[i]['low_mb'] > target_size_mb:
+                logging.info(f"方案 {COMPRESSION_SCHEMES[i]['name']} 的预测下限 ({predictions[i]['low_mb']:.2f}MB) 已超出目标，停止回溯。")
+                break
+            size_mb = build(i)
+            if size_mb is None:
+                continue
+            if size_mb > target_size_mb:
+                break
+            best_scheme_id = i
+
+        logging.info(
+            f"预测引导完成，方案 {COMPRESSION_SCHEMES[best_scheme_id]['name']} 是可满足目标的最高质量方案 "
+            f"(完整重建 {len(all_results) + len(failed)} 次)。"
+        )
+        return _copy_to_output(best_scheme_id, all_results, output_dir, input_pdf_path.name), all_results
+    except BudgetExhausted as e:
+        return _finish_within_budget(e, input_pdf_path, output_dir, target_size_mb, temp_dir, precomputed_data, all_results)
+    except Exception as e:
+        logging.critical(f"压缩策略逻辑执行期间发生意外错误: {e}", exc_info=True)
+        return None, all_results
+
+def _size_observations(all_results):
+    """把 all_results 中有实际输出的结果整理为大小模型的观测（提前终止的结果只有下限，不记录）。"""
+    observations = []
+    for key, result in all_results.items():
+        if not result.get('path'):
+            continue
+        if key in COMPRESSION_SCHEMES:
+            params, strip_text = _scheme_params(key), key == 7
+        elif 'params' in result:
+            params, strip_text = result['params'], False
+        else:
+            continue
+        observations.append({
+            'scheme': str(key),
+            'dpi': params['dpi'],
+            'bg_downsample': params['bg_downsample'],
+            'strip_text': strip_text,
+            'size_mb': result['size_mb'],
+        })
+    return observations
+
 def _copy_to_output(scheme_id, all_results, output_dir, original_filename):
     """将最终选定的PDF复制到输出目录。"""
     source_path = all_results[scheme_id]['path']
@@ -205,46 +932,194 @@ def _copy_to_output(scheme_id, all_results, output_dir, original_filename):
         logging.error(f"复制最终文件时出错: {e}")
         return None
 
-def _execute_scheme(scheme_id, temp_dir, precomputed_data, original_filename):
-    """
-    执行单个压缩方案。
-    现在接收 precomputed_data 字典。
-    """
+def _scheme_params(scheme_id):
+    """返回方案对应的 recode_pdf 重建参数。"""
     scheme = COMPRESSION_SCHEMES[scheme_id]
-    logging.info(f"--- 正在执行方案 {scheme['name']}: DPI={scheme['dpi']}, BG-Downsample={scheme['bg_downsample']}, Encoder={scheme['jpeg2000_encoder']} ---")
-    
-    output_pdf_path = temp_dir / f"output_{Path(original_filename).stem}_S{scheme_id}.pdf"
-    
-    params = {
+    return {
         'name': scheme['name'],
         'dpi': scheme['dpi'],
         'bg_downsample': scheme['bg_downsample'],
         'jpeg2000_encoder': scheme['jpeg2000_encoder']
     }
+
+def _get_dpi_stack(dpi, temp_dir, precomputed_data):
+    """
+    返回指定 DPI 的方案使用的图像栈 (image_files, hocr_file)。
+    未启用 DPI 图像金字塔或 DPI 与预处理 DPI 相同时直接使用预处理结果；
+    否则按需生成（并在启用工作区时持久化）该 DPI 的图像栈，失败时返回 None。
+    """
+    stacks = precomputed_data.get('dpi_stacks')
+    if stacks is None or dpi == precomputed_data['source_dpi']:
+        return precomputed_data['image_files'], precomputed_data['hocr_file']
+
+    with _dpi_stack_lock:
+        if dpi not in stacks:
+            stacks[dpi] = _load_or_build_dpi_stack(dpi, temp_dir, precomputed_data)
+        return stacks[dpi]
+
+def _load_or_build_dpi_stack(dpi, temp_dir, precomputed_data):
+    """从工作区恢复或重新生成指定 DPI 的图像栈。"""
+    step_name = f"dpi_stack_{dpi}"
+    run_workspace = precomputed_data.get('workspace')
+    if run_workspace is not None:
+        step = run_workspace.get_step(step_name)
+        if step:
+            image_files = [run_workspace.path / name for name in step['image_files']]
+            hocr_file = run_workspace.path / step['hocr_file']
+            if hocr_file.exists() and all(f.exists() for f in image_files):
+                logging.info(f"从工作区恢复 {dpi} DPI 图像栈。")
+                return image_files, hocr_file
+
+    stack = pipeline.build_dpi_stack(
+        precomputed_data['input_pdf'], precomputed_data['image_files'], precomputed_data['hocr_file'],
+        temp_dir, dpi, precomputed_data['source_dpi'], workers=precomputed_data.get('workers', 1)
+    )
+    if stack and run_workspace is not None:
+        run_workspace.complete_step(
+            step_name,
+            image_files=[str(f.relative_to(run_workspace.path)) for f in stack[0]],
+            hocr_file=str(stack[1].relative_to(run_workspace.path))
+        )
+    return stack
+
+_dpi_stack_lock = threading.Lock()
+
+def _execute_scheme(scheme_id, temp_dir, precomputed_data, original_filename, size_limit_mb=None):
+    """
+    执行单个压缩方案。
+    现在接收 precomputed_data 字典。
+    指定 size_limit_mb 时，重建确定超出该大小即被终止并抛出 pipeline.SizeLimitExceeded。
+    """
+    return _execute_params(
+        scheme_id, _scheme_params(scheme_id), _scheme_output_path(scheme_id, temp_dir, original_filename),
+        temp_dir, precomputed_data, size_limit_mb=size_limit_mb, strip_text=(scheme_id == 7)
+    )
+
+def _scheme_output_path(scheme_id, temp_dir, original_filename):
+    return temp_dir / f"output_{Path(original_filename).stem}_S{scheme_id}.pdf"
+
+def _same_dpi_schemes(scheme_id, finished):
+    """scheme_id 与尚未执行的同 DPI 方案（S7 使用去除文字标签的 hOCR，不参与共享），scheme_id 在首位。"""
+    if scheme_id == 7:
+        return [scheme_id]
+    dpi = COMPRESSION_SCHEMES[scheme_id]['dpi']
+    return [scheme_id] + [
+        i for i, scheme in COMPRESSION_SCHEMES.items()
+        if i not in (scheme_id, 7) and i not in finished and scheme['dpi'] == dpi
+    ]
+
+def _execute_scheme_group(scheme_ids, temp_dir, precomputed_data, original_filename):
+    """
+    以共享的 MRC 分层一次执行同一 DPI 的多个方案（--share-mrc-layers），返回 {scheme_id: 输出路径}。
+    工作区中已有输出的方案不参与；需要执行的方案少于两个、时间预算不足或共享重建不可用时返回空字典，
+    由调用方逐个方案执行（并在那里记录错误或预算耗尽）。
+    """
+    run_workspace = precomputed_data.get('workspace')
+    pending = [
+        scheme_id for scheme_id in scheme_ids
+        if run_workspace is None
+        or not run_workspace.get_scheme_result(scheme_id, _record_params(_scheme_params(scheme_id), precomputed_data))
+    ]
+    if len(pending) < 2:
+        return {}
+    params_list = [_scheme_params(scheme_id) for scheme_id in pending]
+    time_budget = precomputed_data.get('time_budget')
+    if time_budget is not None and not time_budget.affordable(params_list[0]):
+        return {}
+    started = time.monotonic()
+
+    dpi = params_list[0]['dpi']
+    stack = _get_dpi_stack(dpi, temp_dir, precomputed_data)
+    if stack is None:
+        return {}
+    outputs = {scheme_id: _scheme_output_path(scheme_id, temp_dir, original_filename) for scheme_id in pending}
+    if not pipeline.reconstruct_mrc_variants(
+        stack[0], stack[1], temp_dir, dpi,
+        [(params, outputs[scheme_id]) for scheme_id, params in zip(pending, params_list)],
+        timeout=time_budget.remaining() if time_budget is not None else None
+    ):
+        logging.warning("退回逐个方案使用 recode_pdf 重建。")
+        return {}
+
+    if time_budget is not None:
+        # 各变体分摊共享重建的耗时，避免把整组的耗时计为单个方案的成本
+        elapsed = (time.monotonic() - started) / len(pending)
+        for params in params_list:
+            time_budget.record(params, elapsed)
+    if run_workspace is not None:
+        for scheme_id, params in zip(pending, params_list):
+            run_workspace.record_scheme_result(scheme_id, _record_params(params, precomputed_data), outputs[scheme_id])
+    return outputs
+
+def _record_params(params, precomputed_data):
+    """工作区中记录方案结果使用的参数（使用降采样图像栈的输出额外以图像 DPI 区分）。"""
+    if precomputed_data.get('dpi_stacks') is not None and params['dpi'] != precomputed_data['source_dpi']:
+        return dict(params, image_dpi=params['dpi'])
+    return params
+
+def _execute_params(record_key, params, output_pdf_path, temp_dir, precomputed_data, size_limit_mb=None, strip_text=False):
+    """
+    按给定重建参数执行一次重建，返回输出路径，失败时返回 None。
+    record_key 为工作区中记录该结果的键；strip_text 为真时使用去除文字标签的 hOCR（S7）。
+    """
+    logging.info(f"--- 正在执行方案 {params['name']}: DPI={params['dpi']}, BG-Downsample={params['bg_downsample']}, Encoder={params['jpeg2000_encoder']} ---")
     
+    # 启用工作区时，复用此前运行中参数相同且已完成的方案输出
+    run_workspace = precomputed_data.get('workspace')
+    record_params = _record_params(params, precomputed_data)
+    if run_workspace is not None:
+        existing_output = run_workspace.get_scheme_result(record_key, record_params)
+        if existing_output:
+            logging.info(f"从工作区复用方案 {params['name']} 的已有输出: {existing_output.name}")
+            return existing_output
+
+    # 设置了时间预算时，预计无法在剩余时间内完成的方案不再执行
+    time_budget = precomputed_data.get('time_budget')
+    if time_budget is not None:
+        time_budget.check(params)
+    started = time.monotonic()
+
+    stack = _get_dpi_stack(params['dpi'], temp_dir, precomputed_data)
+    if stack is None:
+        logging.error(f"方案 {params['name']} 的 {params['dpi']} DPI 图像栈生成失败。")
+        return None
+    image_files, hocr_file = stack
+
     # S7 方案：应用 hOCR 极限优化（移除文字标签以换取更小体积）
-    hocr_file_to_use = precomputed_data['hocr_file']
-    if scheme_id == 7:
+    hocr_file_to_use = hocr_file
+    if strip_text:
         logging.info("🔥 S7 极限压缩：应用 hOCR 优化（将失去文本搜索功能但可减小约 7% 体积）")
         # 创建副本以避免影响其他方案
         import shutil
         s7_hocr_file = temp_dir / "output_s7_optimized.hocr"
-        shutil.copy2(precomputed_data['hocr_file'], s7_hocr_file)
+        shutil.copy2(hocr_file, s7_hocr_file)
         hocr_file_to_use = pipeline.optimize_hocr_for_extreme_compression(s7_hocr_file)
 
     try:
         success = pipeline.reconstruct_pdf(
-            image_files=precomputed_data['image_files'],
+            image_files=image_files,
             hocr_file=hocr_file_to_use,
             temp_dir=temp_dir,
             params=params,
-            output_pdf_path=output_pdf_path
+            output_pdf_path=output_pdf_path,
+            shards=precomputed_data.get('reconstruct_shards', 1),
+            size_limit_mb=size_limit_mb,
+            timeout=time_budget.remaining() if time_budget is not None else None
         )
+        if time_budget is not None:
+            if success:
+                time_budget.record(params, time.monotonic() - started)
+            elif time_budget.remaining() <= 0:
+                raise BudgetExhausted(f"方案 {params['name']} 因时间预算用尽被终止")
         if success:
+            if run_workspace is not None:
+                run_workspace.record_scheme_result(record_key, record_params, output_pdf_path)
             return output_pdf_path
         else:
-            logging.error(f"方案 {scheme['name']} 重建PDF失败。")
+            logging.error(f"方案 {params['name']} 重建PDF失败。")
             return None
+    except (pipeline.SizeLimitExceeded, BudgetExhausted):
+        raise
     except Exception as e:
-        logging.error(f"执行方案 {scheme['name']} 时发生意外错误: {e}", exc_info=True)
-        return None
\ No newline at end of file
+        logging.error(f"执行方案 {params['name']} 时发生意外错误: {e}", exc_info=True)
+        return None
@@ -2,14 +2,29 @@
 
 import logging
 import os
+import signal
 import subprocess
 import sys
 import tempfile
 import shutil
+import time
 from pathlib import Path
+from . import scheduler
 
 LOG_DIR = "logs"
 
+# 外部命令的默认超时（秒），None 表示不限制；由 --command-timeout 设置
+_command_timeout = None
+
+def set_command_timeout(seconds):
+    """设置所有外部命令的默认超时（秒），None 表示不限制。"""
+    global _command_timeout
+    _command_timeout = seconds
+
+def get_command_timeout():
+    """返回 set_command_timeout 设置的默认超时（秒），未设置时为 None。"""
+    return _command_timeout
+
 def setup_logging():
     """配置日志记录器，同时输出到控制台和文件。"""
     log_dir = Path(LOG_DIR)
@@ -47,17 +62,35 @@ def get_file_size_mb(file_path):
         logging.error(f"文件未找到: {file_path}")
         return 0
 
-def run_command(command, cwd=None):
+def run_command(command, cwd=None, extra_env=None, cancel_event=None, timeout=None):
     """
     执行一个外部命令行命令。
 
     Args:
         command (list): 命令及其参数的列表。
         cwd (str, optional): 命令执行的工作目录。
+        extra_env (dict, optional): 额外设置的环境变量（如 OMP_THREAD_LIMIT）。
+        cancel_event (threading.Event, optional): 被设置时终止正在运行的命令。
+        timeout (float, optional): 超时秒数，与 set_command_timeout 设置的默认超时取较小者。
+            超时或取消时终止命令及其派生的全部子进程。
+            启动前需向全局资源调度器申请 CPU 令牌与内存，排队等待的时间计入 timeout
+            （但不计入 set_command_timeout 设置的单条命令超时）。
 
     Returns:
-        bool: 命令是否成功执行。
+        bool: 命令是否成功执行（被取消或超时时返回 False）。
+    """
+    return _run_scheduled(command, cwd, extra_env, cancel_event, timeout)[0]
+
+def run_command_output(command, cwd=None, extra_env=None, cancel_event=None, timeout=None):
+    """
+    与 run_command 相同（资源调度、超时与取消），但返回命令的标准输出，
+    失败、被取消或超时时返回 None。用于 pdfinfo、qpdf --json 等需要解析输出的命令。
     """
+    success, stdout = _run_scheduled(command, cwd, extra_env, cancel_event, timeout, capture=True)
+    return stdout if success else None
+
+def _run_scheduled(command, cwd, extra_env, cancel_event, timeout, capture=False):
+    """申请调度资源后执行命令，返回 (是否成功, 标准输出)。"""
     command_str = ' '.join(command)
     logging.info(f"执行命令: {command_str}")
     
@@ -69,40 +102,132 @@ def run_command(command, cwd=None):
     if local_bin not in env.get("PATH", ""):
         env["PATH"] = f"{local_bin}:{env.get('PATH', '')}"
         logging.debug(f"添加 {local_bin} 到 PATH")
+
+    if extra_env:
+        env.update(extra_env)
+
+    # 向全局调度器申请资源，资源不足时排队
+    resources = scheduler.get_scheduler()
+    cpu, memory_mb = scheduler.command_cost(command, extra_env)
+    queued_at = time.monotonic()
+    allocation = resources.acquire(
+        cpu, memory_mb, cancel_event=cancel_event,
+        deadline=queued_at + timeout if timeout is not None else None
+    )
+    if allocation is None:
+        if cancel_event is not None and cancel_event.is_set():
+            logging.info(f"命令在等待资源时已取消: {command_str}")
+        else:
+            logging.error(f"等待资源超时 ({timeout:.0f}秒)，命令未执行: {command_str}")
+        return False, None
+    waited = time.monotonic() - queued_at
+    if waited >= 1:
+        logging.debug(f"命令等待资源 {waited:.1f}秒 (CPU {cpu}，内存 {memory_mb}MB)")
+    try:
+        if timeout is not None:
+            timeout = max(0.0, timeout - waited)
+        return _run_process(command, command_str, cwd, env, cancel_event, timeout, capture)
+    finally:
+        resources.release(allocation)
+
+def _run_process(command, command_str, cwd, env, cancel_event, timeout, capture=False):
+    """
+    在已获得调度资源的前提下启动并等待外部命令，返回 (是否成功, 标准输出)。
+    capture 为真时标准输出返回给调用方，不写入调试日志。
+    """
+    limits = [t for t in (timeout, _command_timeout) if t is not None]
+    deadline = time.monotonic() + min(limits) if limits else None
+
+    # 在独立的进程组（Windows 下为新的进程组）中启动，超时或取消时可终止整个进程树
+    if os.name == 'nt':
+        group_options = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        group_options = {'start_new_session': True}
     
     try:
-        result = subprocess.run(
+        process = subprocess.Popen(
             command,
-            check=True,
-            capture_output=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             text=True,
             encoding='utf-8',
             errors='ignore',
             cwd=cwd,
-            env=env  # 使用修改后的环境变量
+            env=env,  # 使用修改后的环境变量
+            **group_options
         )
-        if result.stdout:
-            logging.debug(f"命令输出:\n{result.stdout}")
-        if result.stderr:
-            # 区分正常信息和真正的错误
-            stderr_content = result.stderr.strip()
-            if any(keyword in stderr_content.lower() for keyword in ['detected', 'diacritics', 'processing']):
-                # Tesseract等工具的正常信息性输出
-                logging.debug(f"命令信息输出:\n{stderr_content}")
-            else:
-                # 可能的警告或错误
-                logging.warning(f"命令标准错误输出:\n{stderr_content}")
-        return True
-    except subprocess.CalledProcessError as e:
-        logging.error(f"命令执行失败: {command_str}")
-        logging.error(f"返回码: {e.returncode}")
-        logging.error(f"标准输出:\n{e.stdout}")
-        logging.error(f"标准错误:\n{e.stderr}")
-        return False
     except FileNotFoundError:
         logging.error(f"命令未找到: {command[0]}。请确保该工具已安装并在系统PATH中。")
         logging.error(f"提示: 如果使用pipx安装，请确保 ~/.local/bin 在PATH中")
-        return False
+        return False, None
+
+    stdout, stderr, interrupted = _wait_for_process(process, cancel_event, deadline)
+    if interrupted == 'cancelled':
+        logging.info(f"命令已取消: {command_str}")
+        return False, None
+    if interrupted == 'timeout':
+        logging.error(f"命令超时 ({min(limits):.0f}秒)，已终止其进程树: {command_str}")
+        return False, None
+
+    if process.returncode != 0:
+        logging.error(f"命令执行失败: {command_str}")
+        logging.error(f"返回码: {process.returncode}")
+        logging.error(f"标准输出:\n{stdout}")
+        logging.error(f"标准错误:\n{stderr}")
+        return False, None
+
+    if stdout and not capture:
+        logging.debug(f"命令输出:\n{stdout}")
+    if stderr:
+        # 区分正常信息和真正的错误
+        stderr_content = stderr.strip()
+        if any(keyword in stderr_content.lower() for keyword in ['detected', 'diacritics', 'processing']):
+            # Tesseract等工具的正常信息性输出
+            logging.debug(f"命令信息输出:\n{stderr_content}")
+        else:
+            # 可能的警告或错误
+            logging.warning(f"命令标准错误输出:\n{stderr_content}")
+    return True, stdout
+
+# 可取消命令检查取消标志的间隔（秒）
+_CANCEL_POLL_SECONDS = 0.5
+
+def _wait_for_process(process, cancel_event=None, deadline=None):
+    """
+    等待进程结束并返回 (stdout, stderr, None)。
+    cancel_event 被设置或到达 deadline（time.monotonic() 时刻）时终止进程树，
+    返回 (None, None, 'cancelled' 或 'timeout')。
+    """
+    while True:
+        poll = None if cancel_event is None else _CANCEL_POLL_SECONDS
+        if deadline is not None:
+            remaining = max(0.0, deadline - time.monotonic())
+            poll = remaining if poll is None else min(poll, remaining)
+        try:
+            stdout, stderr = process.communicate(timeout=poll)
+            return stdout, stderr, None
+        except subprocess.TimeoutExpired:
+            if cancel_event is not None and cancel_event.is_set():
+                reason = 'cancelled'
+            elif deadline is not None and time.monotonic() >= deadline:
+                reason = 'timeout'
+            else:
+                continue
+            _kill_process_tree(process)
+            process.communicate()
+            return None, None, reason
+
+def _kill_process_tree(process):
+    """终止进程及其派生的全部子进程。"""
+    try:
+        if os.name == 'nt':
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)], capture_output=True)
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (OSError, subprocess.SubprocessError) as e:
+        logging.debug(f"终止进程树失败，改为终止主进程: {e}")
+    if process.poll() is None:
+        process.kill()
 
 def create_temp_directory():
     """创建临时目录。"""
@@ -116,6 +241,13 @@ def cleanup_directory(directory_path):
     except Exception as e:
         logging.warning(f"清理临时目录失败: {directory_path}, 错误: {e}")
 
+def link_or_copy(src, dst):
+    """在 dst 创建指向 src 的符号链接；文件系统不支持符号链接时退回复制。"""
+    try:
+        os.symlink(Path(src).resolve(), dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
 def copy_file(src, dst):
     """复制文件到目标位置。"""
     try:
@@ -185,6 +317,38 @@ def check_dependencies():
     logging.info("所有必要工具已安装")
     return True
 
+def find_recode_pdf_python():
+    """
+    返回运行 recode_pdf 的 Python 解释器（即 pipx 为 archive-pdf-tools 创建的虚拟环境中的解释器），
+    找不到时返回 None。解释器取自 recode_pdf 入口脚本的 shebang；Windows 的 .exe 入口没有 shebang，
+    按入口所在目录中的 python.exe 查找。
+    """
+    local_bin = os.path.join(os.path.expanduser("~"), ".local", "bin")
+    search_path = os.environ.get("PATH", "")
+    if local_bin not in search_path:
+        search_path = f"{local_bin}{os.pathsep}{search_path}"
+    entry = shutil.which("recode_pdf", path=search_path)
+    if entry is None:
+        return None
+    entry = Path(entry).resolve()
+
+    candidates = []
+    try:
+        with open(entry, 'rb') as f:
+            first_line = f.readline(1024)
+        if first_line.startswith(b'#!'):
+            interpreter = first_line[2:].decode('utf-8', 'replace').split()
+            if interpreter and Path(interpreter[0]).name != 'env':
+                candidates.append(Path(interpreter[0]))
+    except OSError as e:
+        logging.debug(f"读取 recode_pdf 入口失败: {e}")
+    candidates += [entry.parent / 'python', entry.parent / 'python.exe']
+
+    for candidate in candidates:
+        if candidate.is_file():
+            return str(candidate)
+    return None
+
 def get_current_timestamp():
     """获取当前时间戳字符串。"""
     from datetime import datetime
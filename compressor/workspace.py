@@ -0,0 +1,206 @@
+# compressor/workspace.py
+
+"""
+持久化 DAR 工作区
+
+以输入文件的 SHA-256 为键，在固定目录中保存解构生成的页面图像、逐页与合并 hOCR
+以及已完成的方案输出，并用 manifest.json 记录各步骤的完成状态。
+同一文件再次运行（换目标大小重跑或崩溃后重跑）时从最后完成的步骤继续。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from . import utils
+
+DEFAULT_WORKSPACE_ROOT = Path.home() / ".cache" / "pdf_compressor" / "workspaces"
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# 工作区目录名使用的哈希前缀长度
+_KEY_LENGTH = 16
+
+
+def file_sha256(path):
+    """流式计算文件的 SHA-256。"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_json_atomic(path, data):
+    """
+    把 data 以 JSON 原子地写入 path：先写入同目录下唯一命名的临时文件，再用 os.replace 替换，
+    多个进程或线程同时写同一文件时互不覆盖对方的临时文件。
+    """
+    path = Path(path)
+    with tempfile.NamedTemporaryFile(
+        'w', encoding='utf-8', dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False
+    ) as f:
+        tmp_path = f.name
+        try:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        except BaseException:
+            f.close()
+            os.unlink(tmp_path)
+            raise
+    os.replace(tmp_path, path)
+
+
+class Workspace:
+    """单个输入文件的持久化工作区。manifest 的读写是线程安全的。"""
+
+    def __init__(self, path, manifest):
+        self.path = Path(path)
+        self.manifest = manifest
+        self._lock = threading.Lock()
+
+    @property
+    def key(self):
+        return self.path.name
+
+    def save(self):
+        """原子地写回 manifest（先写临时文件再替换）。"""
+        with self._lock:
+            self.manifest['updated'] = utils.get_current_timestamp()
+            write_json_atomic(self.path / MANIFEST_NAME, self.manifest)
+
+    def get_step(self, name):
+        """返回已完成步骤的记录，未完成时返回 None。"""
+        return self.manifest['steps'].get(name)
+
+    def complete_step(self, name, **info):
+        """记录一个步骤已完成。"""
+        info['completed'] = utils.get_current_timestamp()
+        with self._lock:
+            self.manifest['steps'][name] = info
+        self.save()
+
+    def get_scheme_result(self, scheme_id, params):
+        """
+        返回参数一致且输出文件仍存在的已完成方案输出路径，否则返回 None。
+        """
+        record = self.manifest['schemes'].get(str(scheme_id))
+        if not record or record.get('params') != params:
+            return None
+        output_path = self.path / record['path']
+        if not output_path.exists() or output_path.stat().st_size != record.get('size_bytes'):
+            return None
+        return output_path
+
+    def record_scheme_result(self, scheme_id, params, output_path):
+        """记录一个已成功重建的方案输出。"""
+        output_path = Path(output_path)
+        with self._lock:
+            self.manifest['schemes'][str(scheme_id)] = {
+                'path': output_path.name,
+                'params': params,
+                'size_bytes': output_path.stat().st_size,
+                'completed': utils.get_current_timestamp(),
+            }
+        self.save()
+
+
+def open_workspace(input_pdf_path, root=DEFAULT_WORKSPACE_ROOT):
+    """
+    打开（或创建）输入文件对应的工作区。
+    manifest 中记录的源文件哈希不一致或版本不兼容时重置该工作区。
+    """
+    source_hash = file_sha256(input_pdf_path)
+    path = Path(root) / source_hash[:_KEY_LENGTH]
+    manifest_path = path / MANIFEST_NAME
+    manifest = None
+    if manifest_path.exists():
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"工作区 manifest 损坏，将重建工作区 {path}: {e}")
+        if manifest and (manifest.get('version') != MANIFEST_VERSION or manifest.get('source_sha256') != source_hash):
+            logging.warning(f"工作区 {path} 与当前文件或版本不匹配，将重建。")
+            manifest = None
+        if manifest is None:
+            shutil.rmtree(path, ignore_errors=True)
+
+    if manifest is None:
+        path.mkdir(parents=True, exist_ok=True)
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'source_name': Path(input_pdf_path).name,
+            'source_sha256': source_hash,
+            'source_size_bytes': os.path.getsize(input_pdf_path),
+            'created': utils.get_current_timestamp(),
+            'steps': {},
+            'schemes': {},
+        }
+        workspace = Workspace(path, manifest)
+        workspace.save()
+        logging.info(f"创建工作区: {path}")
+    else:
+        workspace = Workspace(path, manifest)
+        logging.info(
+            f"复用工作区: {path} (已完成步骤: {', '.join(manifest['steps']) or '无'}；"
+            f"已完成方案: {', '.join('S' + k for k in sorted(manifest['schemes'])) or '无'})"
+        )
+    return workspace
+
+
+def _directory_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def list_workspaces(root=DEFAULT_WORKSPACE_ROOT):
+    """返回所有工作区的摘要信息列表，按最近更新时间倒序排列。"""
+    root = Path(root)
+    if not root.is_dir():
+        return []
+    workspaces = []
+    for path in root.iterdir():
+        manifest_path = path / MANIFEST_NAME
+        if not manifest_path.is_file():
+            continue
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        workspaces.append({
+            'key': path.name,
+            'path': path,
+            'source_name': manifest.get('source_name', '?'),
+            'updated': manifest.get('updated', '?'),
+            'steps': sorted(manifest.get('steps', {})),
+            'schemes': sorted(manifest.get('schemes', {})),
+            'size_mb': _directory_size(path) / (1024 * 1024),
+            'mtime': manifest_path.stat().st_mtime,
+        })
+    return sorted(workspaces, key=lambda w: w['mtime'], reverse=True)
+
+
+def purge_workspaces(root=DEFAULT_WORKSPACE_ROOT, key=None):
+    """
+    删除工作区。key 为 None 时删除全部，否则删除目录名以 key 开头的工作区。
+    返回删除的工作区数量。
+    """
+    removed = 0
+    for info in list_workspaces(root):
+        if key is None or info['key'].startswith(key):
+            utils.cleanup_directory(info['path'])
+            logging.info(f"已删除工作区: {info['key']} ({info['source_name']})")
+            removed += 1
+    return removed
@@ -88,15 +88,15 @@ LOG_FILE_BACKUP_COUNT = 3  # 保留的日志文件数量
 # 性能优化配置
 # =============================================================================
 
-# 并发处理设置（未来版本可能支持）
-MAX_PARALLEL_JOBS = 1  # 目前版本仅支持单线程
+# 并发处理设置（通过命令行参数生效：--jobs）
+MAX_PARALLEL_JOBS = 1  # 目录模式下同时处理的文件数，对应 --jobs
 
-# 内存使用限制
-MAX_MEMORY_USAGE_MB = 1024  # 最大内存使用量（MB）
+# 内存使用限制（通过命令行参数生效：--max-memory，由全局资源调度器按各工具的估计占用执行）
+MAX_MEMORY_USAGE_MB = 1024  # 最大内存使用量（MB），对应 --max-memory
 
-# 超时设置
-COMMAND_TIMEOUT = 300  # 单个命令最大执行时间（秒）
-TOTAL_PROCESS_TIMEOUT = 1800  # 单个文件最大处理时间（秒）
+# 超时设置（通过命令行参数生效：--command-timeout 与 --time-budget）
+COMMAND_TIMEOUT = 300  # 单个命令最大执行时间（秒），对应 --command-timeout
+TOTAL_PROCESS_TIMEOUT = 1800  # 单个文件最大处理时间（秒），对应 --time-budget
 
 # =============================================================================
 # 高级参数配置
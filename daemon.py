@@ -0,0 +1,310 @@
+# daemon.py
+
+"""
+收件目录守护进程
+
+常驻运行并定期扫描收件目录，把新出现（且已写入完成）的 PDF 放入 SQLite 持久化队列，
+由工作线程调用 orchestrator.process_file 处理后发布到发件目录。与 cron 定时批处理相比，
+解释器启动与依赖检查只发生一次，队列状态在崩溃后可以恢复。
+
+  python daemon.py --input ./inbox --output ./outbox --target-size 2 --jobs 2
+  python daemon.py --output ./outbox --status
+
+每个任务的输出先写入发件目录下的暂存目录，处理成功后记录待发布的文件名，再逐个原子地
+移动到发件目录（至多发布一次，见 compressor/job_queue.py）。处理完成的源文件移入收件目录下的
+processed/ 或 failed/ 子目录。所有压缩选项与 main.py 相同。
+"""
+
+import argparse
+import logging
+import shutil
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+from compressor import utils, scheduler, job_queue
+import main as cli
+import orchestrator
+
+QUEUE_DB_NAME = ".pdf_compressor_queue.sqlite3"
+STAGING_DIR_NAME = ".staging"
+PROCESSED_DIR_NAME = "processed"
+FAILED_DIR_NAME = "failed"
+
+
+def create_argument_parser():
+    """在 main.py 的参数之上增加守护进程选项。"""
+    parser = cli.create_argument_parser()
+    parser.description = "PDF压缩收件目录守护进程：--input 为收件目录，--output 为发件目录"
+    parser.epilog = None
+    group = parser.add_argument_group("守护进程")
+    group.add_argument(
+        "--queue-db",
+        metavar="FILE",
+        default=None,
+        help=f"任务队列数据库 (SQLite)。默认值为 <发件目录>/{QUEUE_DB_NAME}。"
+    )
+    group.add_argument(
+        "--poll-interval",
+        type=float,
+        default=10.0,
+        metavar="SECONDS",
+        help="扫描收件目录的间隔（秒，默认10）。"
+    )
+    group.add_argument(
+        "--settle-seconds",
+        type=float,
+        default=5.0,
+        metavar="SECONDS",
+        help="文件修改时间距今超过该秒数才入队，避免处理仍在写入的文件（默认5）。"
+    )
+    group.add_argument(
+        "--once",
+        action="store_true",
+        help="扫描一次收件目录，处理完队列中的任务后退出。"
+    )
+    group.add_argument(
+        "--status",
+        action="store_true",
+        help="显示队列深度与最近一小时的吞吐量后退出。"
+    )
+    return parser
+
+
+def _unique_path(directory, name):
+    """返回目录中不与现有文件重名的路径（重名时追加 _1、_2 ...）。"""
+    path = Path(directory) / name
+    counter = 1
+    while path.exists():
+        path = Path(directory) / f"{Path(name).stem}_{counter}{Path(name).suffix}"
+        counter += 1
+    return path
+
+
+class WatchFolderDaemon:
+    """扫描收件目录、执行队列任务并发布结果。"""
+
+    def __init__(self, args, queue):
+        self.args = args
+        self.queue = queue
+        self.inbox = Path(args.input)
+        self.outbox = Path(args.output_dir)
+        self.staging_root = self.outbox / STAGING_DIR_NAME
+        self.stop_event = threading.Event()
+
+    def _staging_dir(self, job_id):
+        return self.staging_root / f"job_{job_id:06d}"
+
+    def scan(self, now=None):
+        """把收件目录中已写入完成的新 PDF 入队，返回新入队的数量。"""
+        now = time.time() if now is None else now
+        added = 0
+        for path in self._inbox_pdfs():
+            try:
+                stat = path.stat()
+            except OSError:
+                # 列出目录后文件已被移走或删除
+                continue
+            if now - stat.st_mtime < self.args.settle_seconds:
+                continue
+            if self.queue.enqueue(path.resolve(), stat.st_size, stat.st_mtime_ns):
+                logging.info(f"新任务入队: {path.name}")
+                added += 1
+        return added
+
+    def recover(self):
+        """处理上次运行遗留的任务：中断的任务重新排队，发布到一半的任务完成发布。"""
+        requeued, failed = self.queue.requeue_interrupted()
+        for job in requeued + failed:
+            shutil.rmtree(self._staging_dir(job['id']), ignore_errors=True)
+        if requeued:
+            logging.warning(f"{len(requeued)} 个中断的任务已重新排队")
+        for job in failed:
+            logging.error(f"任务 {Path(job['source']).name} 多次中断，已标记为失败")
+            self._retire_source(job, FAILED_DIR_NAME)
+        for job in self.queue.jobs_in_state('publishing'):
+            logging.warning(f"继续发布中断的任务: {Path(job['source']).name}")
+            self._publish(job['id'], (job['outputs'] or '').split('\n'))
+            self._retire_source(job, PROCESSED_DIR_NAME)
+            self.queue.mark_done(job['id'], "崩溃后完成发布")
+        # 已结束但源文件仍留在收件目录的任务（归档源文件前崩溃）：补做归档
+        for path in self._inbox_pdfs():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            job = self.queue.find_job(path.resolve(), stat.st_size, stat.st_mtime_ns)
+            if job is not None and job['state'] in ('done', 'failed'):
+                logging.warning(f"归档已结束任务遗留的源文件: {path.name}")
+                self._retire_source(job, PROCESSED_DIR_NAME if job['state'] == 'done' else FAILED_DIR_NAME)
+
+    def _inbox_pdfs(self):
+        return [p for p in sorted(self.inbox.iterdir()) if p.is_file() and p.suffix.lower() == '.pdf']
+
+    def process(self, job):
+        """执行一个已认领的任务。"""
+        source = Path(job['source'])
+        staging = self._staging_dir(job['id'])
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+
+        try:
+            stat = source.stat()
+        except OSError:
+            stat = None
+        if stat is None or (stat.st_size, stat.st_mtime_ns) != (job['size'], job['mtime_ns']):
+            # 文件变化后会以新的键重新入队
+            self.queue.mark_failed(job['id'], "源文件已变化或被移除")
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+
+        job_args = argparse.Namespace(**vars(self.args))
+        job_args.input = str(source)
+        job_args.output_dir = str(staging)
+        job_args.incremental = False
+        success = orchestrator.process_file(source, job_args)
+        # 先归档源文件再提交结束状态：两步之间崩溃时，任务仍会在重启时被恢复流程处理
+        if not success:
+            shutil.rmtree(staging, ignore_errors=True)
+            self._retire_source(job, FAILED_DIR_NAME)
+            self.queue.mark_failed(job['id'], "处理失败")
+            return
+
+        outputs = sorted(p.name for p in staging.iterdir() if p.is_file())
+        self.queue.mark_publishing(job['id'], outputs)
+        self._publish(job['id'], outputs)
+        self._retire_source(job, PROCESSED_DIR_NAME)
+        self.queue.mark_done(job['id'])
+        logging.info(f"✓ 任务完成: {source.name} -> {', '.join(outputs) or '无输出文件'}")
+
+    def _publish(self, job_id, outputs):
+        """把暂存目录中尚未发布的输出逐个移动到发件目录，然后删除暂存目录。"""
+        staging = self._staging_dir(job_id)
+        for name in outputs:
+            staged = staging / name
+            if name and staged.exists():
+                staged.replace(_unique_path(self.outbox, name))
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def _retire_source(self, job, subdir):
+        """把源文件移入收件目录的 processed/ 或 failed/ 子目录（文件已不存在时忽略）。"""
+        source = Path(job['source'])
+        if not source.exists():
+            return
+        target_dir = self.inbox / subdir
+        target_dir.mkdir(exist_ok=True)
+        try:
+            source.replace(_unique_path(target_dir, source.name))
+        except OSError as e:
+            logging.warning(f"移动源文件 {source.name} 失败: {e}")
+
+    def _worker(self, drain):
+        while not self.stop_event.is_set():
+            job = self.queue.claim()
+            if job is None:
+                if drain:
+                    break
+                self.stop_event.wait(self.args.poll_interval)
+                continue
+            logging.info(f"开始任务 #{job['id']}: {Path(job['source']).name} (第 {job['attempts']} 次)")
+            try:
+                self.process(job)
+            except Exception as e:
+                logging.critical(f"任务 #{job['id']} 发生意外错误: {e}", exc_info=True)
+                self.queue.mark_failed(job['id'], f"意外错误: {e}")
+        self.queue.close()
+
+    def run(self, once=False):
+        """
+        获取队列的守护进程锁、恢复遗留任务后持续扫描与处理；once 为真时处理完当前队列即返回。
+        同一队列已有守护进程在运行时返回 False。
+        """
+        if not self.queue.acquire_daemon_lock():
+            logging.error(f"队列 {self.queue.db_path} 已被另一个守护进程使用，退出。")
+            return False
+        try:
+            self._run(once)
+        finally:
+            self.queue.release_daemon_lock()
+        return True
+
+    def _run(self, once):
+        self.staging_root.mkdir(parents=True, exist_ok=True)
+        self.recover()
+        self.scan()
+        workers = [
+            threading.Thread(target=self._worker, args=(once,), name=f"daemon-worker-{i}")
+            for i in range(max(1, getattr(self.args, 'jobs', 1) or 1))
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            # 常驻模式下直到收到停止信号（SIGTERM）才退出扫描循环
+            while not once and not self.stop_event.wait(self.args.poll_interval):
+                self.scan()
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            logging.warning("收到中断信号，等待正在处理的任务结束...")
+        finally:
+            # 扫描循环因任何异常退出时也先停止并等待工作线程，run() 才能释放守护进程锁
+            self.stop_event.set()
+            for worker in workers:
+                worker.join()
+
+
+def print_status(queue):
+    """输出队列深度与吞吐量。"""
+    status = queue.status()
+    counts = status['counts']
+    print(f"队列: 等待 {counts['queued']}  处理中 {counts['running']}  发布中 {counts['publishing']}  "
+          f"已完成 {counts['done']}  失败 {counts['failed']}")
+    hours = status['window_seconds'] / 3600
+    line = f"最近 {hours:.0f} 小时: 完成 {status['recent_done']} 个任务，共 {status['recent_mb']:.1f}MB"
+    if status['mean_seconds'] is not None:
+        line += f"，平均每个任务 {status['mean_seconds']:.0f} 秒"
+    print(line)
+
+
+def main():
+    parser = create_argument_parser()
+    args = parser.parse_args()
+    utils.setup_logging()
+
+    if not args.output_dir:
+        logging.error("错误: 必须指定 --output 参数（发件目录）")
+        sys.exit(1)
+    queue = job_queue.JobQueue(args.queue_db or Path(args.output_dir) / QUEUE_DB_NAME)
+
+    if args.status:
+        print_status(queue)
+        return
+
+    if not args.input or not Path(args.input).is_dir():
+        logging.error("错误: --input 必须是一个已存在的收件目录")
+        sys.exit(1)
+    if args.poll_interval <= 0 or args.settle_seconds < 0:
+        logging.error("错误: --poll-interval 必须大于0，--settle-seconds 不能为负数")
+        sys.exit(1)
+    if not orchestrator.validate_arguments(args):
+        logging.error("参数验证失败")
+        sys.exit(1)
+
+    # 外部命令超时、全局资源预算与依赖检查只在启动时设置一次
+    utils.set_command_timeout(args.command_timeout)
+    scheduler.configure(args.max_cpus, args.max_memory)
+    if not utils.check_dependencies():
+        logging.error("依赖检查失败，程序退出")
+        sys.exit(1)
+
+    daemon = WatchFolderDaemon(args, queue)
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop_event.set())
+    logging.info(f"守护进程启动: 收件目录 {daemon.inbox}，发件目录 {daemon.outbox}，工作线程 {args.jobs}")
+    if not daemon.run(once=args.once):
+        sys.exit(1)
+    logging.info("守护进程已退出")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,7 @@ import argparse
 import logging
 import sys
 from pathlib import Path
-from compressor import utils
+from compressor import utils, workspace, size_model, scheduler
 import orchestrator
 
 # 在程序开始时立即设置 UTF-8 编码，避免 Windows 下的编码问题
@@ -93,6 +93,228 @@ def create_argument_parser():
         help="显示详细的调试信息。"
     )
 
+    parser.add_argument(
+        "--page-workers",
+        type=int,
+        default=1,
+        metavar="N",
+        help="页面级并行工作数（分片光栅化、并行 OCR 等）。默认值为1（串行处理），可设为CPU核心数。"
+    )
+
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="目录模式下同时处理的文件数（默认1，逐个处理）。每个文件内部仍按 --page-workers 并行。"
+    )
+
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="目录模式下只处理新增或变化的PDF：输出目录中的清单记录每个源文件的大小、修改时间与哈希、\n"
+             "目标设置及处理结果，未变化且输出仍存在的文件直接跳过。"
+    )
+
+    parser.add_argument(
+        "--max-cpus",
+        type=int,
+        default=None,
+        metavar="N",
+        help="所有文件与阶段共享的 CPU 令牌数，外部命令按工具估计的占用排队启动。默认值为CPU核心数。"
+    )
+
+    parser.add_argument(
+        "--max-memory",
+        type=int,
+        default=None,
+        metavar="MB",
+        help="同时运行的外部命令的预估内存总量上限 (MB)，对应配置项 MAX_MEMORY_USAGE_MB。默认不限制。"
+    )
+
+    parser.add_argument(
+        "--scheme-concurrency",
+        type=int,
+        default=1,
+        metavar="N",
+        help="同时执行的压缩方案数上限（默认1，串行）。大于1时按串行策略的访问顺序预先并发执行后续方案，\n"
+             "最终选择的方案与串行执行相同。"
+    )
+
+    parser.add_argument(
+        "--size-prediction",
+        action="store_true",
+        help="启用抽样大小预测：先在每个方案下只重建少量分层抽样页面并外推整份文档大小，\n"
+             "再只完整重建预测最合适的方案（通常一到两次）。"
+    )
+
+    parser.add_argument(
+        "--prediction-samples",
+        type=int,
+        default=8,
+        metavar="N",
+        help="大小预测时抽样的页面数（默认8）。"
+    )
+
+    parser.add_argument(
+        "--dpi-pyramid",
+        action="store_true",
+        help="启用 DPI 图像金字塔：低 DPI 方案使用按其 DPI 重新光栅化的图像栈（hOCR 坐标同步缩放）。\n"
+             "默认所有方案都使用预处理生成的 300 DPI 图像。"
+    )
+
+    parser.add_argument(
+        "--reconstruct-shards",
+        type=int,
+        default=1,
+        metavar="N",
+        help="重建阶段按页码区间切分的分片数（默认1）。大于1时每个分片由独立的 recode_pdf 进程并行重建，\n"
+             "再用 qpdf 合并，适合页数较多的大文件。"
+    )
+
+    parser.add_argument(
+        "--early-abort",
+        action="store_true",
+        help="提前终止很可能超出目标的重建：按分片重建并累计已完成分片的大小（扣除测得的合并节省量），\n"
+             "超出上限后终止其余分片，该方案记录为超出上限。--reconstruct-shards 为1时按4个分片重建，\n"
+             "未超限时直接合并这些分片作为输出。"
+    )
+
+    parser.add_argument(
+        "--share-mrc-layers",
+        action="store_true",
+        help="同一 DPI 的方案（S1 与 S2）共享 MRC 分层：每页只做一次文字/前景分割与掩码编码，\n"
+             "各方案只重新编码背景。需要以 recode_pdf 所在的 Python 环境运行辅助脚本，不可用时退回逐个重建。\n"
+             "只用于阶梯搜索，不能与 --early-abort 或 --reconstruct-shards 同时使用。"
+    )
+
+    parser.add_argument(
+        "--search-mode",
+        choices=["ladder", "continuous"],
+        default="ladder",
+        help="方案搜索方式: ladder 按固定的 S1-S7 七级方案逐级尝试（默认），\n"
+             "continuous 在 S1 与 S7 之间对 DPI 与背景降采样做连续插值搜索，找到恰好满足目标的最高质量参数。"
+    )
+
+    parser.add_argument(
+        "--search-budget",
+        type=int,
+        default=6,
+        metavar="N",
+        help="continuous 搜索模式下最多执行的完整重建次数（含 S1 与 S7，默认6）。"
+    )
+
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="单个文件的处理时间预算（秒，含预处理）。预算不足以执行下一个方案时，\n"
+             "按期望收益选择剩余时间内可完成的方案，并返回已找到的满足目标的最高质量结果（标记为受预算限制）。\n"
+             "预处理中的光栅化与 OCR 命令以剩余预算为超时，预算在预处理阶段耗尽时该文件处理失败。"
+    )
+
+    parser.add_argument(
+        "--command-timeout",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="单个外部命令（pdftoppm、tesseract、recode_pdf、qpdf）的最长执行时间（秒），超时后终止其整个进程树。"
+    )
+
+    parser.add_argument(
+        "--per-page-schemes",
+        action="store_true",
+        help="逐页方案：按文字覆盖率与图像大小对页面分类，为每页分配各自的压缩方案，\n"
+             "在预测总大小满足目标的前提下使质量尽量高；按方案分组重建后用 qpdf 按页码顺序合并。\n"
+             "无法满足目标时退回整份文件的方案选择。总是使用 DPI 图像金字塔（同 --dpi-pyramid），\n"
+             "使不同方案的页面合并后尺寸一致。"
+    )
+
+    parser.add_argument(
+        "--size-model",
+        action="store_true",
+        help="启用基于历史运行的大小模型：每次运行后记录各方案实测大小与文档特征，\n"
+             "历史足够时在重建前预测各方案大小，直接从预测的最优方案开始验证。"
+    )
+
+    parser.add_argument(
+        "--size-history",
+        metavar="FILE",
+        default=None,
+        help="大小模型的历史文件 (JSONL)。默认值为 ~/.cache/pdf_compressor/size_history.jsonl。"
+    )
+
+    parser.add_argument(
+        "--size-model-report",
+        action="store_true",
+        help="按时间顺序回放大小模型历史，输出模型在新文档上的预测误差并退出。"
+    )
+
+    parser.add_argument(
+        "--pipeline-mode",
+        choices=["streaming", "staged"],
+        default="staged",
+        help="预处理模式: staged 先全部光栅化再统一 OCR（默认），streaming 边光栅化边 OCR（可选）。"
+    )
+
+    parser.add_argument(
+        "--ocr-backend",
+        choices=["page", "batch", "inprocess"],
+        default="page",
+        help="OCR 后端: page 每页调用一次 tesseract（默认），batch 每个工作线程通过图像列表批量调用一次 tesseract，\n"
+             "inprocess 使用常驻进程内 tesseract 引擎（需 pip install tesserocr，未安装时退回 page）。"
+    )
+
+    parser.add_argument(
+        "--ocr-cache",
+        action="store_true",
+        help="启用跨运行的 OCR 结果缓存（按页面图像哈希、语言与引擎版本索引）。"
+    )
+
+    parser.add_argument(
+        "--ocr-cache-dir",
+        metavar="DIR",
+        default=None,
+        help="OCR 缓存目录。默认值为 ~/.cache/pdf_compressor/ocr。"
+    )
+
+    parser.add_argument(
+        "--ocr-cache-max-mb",
+        type=float,
+        default=1024,
+        metavar="MB",
+        help="OCR 缓存容量上限（MB），超出时淘汰最久未使用的条目。默认值为 1024。"
+    )
+
+    parser.add_argument(
+        "--workspace",
+        action="store_true",
+        help="使用以文件哈希为键的持久化工作区保存图像、hOCR 与方案输出，\n"
+             "再次处理同一文件（换目标大小或崩溃后重跑）时从最后完成的步骤继续。"
+    )
+
+    parser.add_argument(
+        "--workspace-dir",
+        metavar="DIR",
+        default=None,
+        help="工作区根目录。默认值为 ~/.cache/pdf_compressor/workspaces。"
+    )
+
+    parser.add_argument(
+        "--list-workspaces",
+        action="store_true",
+        help="列出所有持久化工作区并退出。"
+    )
+
+    parser.add_argument(
+        "--purge-workspaces",
+        nargs="?",
+        const="all",
+        metavar="KEY",
+        help="删除持久化工作区并退出。可指定工作区键（前缀）；省略时删除全部。"
+    )
+
     parser.add_argument(
         "-k", "--keep-temp-on-failure",
         action="store_true",
@@ -152,6 +374,21 @@ def main():
             "",
             "# 进入全手动模式，手动输入 DPI、bg-downsample、JPEG2000 编码器等参数",
             "python main.py --manual",
+            "",
+            "# 使用持久化工作区，换目标大小重跑时复用图像、hOCR 与已完成的方案",
+            "python main.py --input large.pdf --output out --target-size 2 --workspace",
+            "python main.py --list-workspaces",
+            "python main.py --purge-workspaces",
+            "",
+            "# 使用历史运行学习的大小模型，并查看模型准确度",
+            "python main.py --input ./pdfs --output ./out --target-size 2 --size-model",
+            "python main.py --size-model-report",
+            "",
+            "# 同时处理目录中的 4 个文件，每个文件使用 2 个页面级工作线程",
+            "python main.py --input ./pdfs --output ./out --target-size 2 --jobs 4 --page-workers 2",
+            "",
+            "# 夜间增量运行：只处理上次运行后新增或变化的PDF",
+            "python main.py --input ./archive --output ./out --target-size 2 --incremental",
         ]
         print("示例用法:")
         for line in examples:
@@ -178,6 +415,38 @@ def main():
             print("✗ 缺少必要工具，请安装后重试")
             sys.exit(1)
     
+    # 工作区管理
+    workspace_root = args.workspace_dir or workspace.DEFAULT_WORKSPACE_ROOT
+    if args.list_workspaces:
+        entries = workspace.list_workspaces(workspace_root)
+        if not entries:
+            print(f"没有工作区: {workspace_root}")
+        for entry in entries:
+            schemes = ', '.join(f"S{sid}" for sid in entry['schemes']) or '-'
+            print(f"{entry['key']}  {entry['size_mb']:8.1f}MB  {entry['updated']}  "
+                  f"步骤: {', '.join(entry['steps']) or '-'}  方案: {schemes}  {entry['source_name']}")
+        return
+
+    if args.purge_workspaces:
+        key = None if args.purge_workspaces == 'all' else args.purge_workspaces
+        removed = workspace.purge_workspaces(workspace_root, key)
+        print(f"已删除 {removed} 个工作区。")
+        return
+
+    # 大小模型准确度报告
+    if args.size_model_report:
+        history_path = args.size_history or size_model.DEFAULT_HISTORY_PATH
+        records = size_model.load_history(history_path)
+        print(f"大小模型历史: {history_path} ({len(records)} 个文档)")
+        report = size_model.accuracy_report(records)
+        if not report:
+            print(f"历史文档不足 {size_model.MIN_TRAINING_DOCUMENTS + 1} 个，无法评估模型准确度。")
+        for block in report:
+            if block['observations']:
+                print(f"文档 {block['first']:>4}-{block['last']:<4}  观测 {block['observations']:>4}  "
+                      f"平均误差 {block['mape'] * 100:5.1f}%  95% 区间覆盖率 {block['coverage'] * 100:5.1f}%")
+        return
+
     # 交互式全手动模式（独立模块） - 放在必需参数检查之前以便单独运行
     if getattr(args, 'manual', False):
         # 延迟导入，避免影响正常流程
@@ -206,6 +475,10 @@ def main():
         logging.error("参数验证失败")
         sys.exit(1)
     
+    # 外部命令超时与全局资源预算对所有文件生效
+    utils.set_command_timeout(args.command_timeout)
+    scheduler.configure(args.max_cpus, args.max_memory)
+
     # 检查依赖工具
     logging.info("检查必要工具...")
     if not utils.check_dependencies():
@@ -1,14 +1,36 @@
 # orchestrator.py
 
+import argparse
+import functools
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from compressor import utils, strategy, splitter
+from compressor import utils, strategy, splitter, batch_planner, batch_manifest
+
+_FAILED = {'success': False, 'scheme': None, 'outputs': []}
+
+def _job_args(args, file_path):
+    """
+    为单个文件生成独立的参数副本（input 指向该文件），
+    并行处理多个文件时各任务互不修改共享的 args。
+    """
+    job_args = argparse.Namespace(**vars(args))
+    job_args.input = str(file_path)
+    return job_args
 
 def process_file(file_path, args):
     """
     处理单个PDF文件的总入口，采用新的压缩和拆分策略。
     """
+    return _run_file(file_path, args)['success']
+
+def _run_file(file_path, args):
+    """
+    处理单个PDF文件，返回 {'success', 'scheme', 'outputs'}，
+    outputs 为写入输出目录的文件列表（供增量清单记录）。
+    """
     logging.info(f"================== 开始处理文件: {file_path.name} ==================")
+    args = _job_args(args, file_path)
     
     try:
         # 运行新的压缩策略
@@ -16,50 +38,56 @@ def process_file(file_path, args):
             file_path,
             Path(args.output_dir),
             args.target_size,
-            keep_temp_on_failure=getattr(args, 'keep_temp_on_failure', False)
+            keep_temp_on_failure=getattr(args, 'keep_temp_on_failure', False),
+            args=args
         )
 
         if compression_status == 'SUCCESS':
             best_scheme_id = compression_details['best_scheme_id']
-            scheme_name = strategy.COMPRESSION_SCHEMES[best_scheme_id]['name']
+            scheme_name = compression_details.get('scheme_name') or strategy.COMPRESSION_SCHEMES[best_scheme_id]['name']
             logging.info(f"✓ 压缩成功: {file_path.name} 使用方案 {scheme_name}。")
-            return True
+            if compression_details.get('budget_limited'):
+                logging.warning(f"⏱ {file_path.name} 的结果受时间预算限制，可能不是满足目标的最高质量方案。")
+            final_path = compression_details.get('final_path')
+            return {'success': True, 'scheme': scheme_name, 'outputs': [final_path] if final_path else []}
         
         elif compression_status == 'SKIPPED':
             logging.info(f"✓ 文件 {file_path.name} 已满足要求，跳过处理。")
+            outputs = []
             if args.copy_small_files:
                 output_path = Path(args.output_dir) / file_path.name
                 utils.copy_file(file_path, output_path)
                 logging.info(f"原文件已复制到输出目录: {output_path}")
-            return True
+                outputs.append(output_path)
+            return {'success': True, 'scheme': None, 'outputs': outputs}
 
         elif compression_status == 'FAILURE':
             logging.warning(f"压缩失败: {file_path.name}。")
             if args.allow_splitting:
                 logging.info("启动拆分协议...")
-                all_results = compression_details.get('all_results', {})
                 split_success = splitter.run_splitting_strategy(
-                    all_results, 
+                    compression_details, 
                     Path(args.output_dir), 
                     args
                 )
                 if split_success:
                     logging.info(f"✓ 拆分压缩成功: {file_path.name}")
-                    return True
+                    parts = sorted(Path(args.output_dir).glob(f"{file_path.stem}_part*.pdf"))
+                    return {'success': True, 'scheme': 'split', 'outputs': parts}
                 else:
                     logging.error(f"✗ 拆分压缩也失败: {file_path.name}")
-                    return False
+                    return _FAILED
             else:
                 logging.warning("未启用拆分功能，文件处理失败。")
-                return False
+                return _FAILED
         
         elif compression_status == 'ERROR':
             logging.error(f"✗ 处理文件 {file_path.name} 时发生严重错误。")
-            return False
+            return _FAILED
 
     except Exception as e:
         logging.critical(f"处理文件 {file_path.name} 时发生意外的顶层错误: {e}", exc_info=True)
-        return False
+        return _FAILED
     finally:
         logging.info(f"================== 文件处理结束: {file_path.name} ==================\n")
 
@@ -81,27 +109,48 @@ def process_directory(input_dir, args):
     if not unique_files:
         logging.warning("在指定目录中未找到PDF文件。")
         return []
+
+    # 增量模式：跳过源文件与设置均未变化且上次处理成功的文件
+    outcomes = {}
+    manifest = None
+    pending = unique_files
+    if getattr(args, 'incremental', False):
+        manifest = batch_manifest.BatchManifest.load(args.output_dir)
+        pending = []
+        for pdf_file in unique_files:
+            if manifest.is_up_to_date(pdf_file, args):
+                outcomes[pdf_file] = True
+            else:
+                pending.append(pdf_file)
+        manifest.save()
+        logging.info(f"增量模式: {len(outcomes)} 个文件未变化已跳过，{len(pending)} 个文件需要处理")
     
-    logging.info(f"找到 {len(unique_files)} 个PDF文件，准备处理...")
-    
-    results = []
-    successful_count = 0
-    failed_count = 0
-    
-    for i, pdf_file in enumerate(unique_files, 1):
-        logging.info(f"\n>>> 处理进度: {i}/{len(unique_files)} <<<")
-        # 更新args中的input，以便splitter可以正确获取原始文件名
-        args.input = str(pdf_file)
-        success = process_file(pdf_file, args)
-        results.append({
-            'file': pdf_file,
-            'success': success
-        })
-        
-        if success:
-            successful_count += 1
-        else:
-            failed_count += 1
+    jobs = max(1, min(getattr(args, 'jobs', 1) or 1, len(pending)))
+    logging.info(f"找到 {len(unique_files)} 个PDF文件，准备处理（并行文件数: {jobs}）...")
+
+    # 估计各文件的处理成本；并行时按成本从大到小调度，避免大文件排在最后拖长整批耗时
+    estimates = [batch_planner.estimate_file_cost(pdf_file, args.target_size) for pdf_file in pending]
+    to_compress = [e for e in estimates if e['needs_compression']]
+    logging.info(
+        f"需要压缩的文件 {len(to_compress)} 个，共约 {sum(e['pages'] for e in to_compress)} 页；"
+        f"其余 {len(estimates) - len(to_compress)} 个已满足目标大小"
+    )
+    if jobs > 1:
+        estimates = batch_planner.order_by_cost(estimates)
+    progress = batch_planner.BatchProgress(estimates)
+    
+    if jobs == 1:
+        for i, estimate in enumerate(estimates, 1):
+            logging.info(f"\n>>> 处理进度: {i}/{len(estimates)} <<<")
+            outcomes[estimate['file']] = _process_and_record(estimate['file'], args, manifest, progress, estimate)
+            progress.complete(estimate, outcomes[estimate['file']])
+    else:
+        outcomes.update(_process_files_parallel(estimates, args, jobs, progress, manifest))
+
+    # 结果按文件顺序汇总，计数只在主线程中进行
+    results = [{'file': pdf_file, 'success': outcomes[pdf_file]} for pdf_file in unique_files]
+    successful_count = sum(1 for r in results if r['success'])
+    failed_count = len(results) - successful_count
     
     # 生成处理报告
     logging.info(f"\n" + "="*60)
@@ -122,6 +171,42 @@ def process_directory(input_dir, args):
     
     return results
 
+def _process_and_record(pdf_file, args, manifest=None, progress=None, estimate=None):
+    """
+    处理单个文件，启用增量模式时把结果写入清单，返回是否成功。
+    提供 progress 时，文件内每完成一批页面的 OCR 即向批量进度报告。
+    """
+    if progress is not None:
+        args = _job_args(args, pdf_file)
+        args.page_progress = functools.partial(progress.pages_done, estimate)
+    outcome = _run_file(pdf_file, args)
+    if manifest is not None:
+        try:
+            manifest.record(pdf_file, args, outcome)
+        except OSError as e:
+            logging.warning(f"记录 {pdf_file.name} 的增量清单条目失败: {e}")
+    return outcome['success']
+
+def _process_files_parallel(estimates, args, jobs, progress, manifest=None):
+    """
+    用 jobs 个工作线程按 estimates 的顺序并行处理文件，返回 {文件: 是否成功}。
+    线程池按提交顺序取任务，因此 estimates 按成本降序排列时即为最长任务优先。
+    """
+    outcomes = {}
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="pdf-job") as executor:
+        futures = {executor.submit(_process_and_record, e['file'], args, manifest, progress, e): e for e in estimates}
+        for future in as_completed(futures):
+            estimate = futures[future]
+            pdf_file = estimate['file']
+            try:
+                outcomes[pdf_file] = future.result()
+            except Exception as e:
+                # process_file 自身会捕获异常，这里只是防御
+                logging.critical(f"处理文件 {pdf_file.name} 的任务异常退出: {e}", exc_info=True)
+                outcomes[pdf_file] = False
+            progress.complete(estimate, outcomes[pdf_file])
+    return outcomes
+
 def generate_summary_report(results, output_dir):
     """
     生成处理结果汇总报告。
@@ -164,6 +249,46 @@ def generate_summary_report(results, output_dir):
     except Exception as e:
         logging.error(f"生成报告时出错: {e}")
 
+def _validate_strategy_options(args):
+    """
+    检查方案选择策略的组合。逐页方案、抽样大小预测与连续搜索是互斥的选择策略；
+    大小模型的预测只用于阶梯搜索；--early-abort、--scheme-concurrency 与 --share-mrc-layers
+    只在不使用预测的阶梯搜索中生效，共享 MRC 分层的重建不支持提前终止与分片。
+    """
+    strategies = [
+        flag for flag, enabled in (
+            ('--per-page-schemes', getattr(args, 'per_page_schemes', False)),
+            ('--size-prediction', getattr(args, 'size_prediction', False)),
+            ('--search-mode continuous', getattr(args, 'search_mode', 'ladder') == 'continuous'),
+        ) if enabled
+    ]
+    if len(strategies) > 1:
+        logging.error(f"方案选择策略不能同时使用: {'、'.join(strategies)}")
+        return False
+    if getattr(args, 'size_model', False) and strategies and strategies[0] != '--size-prediction':
+        logging.error(f"--size-model 的预测只用于阶梯搜索，不能与 {strategies[0]} 同时使用")
+        return False
+    ladder_only = [
+        flag for flag, enabled in (
+            ('--early-abort', getattr(args, 'early_abort', False)),
+            ('--scheme-concurrency', (getattr(args, 'scheme_concurrency', 1) or 1) > 1),
+            ('--share-mrc-layers', getattr(args, 'share_mrc_layers', False)),
+        ) if enabled
+    ]
+    predicted = strategies + (['--size-model'] if getattr(args, 'size_model', False) else [])
+    if ladder_only and predicted:
+        logging.error(f"{'、'.join(ladder_only)} 只在阶梯搜索中生效，不能与 {predicted[0]} 同时使用")
+        return False
+    if getattr(args, 'share_mrc_layers', False):
+        for flag, enabled in (
+            ('--early-abort', getattr(args, 'early_abort', False)),
+            ('--reconstruct-shards', (getattr(args, 'reconstruct_shards', 1) or 1) > 1),
+        ):
+            if enabled:
+                logging.error(f"--share-mrc-layers 不能与 {flag} 同时使用")
+                return False
+    return True
+
 def validate_arguments(args):
     """
     验证命令行参数的有效性。
@@ -189,6 +314,46 @@ def validate_arguments(args):
     if args.max_splits < 2 or args.max_splits > 10:
         logging.error(f"最大拆分数应在2-10之间: {args.max_splits}")
         return False
+
+    # 检查页面级并行度
+    if getattr(args, 'page_workers', 1) < 1:
+        logging.error(f"页面级并行工作数必须大于等于1: {args.page_workers}")
+        return False
+
+    # 检查文件级并行度
+    if getattr(args, 'jobs', 1) < 1:
+        logging.error(f"并行处理的文件数必须大于等于1: {args.jobs}")
+        return False
+
+    # 检查方案级并发度
+    if getattr(args, 'scheme_concurrency', 1) < 1:
+        logging.error(f"方案并发数必须大于等于1: {args.scheme_concurrency}")
+        return False
+
+    # 检查大小预测的抽样页数
+    if getattr(args, 'prediction_samples', 1) < 1:
+        logging.error(f"大小预测抽样页数必须大于等于1: {args.prediction_samples}")
+        return False
+
+    # 检查重建分片数
+    if getattr(args, 'reconstruct_shards', 1) < 1:
+        logging.error(f"重建分片数必须大于等于1: {args.reconstruct_shards}")
+        return False
+    
+    # 检查连续搜索的重建预算（至少需要 S1 与 S7 两次）
+    if getattr(args, 'search_budget', 2) < 2:
+        logging.error(f"连续搜索的重建预算必须大于等于2: {args.search_budget}")
+        return False
+    
+    # 检查时间预算、命令超时与全局资源预算
+    for name in ('time_budget', 'command_timeout', 'max_cpus', 'max_memory'):
+        value = getattr(args, name, None)
+        if value is not None and value <= 0:
+            logging.error(f"--{name.replace('_', '-')} 必须大于0: {value}")
+            return False
+
+    if not _validate_strategy_options(args):
+        return False
     
     # 创建输出目录
     try:
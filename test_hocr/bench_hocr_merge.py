@@ -0,0 +1,106 @@
+"""
+hOCR 合并性能基准测试
+
+对比旧版逐字符切片的合并算法与 pipeline 中的流式标签扫描合并算法：
+1. 生成一组模拟 tesseract 输出的多页 hOCR 文件
+2. 分别用两种算法合并页面内容
+3. 校验输出完全一致，并报告耗时与加速比
+
+用法:
+    python test_hocr/bench_hocr_merge.py [页数] [每页行数]
+"""
+
+import io
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from compressor import pipeline
+
+
+def generate_page_hocr(page_no, lines_per_page):
+    """生成一个结构与 tesseract 输出相同的单页 hOCR 文档。"""
+    out = [pipeline._HOCR_HEADER]
+    out.append(f"  <div class='ocr_page' id='page_1' title='image \"page-{page_no:03d}.jpg\"; bbox 0 0 2480 3508; ppageno 0'>\n")
+    out.append(f"   <div class='ocr_carea' id='block_1_1' title=\"bbox 100 100 2380 3400\">\n")
+    out.append(f"    <p class='ocr_par' id='par_1_1' lang='chi_sim' title=\"bbox 100 100 2380 3400\">\n")
+    for line_no in range(1, lines_per_page + 1):
+        y = 100 + line_no * 40
+        out.append(
+            f"     <span class='ocr_line' id='line_1_{line_no}' "
+            f"title=\"bbox 100 {y} 2380 {y + 30}; baseline 0 -5; x_size 30; x_descenders 5; x_ascenders 8\">\n"
+        )
+        for word_no in range(1, 9):
+            x = 100 + word_no * 250
+            out.append(
+                f"      <span class='ocrx_word' id='word_1_{line_no}_{word_no}' "
+                f"title='bbox {x} {y} {x + 200} {y + 30}; x_wconf 91'>职称申报材料</span>\n"
+            )
+        out.append("     </span>\n")
+    out.append("    </p>\n   </div>\n  </div>\n </body>\n</html>\n")
+    return ''.join(out)
+
+
+def legacy_append_page(outfile, hocr_file):
+    """旧版合并算法：整文件读入内存，逐字符切片查找匹配的 </div>。"""
+    with open(hocr_file, 'r', encoding='utf-8') as infile:
+        content = infile.read()
+        start_idx = content.find('<div class=\'ocr_page\'')
+        if start_idx != -1:
+            page_content = content[start_idx:]
+            div_count = 0
+            end_idx = -1
+            for i, char in enumerate(page_content):
+                if page_content[i:i+5] == '<div ':
+                    div_count += 1
+                elif page_content[i:i+6] == '</div>':
+                    div_count -= 1
+                    if div_count == 0:
+                        end_idx = i + 6
+                        break
+            if end_idx != -1:
+                outfile.write(page_content[:end_idx] + '\n')
+
+
+def run_benchmark(pages=200, lines_per_page=60):
+    temp_dir = Path(tempfile.mkdtemp())
+    try:
+        hocr_files = []
+        for page_no in range(1, pages + 1):
+            path = temp_dir / f"page-{page_no:03d}.hocr"
+            path.write_text(generate_page_hocr(page_no, lines_per_page), encoding='utf-8')
+            hocr_files.append(path)
+        total_mb = sum(f.stat().st_size for f in hocr_files) / 1024 / 1024
+        print(f"📄 生成 {pages} 个单页 hOCR 文件，共 {total_mb:.1f} MB")
+
+        legacy_out = io.StringIO()
+        start = time.perf_counter()
+        for hocr_file in hocr_files:
+            legacy_append_page(legacy_out, hocr_file)
+        legacy_seconds = time.perf_counter() - start
+
+        streaming_out = io.BytesIO()
+        start = time.perf_counter()
+        for hocr_file in hocr_files:
+            pipeline._append_hocr_page(streaming_out, hocr_file)
+        streaming_seconds = time.perf_counter() - start
+
+        identical = legacy_out.getvalue().encode('utf-8') == streaming_out.getvalue()
+        print(f"⏱️  旧版逐字符算法: {legacy_seconds:.3f} s")
+        print(f"⏱️  流式标签扫描:   {streaming_seconds:.3f} s")
+        print(f"🚀 加速比: {legacy_seconds / max(streaming_seconds, 1e-9):.1f}x")
+        print(f"{'✅' if identical else '❌'} 输出{'完全一致' if identical else '不一致'}")
+        return identical
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    sys.exit(0 if run_benchmark(pages, lines) else 1)
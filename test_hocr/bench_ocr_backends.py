@@ -0,0 +1,62 @@
+"""
+OCR 后端性能基准测试
+
+对同一份 PDF 的页面图像分别使用 'page'（逐页调用 tesseract）与
+'batch'（图像列表批量调用 tesseract）后端执行 OCR，报告耗时并校验
+两者生成的页面数一致。需要系统中已安装 pdftoppm 与 tesseract。
+
+用法:
+    python test_hocr/bench_ocr_backends.py <input.pdf> [工作线程数] [DPI]
+"""
+
+import logging
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from compressor import pipeline
+
+
+def run_benchmark(pdf_path, workers=1, dpi=300):
+    source_dir = Path(tempfile.mkdtemp())
+    try:
+        image_files = pipeline.deconstruct_pdf_to_images(pdf_path, source_dir, dpi, workers=workers)
+        if not image_files:
+            print("❌ 光栅化失败")
+            return False
+        print(f"📄 {pdf_path.name}: {len(image_files)} 页, DPI {dpi}, 工作线程 {workers}")
+
+        timings = {}
+        page_counts = {}
+        for backend in pipeline.OCR_BACKENDS:
+            work_dir = source_dir / backend
+            work_dir.mkdir()
+            start = time.perf_counter()
+            hocr_file = pipeline.analyze_images_to_hocr(image_files, work_dir, workers=workers, backend=backend)
+            timings[backend] = time.perf_counter() - start
+            if not hocr_file:
+                print(f"❌ 后端 {backend} OCR 失败")
+                return False
+            page_counts[backend] = hocr_file.read_text(encoding='utf-8').count("class='ocr_page'")
+            print(f"⏱️  {backend:>5}: {timings[backend]:.1f} s "
+                  f"({timings[backend] / len(image_files):.2f} s/页, {page_counts[backend]} 页)")
+
+        print(f"🚀 batch 相对 page 加速比: {timings['page'] / max(timings['batch'], 1e-9):.2f}x")
+        return len(set(page_counts.values())) == 1
+    finally:
+        shutil.rmtree(source_dir)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    logging.basicConfig(level=logging.WARNING)
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    dpi = int(sys.argv[3]) if len(sys.argv) > 3 else 300
+    sys.exit(0 if run_benchmark(Path(sys.argv[1]), workers, dpi) else 1)
@@ -0,0 +1,74 @@
+# tests/test_batch_planner.py
+
+import unittest
+import sys
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+# 将项目根目录添加到 sys.path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from compressor import batch_planner
+
+
+class TestBatchPlanner(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    @patch('compressor.batch_planner.pipeline.get_pdf_page_count')
+    def test_largest_job_first(self, mock_pages):
+        """需要压缩的文件按页数降序排在前面，已满足目标的文件排在最后且不读取页数。"""
+        page_counts = {'a.pdf': 40, 'b.pdf': 900, 'c.pdf': 120}
+        mock_pages.side_effect = lambda path: page_counts[path.name]
+        files = []
+        for name, size in (('a.pdf', 3), ('b.pdf', 3), ('c.pdf', 3), ('small.pdf', 1)):
+            path = self.temp_dir / name
+            path.write_bytes(b'x' * size * 1024 * 1024)
+            files.append(path)
+
+        estimates = [batch_planner.estimate_file_cost(f, target_size_mb=2.0) for f in files]
+        ordered = batch_planner.order_by_cost(estimates)
+        self.assertEqual([e['file'].name for e in ordered], ['b.pdf', 'c.pdf', 'a.pdf', 'small.pdf'])
+        self.assertEqual(mock_pages.call_count, 3)
+
+    def test_progress_reports_throughput_and_eta(self):
+        """吞吐量按已完成页数与墙钟时间计算，预计剩余时间按剩余页数外推。"""
+        estimates = [{'file': Path(f"{i}.pdf"), 'cost': cost} for i, cost in enumerate((300, 100, 200))]
+        progress = batch_planner.BatchProgress(estimates)
+        progress.started = 0.0
+
+        snapshot = progress.complete(estimates[0], True, now=120.0)
+        self.assertAlmostEqual(snapshot['pages_per_min'], 150.0)
+        self.assertAlmostEqual(snapshot['eta_seconds'], 120.0)
+
+        snapshot = progress.complete(estimates[1], False, now=240.0)
+        self.assertAlmostEqual(snapshot['pages_per_min'], 100.0)
+        self.assertAlmostEqual(snapshot['eta_seconds'], 120.0)
+
+    def test_page_progress_counts_before_file_completes(self):
+        """OCR 完成的页面在文件完成前按比例计入进度，文件完成时只补足剩余部分。"""
+        estimates = [{'file': Path("a.pdf"), 'cost': 100}, {'file': Path("b.pdf"), 'cost': 100}]
+        progress = batch_planner.BatchProgress(estimates)
+        progress.started = 0.0
+
+        snapshot = progress.pages_done(estimates[0], 60, now=60.0)
+        self.assertEqual(snapshot['done_files'], 0)
+        self.assertAlmostEqual(snapshot['pages_per_min'], 60 * batch_planner._PRECOMPUTE_SHARE)
+        # 同一文件的部分进度不超过其成本的预处理比例
+        progress.pages_done(estimates[0], 60, now=90.0)
+        self.assertAlmostEqual(progress.done_cost, 100 * batch_planner._PRECOMPUTE_SHARE)
+
+        snapshot = progress.complete(estimates[0], True, now=120.0)
+        self.assertAlmostEqual(progress.done_cost, 100)
+        self.assertAlmostEqual(snapshot['eta_seconds'], 120.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+# tests/test_daemon.py
+
+import unittest
+import sys
+import argparse
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+# 将项目根目录添加到 sys.path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+import daemon
+from compressor import job_queue
+
+
+def fake_process_file(file_path, args):
+    """把“压缩结果”写入 args.output_dir；文件名含 bad 的处理失败。"""
+    if 'bad' in file_path.name:
+        return False
+    (Path(args.output_dir) / f"{file_path.stem}_compressed.pdf").write_bytes(b'%PDF-1.4')
+    return True
+
+
+class TestWatchFolderDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.inbox = self.root / 'inbox'
+        self.outbox = self.root / 'outbox'
+        self.inbox.mkdir()
+        self.outbox.mkdir()
+        self.args = argparse.Namespace(
+            input=str(self.inbox), output_dir=str(self.outbox), jobs=2,
+            poll_interval=0.05, settle_seconds=0, target_size=2.0,
+        )
+        self.queue = job_queue.JobQueue(self.outbox / daemon.QUEUE_DB_NAME)
+        self.daemon = daemon.WatchFolderDaemon(self.args, self.queue)
+
+    def tearDown(self):
+        self.queue.release_daemon_lock()
+        self.queue.close()
+        shutil.rmtree(self.root)
+
+    @patch('daemon.orchestrator.process_file', side_effect=fake_process_file)
+    def test_once_processes_and_publishes(self, mock_process):
+        """新文件入队并处理，结果发布到发件目录，源文件按结果归档；同一文件不会重复入队。"""
+        for name in ('a.pdf', 'b.PDF', 'bad.pdf'):
+            (self.inbox / name).write_bytes(b'%PDF-1.4 source')
+        (self.inbox / 'notes.txt').write_text('x')
+
+        self.daemon.run(once=True)
+
+        self.assertEqual(sorted(p.name for p in self.outbox.glob('*.pdf')), ['a_compressed.pdf', 'b_compressed.pdf'])
+        self.assertEqual(sorted(p.name for p in (self.inbox / 'processed').iterdir()), ['a.pdf', 'b.PDF'])
+        self.assertEqual([p.name for p in (self.inbox / 'failed').iterdir()], ['bad.pdf'])
+        status = self.queue.status()
+        self.assertEqual((status['counts']['done'], status['counts']['failed']), (2, 1))
+        self.assertEqual(status['recent_done'], 2)
+        self.assertEqual(list((self.outbox / daemon.STAGING_DIR_NAME).iterdir()), [])
+
+        self.assertEqual(self.daemon.scan(), 0)
+        self.assertEqual(mock_process.call_count, 3)
+
+    def test_restart_with_same_pid_recovers_interrupted_jobs(self):
+        """
+        重启后的守护进程（PID 与崩溃前相同，如容器中的 PID 1）重新排队遗留的 running 任务；
+        publishing 任务只发布尚未移动的文件；已结束任务遗留在收件目录的源文件被归档。
+        """
+        for name in ('a.pdf', 'b.pdf', 'c.pdf'):
+            (self.inbox / name).write_bytes(b'%PDF-1.4 source ' + name.encode())
+        self.daemon.scan()
+        running = self.queue.claim()      # 本进程 PID 认领，模拟崩溃前的同 PID 进程
+        publishing = self.queue.claim()
+        finished = self.queue.claim()
+        self.queue.mark_done(finished['id'])  # 归档源文件前崩溃
+
+        staging = self.daemon._staging_dir(publishing['id'])
+        staging.mkdir(parents=True)
+        (staging / 'b_part2.pdf').write_bytes(b'part2')
+        (self.outbox / 'b_part1.pdf').write_bytes(b'part1')  # 崩溃前已发布
+        self.queue.mark_publishing(publishing['id'], ['b_part1.pdf', 'b_part2.pdf'])
+
+        restarted_queue = job_queue.JobQueue(self.outbox / daemon.QUEUE_DB_NAME)
+        restarted = daemon.WatchFolderDaemon(self.args, restarted_queue)
+        self.assertTrue(restarted_queue.acquire_daemon_lock())
+        try:
+            restarted.recover()
+        finally:
+            restarted_queue.release_daemon_lock()
+            restarted_queue.close()
+
+        self.assertEqual(sorted(p.name for p in self.outbox.glob('*.pdf')), ['b_part1.pdf', 'b_part2.pdf'])
+        self.assertEqual([j['id'] for j in self.queue.jobs_in_state('queued')], [running['id']])
+        self.assertEqual(sorted(j['id'] for j in self.queue.jobs_in_state('done')), [publishing['id'], finished['id']])
+        self.assertTrue((self.inbox / 'a.pdf').exists())
+        self.assertTrue((self.inbox / 'processed' / 'b.pdf').exists())
+        self.assertTrue((self.inbox / 'processed' / 'c.pdf').exists())
+
+    @patch('daemon.orchestrator.process_file', side_effect=fake_process_file)
+    def test_second_daemon_on_same_queue_is_rejected(self, mock_process):
+        """同一队列数据库上的第二个守护进程无法启动，不会接管第一个进程正在处理的任务。"""
+        (self.inbox / 'a.pdf').write_bytes(b'%PDF-1.4 source')
+        self.assertTrue(self.queue.acquire_daemon_lock())
+        self.daemon.scan()
+        job = self.queue.claim()
+
+        other_queue = job_queue.JobQueue(self.outbox / daemon.QUEUE_DB_NAME)
+        other = daemon.WatchFolderDaemon(self.args, other_queue)
+        try:
+            self.assertFalse(other.run(once=True))
+        finally:
+            other_queue.close()
+        self.assertEqual(self.queue.jobs_in_state('running')[0]['id'], job['id'])
+        mock_process.assert_not_called()
+
+        self.queue.release_daemon_lock()
+        self.assertTrue(other_queue.acquire_daemon_lock())
+        other_queue.release_daemon_lock()
+
+    def test_scan_errors_stop_workers_before_releasing_lock(self):
+        """列出后被删除的文件被跳过；扫描循环异常退出时，先停止并等待工作线程再释放守护进程锁。"""
+        (self.inbox / 'a.pdf').write_bytes(b'%PDF-1.4 source')
+        vanished = self.inbox / 'gone.pdf'
+        with patch.object(self.daemon, '_inbox_pdfs', return_value=[vanished, self.inbox / 'a.pdf']):
+            self.assertEqual(self.daemon.scan(), 1)
+            self.daemon.recover()
+
+        alive_at_release = []
+        release = self.queue.release_daemon_lock
+
+        def record_release():
+            alive_at_release.extend(t.name for t in threading.enumerate() if t.name.startswith('daemon-worker-'))
+            release()
+
+        with patch.object(self.daemon, 'scan', side_effect=[0, RuntimeError('scan failed')]), \
+                patch.object(self.queue, 'release_daemon_lock', side_effect=record_release), \
+                patch('daemon.orchestrator.process_file', side_effect=fake_process_file):
+            with self.assertRaises(RuntimeError):
+                self.daemon.run()
+        self.assertEqual(alive_at_release, [])
+        self.assertTrue(self.queue.acquire_daemon_lock())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,8 @@ import sys
 import shutil
 from pathlib import Path
 import logging
+from types import SimpleNamespace
+from unittest import mock
 
 # 将项目根目录添加到 sys.path
 project_root = Path(__file__).resolve().parents[1]
@@ -26,21 +28,21 @@ FAKE_SIZE_MAP = {
     (110, 6): 0.9,   # S6
 }
 
-def fake_deconstruct(pdf_path, temp_dir, dpi):
+def fake_deconstruct(pdf_path, temp_dir, dpi, **kwargs):
     """模拟解构过程，返回伪造的图像路径列表。"""
     logging.debug(f"SIMULATE: Deconstructing {pdf_path} in {temp_dir} with dpi {dpi}")
     # 创建临时目录，如果它不存在
     Path(temp_dir).mkdir(parents=True, exist_ok=True)
     return [Path(temp_dir) / f"page-{i:02d}.tif" for i in range(1, 11)]
 
-def fake_analyze(images, temp_dir):
+def fake_analyze(images, temp_dir, **kwargs):
     """模拟分析过程，返回伪造的hocr文件路径。"""
     logging.debug(f"SIMULATE: Analyzing images in {temp_dir}")
     hocr_path = Path(temp_dir) / "combined.hocr"
     hocr_path.touch() # 创建一个空的hocr文件
     return hocr_path
 
-def fake_reconstruct(images, hocr, temp_dir, params, output_pdf_path):
+def fake_reconstruct(image_files, hocr_file, temp_dir, params, output_pdf_path, **kwargs):
     """
     模拟重建过程。
     根据传入的 'dpi' 和 'bg_downsample' 参数，从 FAKE_SIZE_MAP 查找对应的文件大小，
@@ -75,11 +77,24 @@ def fake_get_file_size_mb(file_path):
         logging.debug(f"SIMULATE: Getting size for original file {file_path}: 40MB")
         return 40.0
 
-# 应用模拟补丁
-pipeline.deconstruct_pdf_to_images = fake_deconstruct
-pipeline.analyze_images_to_hocr = fake_analyze
-pipeline.reconstruct_pdf = fake_reconstruct
-utils.get_file_size_mb = fake_get_file_size_mb
+# 应用模拟补丁（仅在本模块测试期间生效，避免影响其他测试模块）
+_ORIGINALS = {}
+
+def setUpModule():
+    _ORIGINALS['deconstruct'] = pipeline.deconstruct_pdf_to_images
+    _ORIGINALS['analyze'] = pipeline.analyze_images_to_hocr
+    _ORIGINALS['reconstruct'] = pipeline.reconstruct_pdf
+    _ORIGINALS['get_file_size_mb'] = utils.get_file_size_mb
+    pipeline.deconstruct_pdf_to_images = fake_deconstruct
+    pipeline.analyze_images_to_hocr = fake_analyze
+    pipeline.reconstruct_pdf = fake_reconstruct
+    utils.get_file_size_mb = fake_get_file_size_mb
+
+def tearDownModule():
+    pipeline.deconstruct_pdf_to_images = _ORIGINALS['deconstruct']
+    pipeline.analyze_images_to_hocr = _ORIGINALS['analyze']
+    pipeline.reconstruct_pdf = _ORIGINALS['reconstruct']
+    utils.get_file_size_mb = _ORIGINALS['get_file_size_mb']
 
 class TestNewCompressionStrategy(unittest.TestCase):
 
@@ -158,5 +173,201 @@ class TestNewCompressionStrategy(unittest.TestCase):
         self.assertEqual(status, 'SKIPPED')
         self.assertIn('message', details)
 
+class TestSchemeConcurrency(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path('./test_temp_concurrency')
+        self.test_dir.mkdir(exist_ok=True)
+        self.input_pdf = self.test_dir / 'dummy_input.pdf'
+        self.input_pdf.touch()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _run(self, target_size, concurrency):
+        output_dir = self.test_dir / f'out_{target_size}_{concurrency}'
+        output_dir.mkdir()
+        args = SimpleNamespace(scheme_concurrency=concurrency)
+        return strategy.run_compression_strategy(self.input_pdf, output_dir, target_size, args=args)
+
+    def test_concurrent_selection_matches_serial(self):
+        """并发执行方案时，各种目标大小下的选择结果与串行执行一致。"""
+        self._assert_matches_serial()
+        # 补全 S6/S7 的大小，覆盖跳跃-回溯成功的路径
+        with mock.patch.dict(FAKE_SIZE_MAP, {(100, 8): 0.9, (72, 10): 0.6}):
+            self._assert_matches_serial()
+
+    def _assert_matches_serial(self):
+        for target_size in (0.5, 2.0, 5.0, 10.0, 20.0, 35.0):
+            for concurrency in (2, 3, 7):
+                with self.subTest(target_size=target_size, concurrency=concurrency):
+                    serial_status, serial_details = self._run(target_size, 1)
+                    status, details = self._run(target_size, concurrency)
+                    self.assertEqual(status, serial_status)
+                    self.assertEqual(details.get('best_scheme_id'), serial_details.get('best_scheme_id'))
+                    self.assertEqual(sorted(details['all_results']), sorted(serial_details['all_results']))
+                    shutil.rmtree(self.test_dir / f'out_{target_size}_1')
+                    shutil.rmtree(self.test_dir / f'out_{target_size}_{concurrency}')
+
+    def test_early_abort_keeps_selection(self):
+        """提前终止超限重建时，选择结果与完整重建一致，被终止的方案没有输出路径。"""
+        def limited_reconstruct(image_files, hocr_file, temp_dir, params, output_pdf_path, size_limit_mb=None, **kwargs):
+            size_mb = FAKE_SIZE_MAP.get((params['dpi'], params['bg_downsample']), 50.0)
+            if size_limit_mb is not None and size_mb > size_limit_mb:
+                raise pipeline.SizeLimitExceeded(size_limit_mb + 0.01)
+            return fake_reconstruct(image_files, hocr_file, temp_dir, params, output_pdf_path)
+
+        with mock.patch.dict(FAKE_SIZE_MAP, {(100, 8): 0.9, (72, 10): 0.6}):
+            for target_size in (0.5, 2.0, 10.0, 20.0):
+                for allow_splitting in (False, True):
+                    with self.subTest(target_size=target_size, allow_splitting=allow_splitting):
+                        output_dir = self.test_dir / f'abort_{target_size}_{allow_splitting}'
+                        output_dir.mkdir()
+                        args = SimpleNamespace(allow_splitting=allow_splitting)
+                        full_status, full_details = strategy.run_compression_strategy(
+                            self.input_pdf, output_dir, target_size, args=args)
+                        args.early_abort = True
+                        with mock.patch.object(pipeline, 'reconstruct_pdf', side_effect=limited_reconstruct):
+                            status, details = strategy.run_compression_strategy(
+                                self.input_pdf, output_dir, target_size, args=args)
+                        self.assertEqual(status, full_status)
+                        self.assertEqual(details.get('best_scheme_id'), full_details.get('best_scheme_id'))
+                        for scheme_id, result in details['all_results'].items():
+                            if result.get('status') == 'exceeded':
+                                self.assertIsNone(result['path'])
+                                self.assertGreater(full_details['all_results'][scheme_id]['size_mb'], result['size_mb'] - 0.02)
+                        usable = {k for k, r in details['all_results'].items() if r['path'] and r['size_mb'] <= 8.0}
+                        full_usable = {k for k, r in full_details['all_results'].items() if r['size_mb'] <= 8.0}
+                        if allow_splitting:
+                            self.assertEqual(usable, full_usable)
+
+    def test_shared_mrc_layers_builds_same_dpi_schemes_once(self):
+        """共享 MRC 分层时 S1/S2 一次重建，选择结果不变；共享重建失败时退回逐个重建。"""
+        shared_calls = []
+
+        def fake_variants(image_files, hocr_file, temp_dir, dpi, variants, timeout=None):
+            shared_calls.append([params['name'] for params, _ in variants])
+            for params, output_pdf_path in variants:
+                fake_reconstruct(image_files, hocr_file, temp_dir, params, output_pdf_path)
+            return True
+
+        rebuilt = []
+
+        def recording_reconstruct(image_files, hocr_file, temp_dir, params, output_pdf_path, **kwargs):
+            rebuilt.append(params['name'])
+            return fake_reconstruct(image_files, hocr_file, temp_dir, params, output_pdf_path)
+
+        args = SimpleNamespace(share_mrc_layers=True)
+        with mock.patch.object(pipeline, 'reconstruct_pdf', side_effect=recording_reconstruct):
+            with mock.patch.object(pipeline, 'reconstruct_mrc_variants', side_effect=fake_variants):
+                status, details = strategy.run_compression_strategy(self.input_pdf, self.test_dir, 20.0, args=args)
+            self.assertEqual(status, 'SUCCESS')
+            self.assertEqual(details['best_scheme_id'], 2)
+            self.assertEqual(shared_calls, [['S1-保守', 'S2-温和']])
+            self.assertEqual(rebuilt, [])
+
+            with mock.patch.object(pipeline, 'reconstruct_mrc_variants', return_value=False):
+                status, details = strategy.run_compression_strategy(self.input_pdf, self.test_dir, 20.0, args=args)
+            self.assertEqual(details['best_scheme_id'], 2)
+            self.assertEqual(rebuilt, ['S1-保守', 'S2-温和'])
+
+
+
+class TestTimeBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path('./test_temp_budget')
+        self.test_dir.mkdir(exist_ok=True)
+        self.input_pdf = self.test_dir / 'dummy_input.pdf'
+        self.input_pdf.touch()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_budget_limited_result(self):
+        """预算不足以执行 S1 时，按期望收益执行可完成的方案并返回标记为受预算限制的结果。"""
+        # 假设重建耗时为 (DPI/100)² 秒：5 秒预算内只能执行 S4 及更激进的方案
+        with mock.patch.object(strategy.TimeBudget, 'estimate', lambda budget, params: (params['dpi'] / 100) ** 2):
+            status, details = strategy.run_compression_strategy(
+                self.input_pdf, self.test_dir, 5.0, args=SimpleNamespace(time_budget=5.0))
+        self.assertEqual(status, 'SUCCESS')
+        self.assertEqual(details['best_scheme_id'], 4)
+        self.assertTrue(details['budget_limited'])
+        self.assertEqual(sorted(details['all_results']), [4])
+
+    def test_exhausted_budget_fails(self):
+        """预处理已用尽预算时不再执行任何方案。"""
+        status, details = strategy.run_compression_strategy(
+            self.input_pdf, self.test_dir, 5.0, args=SimpleNamespace(time_budget=1e-9))
+        self.assertEqual(status, 'FAILURE')
+        self.assertTrue(details['budget_limited'])
+        self.assertEqual(details['all_results'], {})
+
+    def test_unlimited_budget_is_not_flagged(self):
+        status, details = strategy.run_compression_strategy(
+            self.input_pdf, self.test_dir, 35.0, args=SimpleNamespace(time_budget=3600.0))
+        self.assertEqual((status, details['best_scheme_id'], details['budget_limited']), ('SUCCESS', 1, False))
+
+
+class TestContinuousSearch(unittest.TestCase):
+
+    @staticmethod
+    def _size_mb(params):
+        """平滑的大小模型：与 DPI 的平方成正比，随背景降采样减小。"""
+        return 30.0 * (params['dpi'] / 300) ** 2 * 2 / params['bg_downsample']
+
+    def _run(self, target_size, budget=6):
+        built = {}
+
+        def fake_execute_scheme(scheme_id, temp_dir, precomputed_data, original_filename, size_limit_mb=None):
+            built[scheme_id] = strategy._scheme_params(scheme_id)
+            return Path(f"{scheme_id}.pdf")
+
+        def fake_execute_params(key, params, output_pdf_path, temp_dir, precomputed_data, size_limit_mb=None, strip_text=False):
+            built[key] = params
+            return Path(f"{key}.pdf")
+
+        with mock.patch.object(strategy, '_execute_scheme', side_effect=fake_execute_scheme), \
+             mock.patch.object(strategy, '_execute_params', side_effect=fake_execute_params), \
+             mock.patch.object(strategy.utils, 'get_file_size_mb',
+                               side_effect=lambda p: self._size_mb(built[int(p.stem) if p.stem.isdigit() else p.stem])), \
+             mock.patch.object(strategy, '_copy_to_output', side_effect=lambda i, *a: {'path': None, 'scheme_id': i}):
+            result, all_results = strategy._run_continuous_strategy_logic(
+                Path('input.pdf'), Path('.'), target_size, Path('.'), {}, budget=budget
+            )
+        return result, all_results, built
+
+    def test_interpolation_follows_ladder(self):
+        """q 的端点与整数位置重合于 S1-S7，DPI 随 q 单调不增。"""
+        self.assertEqual(strategy.interpolate_scheme_params(0.0)['dpi'], 300)
+        self.assertEqual(strategy.interpolate_scheme_params(1.0)['dpi'], 72)
+        self.assertEqual(strategy.interpolate_scheme_params(0.5)['dpi'], strategy.COMPRESSION_SCHEMES[4]['dpi'])
+        dpis = [strategy.interpolate_scheme_params(i / 100)['dpi'] for i in range(101)]
+        self.assertEqual(dpis, sorted(dpis, reverse=True))
+
+    def test_finds_parameters_between_ladder_steps(self):
+        """连续搜索得到的结果满足目标、在预算内完成，且比阶梯方案更接近目标。"""
+        target_size = 5.0
+        result, all_results, built = self._run(target_size)
+        best = all_results[result['scheme_id']]
+        self.assertLessEqual(best['size_mb'], target_size)
+        self.assertLessEqual(len(built), 6)
+        ladder_best = max(
+            self._size_mb(params) for params in map(strategy._scheme_params, strategy.COMPRESSION_SCHEMES)
+            if self._size_mb(params) <= target_size
+        )
+        self.assertGreater(best['size_mb'], ladder_best)
+        self.assertIn('name', best)
+
+    def test_s1_and_s7_rules(self):
+        """S1 满足目标时直接返回；S7 超出目标时切换为 8MB 目标。"""
+        result, _, built = self._run(40.0)
+        self.assertEqual((result['scheme_id'], list(built)), (1, [1]))
+
+        result, all_results, _ = self._run(0.1)
+        self.assertIsNotNone(result)
+        self.assertLessEqual(all_results[result['scheme_id']]['size_mb'], 8.0)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,82 @@
+# tests/test_ocr_cache.py
+
+import os
+import unittest
+import sys
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+# 将项目根目录添加到 sys.path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from compressor import ocr_cache, pipeline
+
+
+class TestOcrCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.cache = ocr_cache.OcrCache(self.temp_dir / 'cache', max_size_mb=1, engine='page:tesseract 5')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write(self, name, data):
+        path = self.temp_dir / name
+        path.write_bytes(data)
+        return path
+
+    def test_roundtrip_and_counters(self):
+        """写入后可按相同键读出原始 hOCR，并正确统计命中与未命中。"""
+        image = self._write('page-1.jpg', b'jpeg-bytes')
+        key = self.cache.key_for(image, 'chi_sim')
+        self.assertIsNone(self.cache.lookup(key))
+        self.cache.store(key, self._write('page-1.hocr', b"<div class='ocr_page'></div>"))
+        self.assertEqual(self.cache.lookup(key), b"<div class='ocr_page'></div>")
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_key_depends_on_language_and_engine(self):
+        """语言或引擎版本不同时缓存键不同。"""
+        image = self._write('page-1.jpg', b'jpeg-bytes')
+        other_engine = ocr_cache.OcrCache(self.temp_dir / 'cache', engine='page:tesseract 4')
+        keys = {
+            self.cache.key_for(image, 'chi_sim'),
+            self.cache.key_for(image, 'eng'),
+            other_engine.key_for(image, 'chi_sim'),
+        }
+        self.assertEqual(len(keys), 3)
+
+    def test_prune_evicts_least_recently_used(self):
+        """超过容量上限时优先淘汰最久未使用的条目。"""
+        self.cache.max_bytes = 0
+        payload = self._write('page.hocr', os.urandom(2048))
+        for i, key in enumerate(['aa01', 'aa02', 'aa03']):
+            self.cache.store(key, payload)
+            os.utime(self.cache._entry_path(key), (1000 + i, 1000 + i))
+        self.cache.max_bytes = self.cache._entry_path('aa01').stat().st_size * 2
+        self.assertEqual(self.cache.prune(), 1)
+        self.assertIsNone(self.cache.lookup('aa01'))
+        self.assertIsNotNone(self.cache.lookup('aa03'))
+
+    def test_cached_pages_skip_tesseract(self):
+        """第二次 OCR 相同页面时应全部命中缓存，不再调用 tesseract。"""
+        images = [self._write(f'page-{i}.jpg', f'image {i}'.encode()) for i in range(1, 4)]
+
+        def fake_tesseract(command, cwd=None, extra_env=None, timeout=None):
+            Path(f"{command[2]}.hocr").write_text(f"<div class='ocr_page'>{Path(command[1]).name}</div>")
+            return True
+
+        for expected_calls in (3, 0):
+            work_dir = self.temp_dir / f'run{expected_calls}'
+            work_dir.mkdir()
+            with mock.patch.object(pipeline.utils, 'run_command', side_effect=fake_tesseract) as run:
+                hocr_files = pipeline._ocr_images(images, work_dir, workers=2, cache=self.cache)
+            self.assertEqual(run.call_count, expected_calls)
+            self.assertIn('page-2.jpg', hocr_files[1].read_text())
+
+
+if __name__ == '__main__':
+    unittest.main()
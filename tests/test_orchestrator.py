@@ -0,0 +1,116 @@
+# tests/test_orchestrator.py
+
+import unittest
+import sys
+import argparse
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+# 将项目根目录添加到 sys.path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+import orchestrator
+
+
+class TestParallelDirectory(unittest.TestCase):
+
+    def setUp(self):
+        self.input_dir = Path(tempfile.mkdtemp())
+        for name in ('a.pdf', 'b.pdf', 'c.pdf', 'd.pdf', 'e.pdf'):
+            (self.input_dir / name).write_bytes(b'%PDF-1.4')
+        self.args = argparse.Namespace(
+            input=str(self.input_dir), output_dir=str(self.input_dir / 'out'), target_size=2.0,
+            allow_splitting=False, copy_small_files=False, jobs=3,
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.input_dir)
+
+    @patch('orchestrator.strategy.run_compression_strategy')
+    def test_jobs_get_own_args_and_counters_stay_correct(self, mock_strategy):
+        """并行处理时每个文件使用独立的 args 副本，结果与计数按文件正确汇总。"""
+        seen = {}
+        lock = threading.Lock()
+        barrier = threading.Barrier(3, timeout=5)
+
+        def fake_strategy(file_path, output_dir, target_size, keep_temp_on_failure=False, args=None):
+            if file_path.name in ('a.pdf', 'b.pdf', 'c.pdf'):
+                barrier.wait()  # 确认前三个文件确实同时运行
+            with lock:
+                seen[file_path.name] = args.input
+            if file_path.name in ('b.pdf', 'd.pdf'):
+                return 'FAILURE', {'all_results': {}}
+            return 'SUCCESS', {'best_scheme_id': 1, 'scheme_name': 'S1'}
+
+        mock_strategy.side_effect = fake_strategy
+        results = orchestrator.process_directory(self.input_dir, self.args)
+
+        self.assertEqual([r['file'].name for r in results], ['a.pdf', 'b.pdf', 'c.pdf', 'd.pdf', 'e.pdf'])
+        self.assertEqual([r['success'] for r in results], [True, False, True, False, True])
+        self.assertEqual(seen, {name: str(self.input_dir / name) for name in seen})
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(self.args.input, str(self.input_dir))
+
+    @patch('orchestrator.strategy.run_compression_strategy')
+    def test_incremental_skips_unchanged_files(self, mock_strategy):
+        """增量模式只重新处理新增、内容变化、设置变化或输出丢失的文件。"""
+        output_dir = Path(self.args.output_dir)
+        output_dir.mkdir()
+        self.args.incremental = True
+
+        def fake_strategy(file_path, output_dir, target_size, keep_temp_on_failure=False, args=None):
+            final_path = Path(output_dir) / f"{file_path.stem}_compressed.pdf"
+            final_path.write_bytes(b'%PDF-1.4')
+            return 'SUCCESS', {'best_scheme_id': 2, 'scheme_name': 'S2', 'final_path': final_path}
+
+        mock_strategy.side_effect = fake_strategy
+
+        def processed_files():
+            mock_strategy.reset_mock()
+            results = orchestrator.process_directory(self.input_dir, self.args)
+            self.assertTrue(all(r['success'] for r in results))
+            return sorted(call[0][0].name for call in mock_strategy.call_args_list)
+
+        self.assertEqual(len(processed_files()), 5)
+        self.assertEqual(processed_files(), [])
+
+        (self.input_dir / 'b.pdf').write_bytes(b'%PDF-1.5 changed')
+        (self.input_dir / 'f.pdf').write_bytes(b'%PDF-1.4')
+        (output_dir / 'c_compressed.pdf').unlink()
+        self.assertEqual(processed_files(), ['b.pdf', 'c.pdf', 'f.pdf'])
+
+        self.args.target_size = 1.0
+        self.assertEqual(len(processed_files()), 6)
+        self.args.dpi_pyramid = True
+        self.assertEqual(len(processed_files()), 6)
+        self.args.share_mrc_layers = True
+        self.assertEqual(len(processed_files()), 6)
+
+
+class TestValidateArguments(unittest.TestCase):
+
+    def test_rejects_conflicting_strategies(self):
+        """互斥的方案选择策略与只在阶梯搜索中生效的选项组合应被拒绝。"""
+        def options(**kwargs):
+            return argparse.Namespace(**dict({'search_mode': 'ladder'}, **kwargs))
+
+        self.assertTrue(orchestrator._validate_strategy_options(options(early_abort=True, scheme_concurrency=2)))
+        self.assertTrue(orchestrator._validate_strategy_options(options(size_prediction=True, size_model=True)))
+        self.assertFalse(orchestrator._validate_strategy_options(options(per_page_schemes=True, size_prediction=True)))
+        self.assertFalse(orchestrator._validate_strategy_options(options(search_mode='continuous', size_model=True)))
+        self.assertFalse(orchestrator._validate_strategy_options(options(search_mode='continuous', early_abort=True)))
+        self.assertFalse(orchestrator._validate_strategy_options(options(per_page_schemes=True, scheme_concurrency=2)))
+        self.assertTrue(orchestrator._validate_strategy_options(options(share_mrc_layers=True, scheme_concurrency=2)))
+        self.assertFalse(orchestrator._validate_strategy_options(options(share_mrc_layers=True, early_abort=True)))
+        self.assertFalse(orchestrator._validate_strategy_options(options(share_mrc_layers=True, reconstruct_shards=4)))
+        self.assertFalse(orchestrator._validate_strategy_options(options(share_mrc_layers=True, size_prediction=True)))
+        for flag in ({'early_abort': True}, {'scheme_concurrency': 2}, {'share_mrc_layers': True}):
+            self.assertFalse(orchestrator._validate_strategy_options(options(size_model=True, **flag)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# tests/test_page_planner.py
+
+import unittest
+import sys
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+# 将项目根目录添加到 sys.path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from compressor import page_planner
+
+
+class TestPagePlanner(unittest.TestCase):
+
+    def test_classify_page(self):
+        """文字覆盖率高的普通页为文字页，覆盖率极低或图像明显偏大的页为图像页。"""
+        self.assertEqual(page_planner.classify_page(0.3, 100, 100), 'text')
+        self.assertEqual(page_planner.classify_page(0.01, 100, 100), 'image')
+        self.assertEqual(page_planner.classify_page(0.3, 250, 100), 'image')
+        self.assertEqual(page_planner.classify_page(0.08, 100, 100), 'mixed')
+
+    def test_image_pages_are_downgraded_first(self):
+        """预算不足时优先降级节省最多的图像页，文字页保持最保守的方案。"""
+        text_page = {1: 100, 2: 90, 3: 80}
+        image_page = {1: 1000, 2: 500, 3: 250}
+        page_sizes = [text_page, image_page, text_page]
+        self.assertEqual(page_planner.assign_schemes(page_sizes, 2000), [1, 1, 1])
+        self.assertEqual(page_planner.assign_schemes(page_sizes, 800), [1, 2, 1])
+        self.assertEqual(page_planner.assign_schemes(page_sizes, 450), [1, 3, 1])
+        self.assertEqual(page_planner.assign_schemes(page_sizes, 440), [2, 3, 1])
+        self.assertIsNone(page_planner.assign_schemes(page_sizes, 100))
+
+    def test_assignment_beats_greedy(self):
+        """贪心先降节省最多的单级，需要 3 级；最优分配只把 B 页连降两级。"""
+        page_a = {1: 160, 2: 100, 3: 100}
+        page_b = {1: 200, 2: 190, 3: 100}
+        page_c = {1: 135, 2: 100, 3: 100}
+        page_sizes = [page_a, page_b, page_c]
+        self.assertEqual(page_planner._greedy_levels(page_sizes, [1, 2, 3], 395), [1, 1, 1])
+        self.assertEqual(page_planner.assign_schemes(page_sizes, 395), [1, 3, 1])
+
+    def test_estimates_exclude_fixed_overhead(self):
+        """每个样本 PDF 都含一份固定开销：以两页合并样本测得开销，从每页估计值中扣除并单独返回。"""
+        temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, temp_dir)
+        image_files = [temp_dir / f"page-{i}.jpg" for i in range(1, 5)]
+        for image in image_files:
+            (temp_dir / f"{image.stem}.hocr").write_text('')
+        stats = [{'image_bytes': 1000, 'class': 'text'}] * 4
+
+        def recode(sample_dir, images, hocr_files, params, strip_text, render):
+            return 5000 + params['per_page'] * len(images)
+
+        schemes = {1: {'dpi': 300, 'per_page': 800}, 2: {'dpi': 300, 'per_page': 300}}
+        with mock.patch.object(page_planner.predictor, '_recode_sample', side_effect=recode):
+            page_sizes, overhead = page_planner.estimate_page_sizes(image_files, temp_dir, stats, schemes)
+        self.assertEqual(overhead, 5000)
+        self.assertEqual(page_sizes, [{1: 800, 2: 300}] * 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
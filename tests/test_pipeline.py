@@ -0,0 +1,392 @@
+# tests/test_pipeline.py
+
+import glob
+import io
+import re
+import unittest
+import sys
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+# 将项目根目录添加到 sys.path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from compressor import pipeline
+
+
+class TestSplitPageRanges(unittest.TestCase):
+
+    def test_ranges_cover_all_pages_contiguously(self):
+        """分片区间应连续、不重叠并覆盖全部页码。"""
+        ranges = pipeline.split_page_ranges(10, 3)
+        self.assertEqual(ranges, [(1, 4), (5, 7), (8, 10)])
+
+    def test_more_shards_than_pages(self):
+        """分片数超过页数时，每页一个分片。"""
+        ranges = pipeline.split_page_ranges(2, 8)
+        self.assertEqual(ranges, [(1, 1), (2, 2)])
+
+    def test_empty_document(self):
+        """页数未知（0）时不进行分片。"""
+        self.assertEqual(pipeline.split_page_ranges(0, 4), [])
+
+
+class TestHocrPageScanner(unittest.TestCase):
+
+    def _segments(self, text):
+        return list(pipeline._iter_ocr_page_segments(io.BytesIO(text.encode('utf-8'))))
+
+    def test_nested_page_spanning_lines(self):
+        """跨行且包含嵌套 div 的页面应被完整提取，页面外的内容被忽略。"""
+        text = ("<body>\n <div class='ocr_page' id='page_1'>\n"
+                "  <div class='ocr_carea'><span>字</span></div>\n"
+                " </div><div class='other'></div>\n</body>\n")
+        data = b''.join(seg for _, seg, _ in self._segments(text)).decode('utf-8')
+        self.assertEqual(
+            data,
+            "<div class='ocr_page' id='page_1'>\n  <div class='ocr_carea'><span>字</span></div>\n </div>"
+        )
+        self.assertTrue(self._segments(text)[-1][2])
+
+    def test_offsets_point_into_source(self):
+        """片段偏移量应指向源文件中的真实位置。"""
+        text = "ab\n<div class='ocr_page'></div><div class='ocr_page' id='p2'></div>\n"
+        raw = text.encode('utf-8')
+        for offset, seg, _ in self._segments(text):
+            self.assertEqual(raw[offset:offset + len(seg)], seg)
+        self.assertEqual(sum(1 for _, _, end in self._segments(text) if end), 2)
+
+    def test_unclosed_page_is_balanced(self):
+        """页面未闭合时补全缺失的 </div>。"""
+        segments = self._segments("<div class='ocr_page'>\n<div class='ocr_par'>\n")
+        self.assertEqual(segments[-1], (None, b'</div></div>', True))
+
+
+def _fake_tesseract(command, cwd=None, extra_env=None, timeout=None):
+    """
+    模拟 tesseract：为每张输入图像写出一个包含图像名的 ocr_page；名称含 'bad' 时失败。
+    输入为 .txt 列表文件时按列表顺序输出多页 hOCR。
+    """
+    input_path, output_prefix = command[1], command[2]
+    if input_path.endswith('.txt'):
+        images = Path(input_path).read_text(encoding='utf-8').split()
+    else:
+        images = [input_path]
+    if any('bad' in img for img in images):
+        return False
+    with open(f"{output_prefix}.hocr", 'w', encoding='utf-8') as f:
+        f.write("<html><body>\n")
+        for img in images:
+            f.write(f"<div class='ocr_page' title='{Path(img).name}'>\n<div class='ocr_carea'></div>\n</div>\n")
+        f.write("</body></html>\n")
+    return True
+
+
+class TestParallelOcr(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_parallel_ocr_keeps_page_order(self):
+        """并行 OCR 返回的 hOCR 列表应与输入图像顺序一致，且每个进程被限制为单线程。"""
+        images = [self.temp_dir / f"page-{i:03d}.jpg" for i in range(1, 13)]
+        with mock.patch.object(pipeline.utils, 'run_command', side_effect=_fake_tesseract) as run:
+            hocr_files = pipeline._ocr_images(images, self.temp_dir, workers=4)
+        self.assertEqual([h.stem for h in hocr_files], [img.stem for img in images])
+        for call in run.call_args_list:
+            self.assertEqual(call[1]['extra_env'], {'OMP_THREAD_LIMIT': '1'})
+
+    def test_batch_backend_splits_pages(self):
+        """batch 后端应每个工作线程只调用一次 tesseract，并拆分出按顺序对应的单页 hOCR。"""
+        images = [self.temp_dir / f"page-{i:03d}.jpg" for i in range(1, 8)]
+        with mock.patch.object(pipeline.utils, 'run_command', side_effect=_fake_tesseract) as run:
+            hocr_files = pipeline._ocr_images(images, self.temp_dir, workers=3, backend='batch')
+        self.assertEqual(run.call_count, 3)
+        self.assertEqual([h.stem for h in hocr_files], [img.stem for img in images])
+        for img, hocr_file in zip(images, hocr_files):
+            content = hocr_file.read_text(encoding='utf-8')
+            self.assertEqual(content.count("class='ocr_page'"), 1)
+            self.assertIn(img.name, content)
+
+    def test_inprocess_backend_writes_page_hocr(self):
+        """进程内后端应把引擎返回的 hOCR 字符串写成单页 hOCR 文件。"""
+        images = [self.temp_dir / f"page-{i:03d}.jpg" for i in range(1, 4)]
+        fake_recognize = lambda img, lang, workers, timeout: f"<div class='ocr_page' title='{Path(img).name}'></div>"
+        with mock.patch.object(pipeline.ocr_engine, 'is_available', return_value=True), \
+                mock.patch.object(pipeline.ocr_engine, 'recognize', side_effect=fake_recognize):
+            hocr_files = pipeline._ocr_images(images, self.temp_dir, workers=2, backend='inprocess')
+        for img, hocr_file in zip(images, hocr_files):
+            self.assertIn(img.name, hocr_file.read_text(encoding='utf-8'))
+
+    def test_deadline_becomes_command_timeout(self):
+        """时间预算的截止时间以剩余秒数作为每条 tesseract 命令的超时。"""
+        images = [self.temp_dir / f"page-{i:03d}.jpg" for i in range(1, 4)]
+        deadline = time.monotonic() + 100
+        with mock.patch.object(pipeline.utils, 'run_command', side_effect=_fake_tesseract) as run:
+            self.assertIsNotNone(pipeline._ocr_images(images, self.temp_dir, workers=2, deadline=deadline))
+        for call in run.call_args_list:
+            self.assertTrue(0 < call[1]['timeout'] <= 100)
+
+    def test_parallel_ocr_fails_fast(self):
+        """任一页面失败时整体返回 None。"""
+        images = [self.temp_dir / f"page-{i:03d}.jpg" for i in range(1, 6)]
+        images[2] = self.temp_dir / "page-bad.jpg"
+        with mock.patch.object(pipeline.utils, 'run_command', side_effect=_fake_tesseract):
+            self.assertIsNone(pipeline._ocr_images(images, self.temp_dir, workers=2))
+
+
+def _fake_tools(command, cwd=None, extra_env=None, timeout=None):
+    """模拟 pdftoppm（按 -f/-l 生成页面图像）与 tesseract。"""
+    if command[0] == 'pdftoppm':
+        first = int(command[command.index('-f') + 1])
+        last = int(command[command.index('-l') + 1])
+        for page in range(first, last + 1):
+            Path(f"{command[-1]}-{page:02d}.jpg").touch()
+        return True
+    return _fake_tesseract(command, cwd, extra_env)
+
+
+class TestStreamingPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_streaming_merges_pages_in_order(self):
+        """流水线模式（两种后端）应返回全部页面，并按页码顺序合并 hOCR。"""
+        for backend in pipeline.OCR_BACKENDS:
+            with self.subTest(backend=backend):
+                temp_dir = self.temp_dir / backend
+                temp_dir.mkdir()
+                with mock.patch.object(pipeline, 'get_pdf_page_count', return_value=10), \
+                        mock.patch.object(pipeline.utils, 'run_command', side_effect=_fake_tools):
+                    result = pipeline.rasterize_and_analyze(
+                        Path('input.pdf'), temp_dir, dpi=300, workers=3, chunk_pages=3, backend=backend
+                    )
+                image_files, hocr_file = result
+                self.assertEqual([img.name for img in image_files], [f"page-{i:02d}.jpg" for i in range(1, 11)])
+                content = hocr_file.read_text(encoding='utf-8')
+                positions = [content.index(f"page-{i:02d}.jpg") for i in range(1, 11)]
+                self.assertEqual(positions, sorted(positions))
+                self.assertEqual(content.count("class='ocr_page'"), 10)
+                self.assertTrue(content.rstrip().endswith('</html>'))
+
+    def test_streaming_batch_backend_one_tesseract_per_worker(self):
+        """流水线模式的 batch 后端应与分阶段模式一样只启动 workers 个 tesseract 进程。"""
+        with mock.patch.object(pipeline, 'get_pdf_page_count', return_value=10), \
+                mock.patch.object(pipeline.utils, 'run_command', side_effect=_fake_tools) as run:
+            image_files, _ = pipeline.rasterize_and_analyze(
+                Path('input.pdf'), self.temp_dir, dpi=300, workers=3, chunk_pages=2, backend='batch'
+            )
+        tools = [call[0][0][0] for call in run.call_args_list]
+        self.assertEqual(tools.count('tesseract'), 3)
+        self.assertEqual(len(image_files), 10)
+
+
+
+class TestDpiPyramid(unittest.TestCase):
+
+    HOCR = (
+        "<div class='ocr_page' id='page_1' title='image \"page-1.jpg\"; bbox 0 0 3000 1500; scan_res 300 300'>\n"
+        "<span class='ocr_line' title=\"bbox 100 200 1100 260; baseline 0.002 -12; x_size 40\">\n"
+        "<span class='ocrx_word' title='bbox 100 200 400 260; x_wconf 93'>bbox 1 2 3 4</span>\n"
+        "</span></div>\n"
+    )
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.hocr_file = self.temp_dir / 'combined.hocr'
+        self.hocr_file.write_text(self.HOCR)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_rescale_hocr_scales_title_geometry_only(self):
+        """只缩放 title 中的坐标与尺寸，置信度、斜率与正文保持不变。"""
+        output = pipeline.rescale_hocr(self.hocr_file, self.temp_dir / 'scaled.hocr', 0.5, 150)
+        content = output.read_text()
+        self.assertIn("bbox 0 0 1500 750; scan_res 150 150", content)
+        self.assertIn("bbox 50 100 550 130; baseline 0.002 -6; x_size 20.00", content)
+        self.assertIn("bbox 50 100 200 130; x_wconf 93'>bbox 1 2 3 4<", content)
+
+    def test_build_dpi_stack_in_subdirectory(self):
+        """在 dpi_NNN 子目录中按新 DPI 光栅化，并生成缩放后的 hOCR。"""
+        source_images = [self.temp_dir / f"page-{i:02d}.jpg" for i in range(1, 5)]
+        with mock.patch.object(pipeline, 'get_pdf_page_count', return_value=4), \
+                mock.patch.object(pipeline.utils, 'run_command', side_effect=_fake_tools) as run:
+            images, hocr_file = pipeline.build_dpi_stack(
+                Path('input.pdf'), source_images, self.hocr_file, self.temp_dir, 72, 300, workers=2
+            )
+        self.assertEqual([f.name for f in images], [f.name for f in source_images])
+        self.assertTrue(all(f.parent == self.temp_dir / 'dpi_072' for f in images))
+        self.assertTrue(all(call[0][0][call[0][0].index('-r') + 1] == '72' for call in run.call_args_list))
+        self.assertIn("bbox 0 0 720 360", hocr_file.read_text())
+
+
+
+def _fake_recode_and_qpdf(command, cwd=None, extra_env=None, cancel_event=None, timeout=None):
+    """模拟 recode_pdf（输出所含页面的 id 与图像名）与 qpdf（按顺序拼接分片）。"""
+    if command[0] == 'recode_pdf':
+        images = sorted(Path(p).name for p in glob.glob(command[command.index('--from-imagestack') + 1]))
+        hocr = Path(command[command.index('--hocr-file') + 1]).read_text()
+        page_ids = re.findall(r"id='(page_\d+)'", hocr)
+        Path(command[command.index('-o') + 1]).write_text(' '.join(images + page_ids) + '\n')
+        return True
+    if command[0] == 'qpdf':
+        inputs = command[command.index('--pages') + 1:command.index('--')]
+        Path(command[-1]).write_text(''.join(Path(f).read_text() for f in inputs))
+        return True
+    return False
+
+
+class TestShardedReconstruction(unittest.TestCase):
+
+    def setUp(self):
+        # 测得的合并节省量是进程级状态，各测试之间互不影响
+        patcher = mock.patch.object(pipeline, '_observed_merge_saving', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.images = []
+        for i in range(1, 6):
+            image = self.temp_dir / f"page-{i}.jpg"
+            image.touch()
+            self.images.append(image)
+        self.hocr_file = self.temp_dir / 'combined.hocr'
+        self.hocr_file.write_text(
+            "<html><body>\n" + "".join(
+                f"<div class='ocr_page' id='page_{i}'>\n<div class='ocr_carea'>w{i}</div>\n</div>\n" for i in range(1, 6)
+            ) + "</body></html>\n"
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_hocr_index_points_at_pages(self):
+        """页面索引的字节区间恰好覆盖各 ocr_page。"""
+        data = self.hocr_file.read_bytes()
+        index = pipeline.index_hocr_pages(self.hocr_file)
+        self.assertEqual(len(index), 5)
+        for i, (start, end) in enumerate(index, 1):
+            self.assertTrue(data[start:end].startswith(f"<div class='ocr_page' id='page_{i}'>".encode()))
+            self.assertTrue(data[start:end].endswith(b'</div>\n</div>'))
+
+    def test_shards_are_merged_in_page_order(self):
+        """各分片只包含自己页码区间的图像与 hOCR，合并后保持页码顺序。"""
+        output_pdf = self.temp_dir / 'output.pdf'
+        params = {'dpi': 300, 'bg_downsample': 2}
+        with mock.patch.object(pipeline.utils, 'run_command', side_effect=_fake_recode_and_qpdf):
+            self.assertTrue(pipeline.reconstruct_pdf(self.images, self.hocr_file, self.temp_dir, params, output_pdf, shards=2))
+        self.assertEqual(output_pdf.read_text().splitlines(), [
+            'page-1.jpg page-2.jpg page-3.jpg page_1 page_2 page_3',
+            'page-4.jpg page-5.jpg page_4 page_5',
+        ])
+        self.assertFalse((self.temp_dir / 'output_shards').exists())
+
+    def test_size_limit_aborts_remaining_shards(self):
+        """已完成分片的大小确定超出上限时终止其余分片，也不合并。"""
+        calls = []
+        written = []
+
+        def fake_large_recode(command, cwd=None, extra_env=None, cancel_event=None, timeout=None):
+            calls.append(command[0])
+            if command[0] != 'recode_pdf':
+                return False
+            # 前两个分片完成后即超限；之后的分片模拟长时间运行，直到被取消信号终止
+            if calls.count('recode_pdf') > 2 and cancel_event is not None and cancel_event.wait(5):
+                return False
+            Path(command[command.index('-o') + 1]).write_bytes(b'x' * (1024 * 1024))
+            written.append(command[0])
+            return True
+
+        params = {'dpi': 300, 'bg_downsample': 2}
+        with mock.patch.object(pipeline.utils, 'run_command', side_effect=fake_large_recode):
+            with self.assertRaises(pipeline.SizeLimitExceeded) as ctx:
+                pipeline.reconstruct_pdf(self.images, self.hocr_file, self.temp_dir, params,
+                                         self.temp_dir / 'output.pdf', size_limit_mb=1.5)
+        self.assertGreater(ctx.exception.size_mb, 1.5)
+        # 试重建的分片并行启动；第2个分片完成后即可确定超限，其余分片被取消信号终止
+        self.assertEqual(len(written), 2)
+        self.assertNotIn('qpdf', calls)
+        self.assertFalse((self.temp_dir / 'output_shards').exists())
+
+    def test_size_limit_merges_probe_shards(self):
+        """未超限时直接合并试重建的分片（每页只编码一次），并记录测得的每分片合并节省量。"""
+        params = {'dpi': 300, 'bg_downsample': 2}
+        limited_pdf = self.temp_dir / 'limited.pdf'
+        with mock.patch.object(pipeline.utils, 'run_command', side_effect=_fake_recode_and_qpdf) as run:
+            self.assertTrue(pipeline.reconstruct_pdf(self.images, self.hocr_file, self.temp_dir, params, limited_pdf,
+                                                     size_limit_mb=10))
+        tools = [call[0][0][0] for call in run.call_args_list]
+        self.assertEqual(tools.count('recode_pdf'), pipeline.EARLY_ABORT_CHUNKS)
+        self.assertEqual(tools.count('qpdf'), 1)
+        self.assertEqual(
+            ' '.join(limited_pdf.read_text().split()),
+            'page-1.jpg page-2.jpg page_1 page_2 page-3.jpg page_3 page-4.jpg page_4 page-5.jpg page_5'
+        )
+        self.assertIsNotNone(pipeline._observed_merge_saving)
+
+
+    def test_page_groups_are_interleaved_in_page_order(self):
+        """各页面组以自己的参数重建，合并时按原页码顺序交错取页。"""
+        def fake_group_recode(command, cwd=None, extra_env=None, cancel_event=None, timeout=None):
+            if command[0] == 'recode_pdf':
+                images = sorted(Path(p).name for p in glob.glob(command[command.index('--from-imagestack') + 1]))
+                dpi = command[command.index('--dpi') + 1]
+                Path(command[command.index('-o') + 1]).write_text(''.join(f"{name}@{dpi}\n" for name in images))
+                return True
+            if command[0] == 'qpdf':
+                args = command[command.index('--pages') + 1:command.index('--')]
+                pages = []
+                for pdf, page_range in zip(args[::2], args[1::2]):
+                    first, last = (int(v) for v in page_range.split('-'))
+                    pages += Path(pdf).read_text().splitlines()[first - 1:last]
+                Path(command[-1]).write_text('\n'.join(pages))
+                return True
+            return False
+
+        groups = [
+            {'image_files': self.images, 'hocr_file': self.hocr_file, 'pages': [0, 1, 3], 'params': {'dpi': 300, 'bg_downsample': 2}},
+            {'image_files': self.images, 'hocr_file': self.hocr_file, 'pages': [2, 4], 'params': {'dpi': 150, 'bg_downsample': 5}},
+        ]
+        output_pdf = self.temp_dir / 'output.pdf'
+        with mock.patch.object(pipeline.utils, 'run_command', side_effect=fake_group_recode):
+            self.assertTrue(pipeline.reconstruct_page_groups(groups, 5, output_pdf, workers=2))
+        self.assertEqual(output_pdf.read_text().splitlines(), [
+            'page-1.jpg@300', 'page-2.jpg@300', 'page-3.jpg@150', 'page-4.jpg@300', 'page-5.jpg@150',
+        ])
+        self.assertFalse((self.temp_dir / 'output_groups').exists())
+
+    def test_shared_mrc_layers_are_gated(self):
+        """archive-pdf-tools 版本未经核对或 hOCR 页数不符时不运行辅助脚本；失败时不保留部分输出。"""
+        params = {'name': 'S1', 'dpi': 300, 'bg_downsample': 2, 'jpeg2000_encoder': 'openjpeg'}
+        outputs = [self.temp_dir / 'a.pdf', self.temp_dir / 'b.pdf']
+        variants = [(params, outputs[0]), (dict(params, bg_downsample=3), outputs[1])]
+
+        def partial_helper(command, **kwargs):
+            outputs[0].write_text('partial')
+            return False
+
+        with mock.patch.object(pipeline.utils, 'find_recode_pdf_python', return_value=sys.executable), \
+             mock.patch.object(pipeline.utils, 'run_command', side_effect=partial_helper) as run:
+            with mock.patch.object(pipeline, 'archive_pdf_tools_version', return_value='0.1'):
+                self.assertFalse(pipeline.reconstruct_mrc_variants(self.images, self.hocr_file, self.temp_dir, 300, variants))
+            with mock.patch.object(pipeline, 'archive_pdf_tools_version', return_value=pipeline.MRC_VARIANTS_VERSIONS[0]):
+                self.assertFalse(pipeline.reconstruct_mrc_variants(self.images[:4], self.hocr_file, self.temp_dir, 300, variants))
+                run.assert_not_called()
+                self.assertFalse(pipeline.reconstruct_mrc_variants(self.images, self.hocr_file, self.temp_dir, 300, variants))
+                run.assert_called_once()
+        self.assertFalse(outputs[0].exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+# tests/test_predictor.py
+
+import unittest
+import sys
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+# 将项目根目录添加到 sys.path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from compressor import predictor, strategy
+
+OVERHEAD = 5000
+
+
+class TestSizePredictor(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_stratified_sample_indices(self):
+        """每层取中间一页，页数不足时取全部页面。"""
+        self.assertEqual(predictor.select_sample_indices(10, 4), [0, 3, 5, 8])
+        self.assertEqual(predictor.select_sample_indices(3, 8), [0, 1, 2])
+        self.assertEqual(predictor.select_sample_indices(0, 8), [])
+
+    def test_prediction_recovers_linear_sizes(self):
+        """输出大小与图像字节数成正比（加固定开销）时，预测应准确且区间包含真实值。"""
+        image_files = []
+        for i in range(1, 21):
+            image = self.temp_dir / f"page-{i:02d}.jpg"
+            image.write_bytes(b'x' * (20000 + 3000 * (i % 7)))
+            (self.temp_dir / f"page-{i:02d}.hocr").write_text("<div class='ocr_page'></div>")
+            image_files.append(image)
+
+        def fake_reconstruct(images, hocr_file, temp_dir, params, output_pdf_path):
+            content = sum(Path(f).stat().st_size for f in images) * 100 // params['dpi']
+            Path(output_pdf_path).write_bytes(b'p' * (OVERHEAD + content))
+            return True
+
+        schemes = {1: {'dpi': 300}, 7: {'dpi': 72}}
+        with mock.patch.object(predictor.pipeline, 'reconstruct_pdf', side_effect=fake_reconstruct):
+            predictions = predictor.predict_scheme_sizes(image_files, self.temp_dir, schemes, sample_pages=5, workers=2)
+
+        total_image_bytes = sum(f.stat().st_size for f in image_files)
+        for scheme_id, params in schemes.items():
+            actual_mb = (OVERHEAD + total_image_bytes * 100 // params['dpi']) / (1024 * 1024)
+            self.assertAlmostEqual(predictions[scheme_id]['size_mb'], actual_mb, places=2)
+            self.assertLessEqual(predictions[scheme_id]['low_mb'], actual_mb + 1e-4)
+            self.assertGreaterEqual(predictions[scheme_id]['high_mb'], actual_mb - 1e-4)
+
+
+class TestPredictedStrategy(unittest.TestCase):
+
+    ACTUAL_SIZES = {1: 30.0, 2: 15.0, 3: 8.0, 4: 4.0, 5: 1.8, 6: 0.9, 7: 0.6}
+
+    def _run(self, target_size, predicted_sizes, actual_sizes=None):
+        actual_sizes = actual_sizes or self.ACTUAL_SIZES
+        predictions = {
+            i: {'size_mb': size, 'low_mb': size * 0.8, 'high_mb': size * 1.2}
+            for i, size in predicted_sizes.items()
+        }
+        built = []
+
+        def fake_execute(scheme_id, temp_dir, precomputed_data, original_filename):
+            built.append(scheme_id)
+            return Path(f"S{scheme_id}.pdf")
+
+        with mock.patch.object(strategy, '_execute_scheme', side_effect=fake_execute), \
+             mock.patch.object(strategy.utils, 'get_file_size_mb', side_effect=lambda p: actual_sizes[int(p.stem[1:])]), \
+             mock.patch.object(strategy, '_copy_to_output', side_effect=lambda i, *a: {'path': None, 'scheme_id': i}):
+            result, all_results = strategy._run_predicted_strategy_logic(
+                Path('input.pdf'), Path('.'), target_size, Path('.'), {}, predictions
+            )
+        return result, all_results, built
+
+    def test_accurate_prediction_builds_once(self):
+        """预测准确时只完整重建一次即确定最优方案。"""
+        result, _, built = self._run(5.0, self.ACTUAL_SIZES)
+        self.assertEqual(result['scheme_id'], 4)
+        self.assertEqual(built, [4])
+
+    def test_prediction_errors_are_corrected(self):
+        """预测偏乐观或偏保守时，通过验证结果向下或向上移动到正确方案。"""
+        optimistic = {**self.ACTUAL_SIZES, 3: 4.5, 4: 2.0}
+        result, _, built = self._run(5.0, optimistic)
+        self.assertEqual((result['scheme_id'], built), (4, [3, 4]))
+
+        pessimistic = {**self.ACTUAL_SIZES, 4: 5.5, 3: 9.0}
+        result, _, built = self._run(5.0, pessimistic)
+        self.assertEqual((result['scheme_id'], built), (4, [5, 4]))
+
+    def test_switches_target_to_8mb_like_serial_strategy(self):
+        """S7 超出目标但小于 8MB 时切换目标为 8MB；S7 大于 8MB 时失败。"""
+        result, _, _ = self._run(0.5, self.ACTUAL_SIZES)
+        self.assertEqual(result['scheme_id'], 3)
+
+        too_large = {i: size + 10 for i, size in self.ACTUAL_SIZES.items()}
+        result, all_results, _ = self._run(0.5, too_large, too_large)
+        self.assertIsNone(result)
+        self.assertIn(7, all_results)
+
+
+if __name__ == '__main__':
+    unittest.main()
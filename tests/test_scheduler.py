@@ -0,0 +1,64 @@
+# tests/test_scheduler.py
+
+import unittest
+import sys
+import threading
+import time
+from pathlib import Path
+
+# 将项目根目录添加到 sys.path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from compressor import scheduler
+
+
+class TestResourceScheduler(unittest.TestCase):
+
+    def test_command_cost_estimates(self):
+        """recode_pdf 的内存随 DPI 增长；tesseract 按线程数占用令牌；pdfinfo 不占用令牌。"""
+        heavy = scheduler.command_cost(["recode_pdf", "--dpi", "300", "-o", "out.pdf"])
+        light = scheduler.command_cost(["recode_pdf", "--dpi", "100", "-o", "out.pdf"])
+        self.assertGreater(heavy[1], 2 * light[1])
+        self.assertEqual(scheduler.command_cost(["tesseract", "a.jpg", "a"], {'OMP_THREAD_LIMIT': '2'})[0], 2)
+        self.assertEqual(scheduler.command_cost(["pdfinfo", "a.pdf"])[0], 0)
+
+    def test_requests_queue_until_resources_are_released(self):
+        """CPU 与内存任一不足时排队，先到先得；超过总量的申请独占运行。"""
+        resources = scheduler.ResourceScheduler(cpu_tokens=2, memory_mb=1000)
+        first = resources.acquire(1, 800)
+        order = []
+
+        def _worker(name, cpu, memory_mb):
+            allocation = resources.acquire(cpu, memory_mb)
+            order.append(name)
+            resources.release(allocation)
+
+        big = threading.Thread(target=_worker, args=('big', 1, 5000))
+        big.start()
+        time.sleep(0.1)
+        small = threading.Thread(target=_worker, args=('small', 0, 10))
+        small.start()
+        time.sleep(0.1)
+        self.assertEqual(order, [])  # 小申请排在等待中的大申请之后
+
+        resources.release(first)
+        big.join(timeout=5)
+        small.join(timeout=5)
+        self.assertEqual(order, ['big', 'small'])
+        self.assertEqual((resources.cpu_in_use, resources.memory_in_use), (0, 0))
+
+    def test_wait_stops_on_cancel_or_deadline(self):
+        """等待期间被取消或超时时不分配资源。"""
+        resources = scheduler.ResourceScheduler(cpu_tokens=1)
+        held = resources.acquire(1, 0)
+        self.assertIsNone(resources.acquire(1, 0, deadline=time.monotonic() + 0.05))
+        cancel = threading.Event()
+        cancel.set()
+        self.assertIsNone(resources.acquire(1, 0, cancel_event=cancel))
+        resources.release(held)
+        self.assertEqual(resources.acquire(1, 0), (1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+# tests/test_size_model.py
+
+import unittest
+import sys
+import math
+import shutil
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+# 将项目根目录添加到 sys.path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from compressor import size_model, strategy
+
+
+def synthetic_size_mb(features, params):
+    """与页数、图像大小成正比，与 DPI 的平方成正比、随背景降采样减小的大小模型。"""
+    size = 0.002 * features['page_count'] * features['mean_image_kb'] / 100 * (params['dpi'] / 300) ** 2
+    size *= (2 / params['bg_downsample']) ** 0.5
+    return size * (0.8 if params.get('strip_text') else 1.0)
+
+
+def synthetic_records(count):
+    records = []
+    for i in range(count):
+        features = {
+            'page_count': 20 + 37 * i % 300,
+            'source_mb': 5.0 + i % 11,
+            'mean_image_kb': 200 + 53 * i % 400,
+            'text_density': 0.1 + 0.03 * (i % 9),
+        }
+        results = []
+        for scheme_id in (1, 3, 4, 6, 7):
+            params = dict(strategy._scheme_params(scheme_id), strip_text=(scheme_id == 7))
+            results.append({
+                'scheme': str(scheme_id), 'dpi': params['dpi'], 'bg_downsample': params['bg_downsample'],
+                'strip_text': params['strip_text'], 'size_mb': synthetic_size_mb(features, params),
+            })
+        records.append({'features': features, 'results': results})
+    return records
+
+
+class TestSizeModel(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_document_features(self):
+        """文字覆盖率为单词边界框面积占页面面积的比例。"""
+        image = self.temp_dir / 'page-1.jpg'
+        image.write_bytes(b'x' * 2048)
+        hocr = self.temp_dir / 'combined.hocr'
+        hocr.write_text(
+            "<div class='ocr_page' id='page_1' title='image \"page-1.jpg\"; bbox 0 0 100 100; ppageno 0'>"
+            "<span class='ocrx_word' id='word_1_1' title='bbox 0 0 10 10; x_wconf 95'>a</span>"
+            "<span class='ocrx_word' id='word_1_2' title='bbox 20 20 40 40; x_wconf 90'>b</span></div>"
+        )
+        features = size_model.document_features(image, [image], hocr)
+        self.assertEqual(features['page_count'], 1)
+        self.assertAlmostEqual(features['mean_image_kb'], 2.0)
+        self.assertAlmostEqual(features['text_density'], 0.05)
+
+    def test_history_roundtrip_and_minimum_documents(self):
+        """历史记录可追加与读取；文档不足时不拟合模型。"""
+        history = self.temp_dir / 'history' / 'size_history.jsonl'
+        for record in synthetic_records(size_model.MIN_TRAINING_DOCUMENTS - 1):
+            size_model.record_run(history, 'doc.pdf', record['features'], record['results'])
+        size_model.record_run(history, 'empty.pdf', {}, [])
+        records = size_model.load_history(history)
+        self.assertEqual(len(records), size_model.MIN_TRAINING_DOCUMENTS - 1)
+        self.assertIsNone(size_model.fit_model(records))
+
+    def test_model_predicts_unseen_schemes(self):
+        """模型由重建参数外推到历史中未出现的方案，预测接近真实大小。"""
+        model = size_model.fit_model(synthetic_records(30))
+        features = {'page_count': 150, 'source_mb': 12.0, 'mean_image_kb': 350, 'text_density': 0.2}
+        for scheme_id in (2, 5):
+            params = strategy._scheme_params(scheme_id)
+            prediction = size_model.predict_size(model, features, params)
+            actual = synthetic_size_mb(features, params)
+            self.assertLess(abs(math.log(prediction['size_mb'] / actual)), 0.05)
+            self.assertLessEqual(prediction['low_mb'], prediction['size_mb'])
+            self.assertGreaterEqual(prediction['high_mb'], prediction['size_mb'])
+
+    def test_history_is_keyed_by_run_mode(self):
+        """拟合只使用运行模式相同的记录，不同模式的大小差异不会混入模型。"""
+        pyramid = size_model.run_mode(SimpleNamespace(dpi_pyramid=True))
+        plain = size_model.run_mode(SimpleNamespace())
+        self.assertNotEqual(size_model.run_mode(SimpleNamespace(share_mrc_layers=True)), plain)
+        records = []
+        for record in synthetic_records(20):
+            records.append(dict(record, mode=plain))
+            scaled = [dict(r, size_mb=r['size_mb'] * 0.5) for r in record['results']]
+            records.append(dict(record, results=scaled, mode=pyramid))
+        features = synthetic_records(1)[0]['features']
+        params = dict(strategy._scheme_params(4), strip_text=False)
+        plain_mb = size_model.predict_size(size_model.fit_model(records, plain), features, params)['size_mb']
+        pyramid_mb = size_model.predict_size(size_model.fit_model(records, pyramid), features, params)['size_mb']
+        self.assertAlmostEqual(pyramid_mb / plain_mb, 0.5, places=2)
+        self.assertLess(size_model.accuracy_report(records, block_size=10)[-1]['mape'], 0.05)
+
+    def test_accuracy_report_replays_history(self):
+        """回放报告只用之前的文档预测，按文档分组给出误差。"""
+        report = size_model.accuracy_report(synthetic_records(25), block_size=10)
+        self.assertEqual([(b['first'], b['last']) for b in report], [(6, 15), (16, 25)])
+        self.assertEqual(report[0]['observations'], 50)
+        self.assertLess(report[-1]['mape'], 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
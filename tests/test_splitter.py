@@ -0,0 +1,83 @@
+# tests/test_splitter.py
+
+import unittest
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+# 将项目根目录添加到 sys.path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from compressor import splitter
+
+
+def fake_qpdf_json(page_streams, shared_font_length):
+    """构造 qpdf --json=2 输出：每页一个内容流与一个图像 XObject，所有页共用一个字体。"""
+    objects = {
+        "obj:1 0 R": {"value": {"/Type": "/Catalog", "/Pages": "2 0 R"}},
+        "obj:2 0 R": {"value": {"/Type": "/Pages", "/Count": len(page_streams), "/Kids": []}},
+        "obj:3 0 R": {"stream": {"dict": {"/Length": shared_font_length}}},
+    }
+    pages = []
+    for i, (content_length, image_length) in enumerate(page_streams):
+        page, content, image = (f"{10 + 3 * i + k} 0 R" for k in range(3))
+        objects["obj:" + page] = {"value": {
+            "/Type": "/Page", "/Parent": "2 0 R", "/Contents": content,
+            "/Resources": {"/Font": {"/F1": "3 0 R"}, "/XObject": {"/Im0": image}},
+        }}
+        objects["obj:" + content] = {"stream": {"dict": {"/Length": content_length}}}
+        objects["obj:" + image] = {"stream": {"dict": {"/Length": image_length, "/Subtype": "/Image"}}}
+        objects["obj:2 0 R"]["value"]["/Kids"].append(page)
+        pages.append({"object": page, "contents": [content], "images": [{"object": image}]})
+    return {"version": 2, "pages": pages, "qpdf": [{"jsonversion": 2}, objects]}
+
+
+class TestSplitPlanning(unittest.TestCase):
+
+    def test_page_costs_amortize_shared_resources(self):
+        """图像页的开销远高于文字页；共用字体按引用页数平摊，页面树与目录计为固定开销。"""
+        data = fake_qpdf_json([(1000, 0), (1000, 90000), (1000, 0)], shared_font_length=3000)
+        costs = splitter.page_costs_from_qpdf_json(data, file_bytes=100000)
+
+        self.assertEqual(len(costs['page_objects']), 3)
+        self.assertIn("3 0 R", costs['page_objects'][0])
+        self.assertNotIn("2 0 R", costs['page_objects'][0])
+        self.assertGreater(costs['page_bytes'][1], 20 * costs['page_bytes'][0])
+        self.assertGreater(costs['overhead_bytes'], 0)
+        total = sum(costs['page_bytes']) + costs['overhead_bytes']
+        self.assertAlmostEqual(total, 100000, delta=1)
+
+    def test_greedy_partition_packs_contiguous_pages(self):
+        """贪心划分得到最少的连续部分；共享对象在同一部分内只计一次。"""
+        costs = {
+            'page_objects': [{'a', 'font'}, {'b', 'font'}, {'c', 'font'}, {'d', 'font'}],
+            'object_bytes': {'a': 400, 'b': 400, 'c': 900, 'd': 100, 'font': 300},
+            'overhead_bytes': 100,
+        }
+        plan = splitter._plan_exact_partition(costs, limit_bytes=1400)
+        self.assertEqual([(p['start'], p['end']) for p in plan], [(1, 2), (3, 4)])
+        self.assertAlmostEqual(plan[0]['predicted_mb'] * 1024 * 1024, 1200)
+        self.assertAlmostEqual(plan[1]['predicted_mb'] * 1024 * 1024, 1400)
+
+        with self.assertRaises(ValueError):
+            splitter._plan_exact_partition(costs, limit_bytes=1000)
+
+    @patch('compressor.splitter.pikepdf', None)
+    @patch('compressor.splitter._split_pdf_physical')
+    def test_parts_split_in_parallel_without_pikepdf(self, mock_split):
+        """未安装 pikepdf 时各部分并行调用 qpdf，输出命名保持不变。"""
+        mock_split.return_value = True
+        plan = [{'start': 1, 'end': 4}, {'start': 5, 'end': 9}, {'start': 10, 'end': 10}]
+        paths = [Path(f"out/doc_part{i}.pdf") for i in range(1, 4)]
+
+        self.assertTrue(splitter._split_pdf_parts(Path("master.pdf"), plan, paths, workers=3))
+        calls = sorted(call[0][1:] for call in mock_split.call_args_list)
+        self.assertEqual(calls, [(paths[0], 1, 4), (paths[1], 5, 9), (paths[2], 10, 10)])
+
+        mock_split.side_effect = lambda pdf, out, start, end: start != 5
+        self.assertFalse(splitter._split_pdf_parts(Path("master.pdf"), plan, paths, workers=3))
+
+
+if __name__ == '__main__':
+    unittest.main()
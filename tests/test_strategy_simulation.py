@@ -21,7 +21,7 @@ def fake_analyze(images, temp_dir):
     return Path(temp_dir) / "combined.hocr"
 
 # reconstruct 模拟：根据params返回不同大小
-def fake_reconstruct(images, hocr, temp_dir, params, output_pdf_path):
+def fake_reconstruct(images, hocr, temp_dir, params, output_pdf_path, **kwargs):
     # 使用dpi和bg_downsample计算假的大小（MB）
     dpi = params.get('dpi', 300)
     bg = params.get('bg_downsample', 2)
@@ -31,12 +31,12 @@ def fake_reconstruct(images, hocr, temp_dir, params, output_pdf_path):
         f.write(str(size))
     return True
 
-pipeline.deconstruct_pdf_to_images = fake_deconstruct
-pipeline.analyze_images_to_hocr = fake_analyze
-pipeline.reconstruct_pdf = fake_reconstruct
-
-
 def run_sim():
+    # 仅在作为脚本运行时打补丁，避免 pytest 收集本文件时影响其他测试模块
+    pipeline.deconstruct_pdf_to_images = fake_deconstruct
+    pipeline.analyze_images_to_hocr = fake_analyze
+    pipeline.reconstruct_pdf = fake_reconstruct
+
     tmp_out = Path('tests')
     tmp_out.mkdir(exist_ok=True)
     pdf = Path('dummy.pdf')
@@ -0,0 +1,60 @@
+# tests/test_utils.py
+
+import os
+import time
+import unittest
+import sys
+import shutil
+import tempfile
+from unittest import mock
+from pathlib import Path
+
+# 将项目根目录添加到 sys.path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from compressor import utils
+
+
+@unittest.skipIf(os.name == 'nt' or shutil.which('sh') is None, "需要 POSIX shell")
+class TestCommandTimeout(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        utils.set_command_timeout(None)
+        shutil.rmtree(self.temp_dir)
+
+    def test_timeout_kills_process_tree(self):
+        """超时终止命令及其派生的子进程：后台子进程不会在超时后继续写文件。"""
+        marker = self.temp_dir / 'marker'
+        script = f"(sleep 1; touch {marker}) & sleep 5"
+        started = time.monotonic()
+        self.assertFalse(utils.run_command(['sh', '-c', script], timeout=0.3))
+        self.assertLess(time.monotonic() - started, 3)
+        time.sleep(1.2)
+        self.assertFalse(marker.exists())
+
+    def test_default_command_timeout(self):
+        utils.set_command_timeout(0.3)
+        self.assertFalse(utils.run_command(['sh', '-c', 'sleep 5']))
+        self.assertTrue(utils.run_command(['sh', '-c', 'true']))
+
+    def test_command_output_respects_timeout(self):
+        """run_command_output 返回标准输出，失败或超时时返回 None。"""
+        self.assertEqual(utils.run_command_output(['sh', '-c', 'echo "Pages: 3"']), "Pages: 3\n")
+        self.assertIsNone(utils.run_command_output(['sh', '-c', 'exit 1']))
+        self.assertIsNone(utils.run_command_output(['sh', '-c', 'sleep 5'], timeout=0.3))
+
+    def test_recode_pdf_python_from_shebang(self):
+        """recode_pdf 所在环境的解释器取自入口脚本的 shebang。"""
+        entry = self.temp_dir / 'recode_pdf'
+        entry.write_text(f"#!{sys.executable}\nprint('recode')\n")
+        entry.chmod(0o755)
+        with mock.patch.dict(os.environ, {'PATH': str(self.temp_dir)}):
+            self.assertEqual(utils.find_recode_pdf_python(), sys.executable)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# tests/test_workspace.py
+
+import unittest
+import sys
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+# 将项目根目录添加到 sys.path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from compressor import strategy, workspace
+
+
+class TestWorkspace(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.root = self.temp_dir / 'workspaces'
+        self.input_pdf = self.temp_dir / 'input.pdf'
+        self.input_pdf.write_bytes(b'%PDF-1.4 dummy')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_resume_precompute_and_schemes(self):
+        """重新打开同一文件的工作区时，应恢复预处理结果与已完成的方案输出。"""
+        ws = workspace.open_workspace(self.input_pdf, self.root)
+        image = ws.path / 'page-1.jpg'
+        image.write_bytes(b'jpeg')
+        hocr = ws.path / 'combined.hocr'
+        hocr.write_text('hocr')
+        strategy._finish_precompute([image], hocr, 300, ws)
+        output = ws.path / 'output_input_S3.pdf'
+        output.write_bytes(b'pdf')
+        params = {'dpi': 250, 'bg_downsample': 3}
+        ws.record_scheme_result(3, params, output)
+
+        reopened = workspace.open_workspace(self.input_pdf, self.root)
+        self.assertEqual(reopened.path, ws.path)
+        restored = strategy._restore_precomputed_data(reopened, 300)
+        self.assertEqual(restored['image_files'], [image])
+        self.assertEqual(restored['hocr_file'], hocr)
+        self.assertIsNone(strategy._restore_precomputed_data(reopened, 200))
+        self.assertEqual(reopened.get_scheme_result(3, params), output)
+        self.assertIsNone(reopened.get_scheme_result(3, {'dpi': 200, 'bg_downsample': 3}))
+
+        output.write_bytes(b'truncated?')
+        self.assertIsNone(reopened.get_scheme_result(3, params))
+
+    def test_concurrent_saves_do_not_collide(self):
+        """两个实例（模拟两个进程）同时保存同一工作区时，临时文件互不覆盖，manifest 始终完整。"""
+        ws = workspace.open_workspace(self.input_pdf, self.root)
+        writers = [workspace.open_workspace(self.input_pdf, self.root) for _ in range(4)]
+        errors = []
+
+        def save_repeatedly(instance):
+            try:
+                for _ in range(50):
+                    instance.save()
+            except OSError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=save_repeatedly, args=(w,)) for w in writers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(workspace.open_workspace(self.input_pdf, self.root).path, ws.path)
+        self.assertEqual(list(ws.path.glob('*.tmp')), [])
+
+    def test_list_and_purge(self):
+        """列出与按键前缀删除工作区。"""
+        ws = workspace.open_workspace(self.input_pdf, self.root)
+        other_pdf = self.temp_dir / 'other.pdf'
+        other_pdf.write_bytes(b'%PDF-1.4 other')
+        workspace.open_workspace(other_pdf, self.root)
+
+        entries = workspace.list_workspaces(self.root)
+        self.assertEqual({e['source_name'] for e in entries}, {'input.pdf', 'other.pdf'})
+        self.assertEqual(workspace.purge_workspaces(self.root, ws.key[:6]), 1)
+        self.assertEqual([e['source_name'] for e in workspace.list_workspaces(self.root)], ['other.pdf'])
+        self.assertEqual(workspace.purge_workspaces(self.root), 1)
+        self.assertEqual(workspace.list_workspaces(self.root), [])
+
+
+if __name__ == '__main__':
+    unittest.main()